@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-student aggregation of face search results
+
+Compares three engines on the same stream of get_face_search pages:
+  - lists:    the original algorithm (nine Python lists per student, sum()/len())
+  - rows:     streaming running sums, row by row (no NumPy)
+  - columnar: streaming typed NumPy columns + one grouped pass per page
+
+Pages are drawn from a small pre-generated pool, so the numbers measure
+aggregation rather than data generation.
+
+Usage:
+    python bench_aggregation.py                      # 10^5, 10^6, 10^7 detections
+    python bench_aggregation.py --sizes 100000 --students 80
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+import face_search_aggregator as aggregator  # noqa: E402
+
+PAGE_SIZE = 1000
+PAGE_POOL = 20
+
+
+def make_person(rng, timestamp_ms, student_ids):
+    """One Persons entry; ~85% carry a student match"""
+    person = {
+        'Timestamp': timestamp_ms,
+        'Person': {
+            'Index': rng.randrange(60),
+            'Face': {
+                'Confidence': rng.uniform(90, 100),
+                'Pose': {'Yaw': rng.gauss(0, 25), 'Pitch': rng.gauss(0, 12), 'Roll': rng.gauss(0, 6)},
+                'Quality': {'Brightness': rng.uniform(40, 90), 'Sharpness': rng.uniform(5, 60)},
+                'BoundingBox': {'Width': rng.uniform(0.03, 0.2), 'Height': rng.uniform(0.03, 0.2)}
+            }
+        }
+    }
+    if rng.random() < 0.85:
+        person['FaceMatches'] = [{
+            'Similarity': rng.uniform(75, 100),
+            'Face': {'ExternalImageId': str(rng.choice(student_ids))}
+        }]
+    return person
+
+
+def page_pool(student_ids, seed=7):
+    rng = random.Random(seed)
+    return [
+        [make_person(rng, (page * PAGE_SIZE + i) * 200, student_ids) for i in range(PAGE_SIZE)]
+        for page in range(PAGE_POOL)
+    ]
+
+
+def pages(pool, detections):
+    for page in range(detections // PAGE_SIZE):
+        yield pool[page % len(pool)]
+
+
+def run_lists(pool, detections, student_ids):
+    """Original algorithm: append to nine lists per student, then sum()/len()"""
+    detections_by_student = {}
+    for persons in pages(pool, detections):
+        for person in persons:
+            detection = aggregator.extract_detection(person)
+            if detection is None:
+                continue
+            student_id, timestamp_ms, values = detection
+            data = detections_by_student.setdefault(student_id, [[] for _ in range(len(values) + 1)])
+            data[0].append(timestamp_ms)
+            for column, value in enumerate(values, 1):
+                data[column].append(value)
+
+    results = {}
+    for student_id in map(str, student_ids):
+        data = detections_by_student.get(student_id)
+        if not data:
+            continue
+        record = {'TimestampStart': min(data[0]), 'TimestampEnd': max(data[0])}
+        for (_, field, decimals), values in zip(aggregator.METRICS, data[1:]):
+            record[field] = round(sum(values) / len(values), decimals)
+        results[student_id] = record
+    return results
+
+
+def run_streaming(add_page, pool, detections, student_ids):
+    aggregate = aggregator.new_aggregate()
+    for persons in pages(pool, detections):
+        add_page(aggregate, persons)
+    with redirect_stdout(io.StringIO()):
+        student_data = aggregator.build_student_data(aggregate, student_ids)
+    return {
+        student_id: {key: value for key, value in record.items()
+                     if key not in ('StudentName', 'DetectionCount', 'PresenceDuration(sec)',
+                                    'CoveredDuration(sec)', 'PresenceRuns')}
+        for student_id, record in student_data.items() if record['TimestampEnd']
+    }
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 5, 10 ** 6, 10 ** 7])
+    parser.add_argument('--students', type=int, default=40)
+    parser.add_argument('--lists-max', type=int, default=10 ** 6,
+                        help='skip the list engine above this size (it holds every value in memory)')
+    args = parser.parse_args()
+
+    if aggregator.np is None:
+        print("NumPy is not installed - columnar engine unavailable")
+        return 1
+
+    student_ids = list(range(10001, 10001 + args.students))
+    pool = page_pool(student_ids)
+
+    engines = [
+        ('lists', lambda d: run_lists(pool, d, student_ids)),
+        ('rows', lambda d: run_streaming(aggregator._add_persons_page_rows, pool, d, student_ids)),
+        ('columnar', lambda d: run_streaming(aggregator.add_persons_page, pool, d, student_ids)),
+    ]
+
+    print(f"{'detections':>12} {'engine':>9} {'seconds':>9} {'det/s':>12} {'speedup':>8}")
+    for detections in args.sizes:
+        timings = {}
+        outputs = {}
+        for name, run in engines:
+            if name == 'lists' and detections > args.lists_max:
+                continue
+            seconds, outputs[name] = timed(run, detections)
+            timings[name] = seconds
+
+        reference = 'lists' if 'lists' in timings else 'rows'
+        for name, seconds in timings.items():
+            speedup = timings[reference] / seconds
+            print(f"{detections:>12,} {name:>9} {seconds:>9.3f} {detections / seconds:>12,.0f} {speedup:>7.2f}x")
+
+        if any(output != outputs[reference] for output in outputs.values()):
+            print("❌ Engines disagree on student_data")
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
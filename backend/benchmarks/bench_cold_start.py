@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark Lambda init (cold start) cost per handler module
+
+Each handler module is imported in a fresh Python process, the way a new
+Lambda execution environment runs the init phase, and measured:
+  - import_ms:   module import, including clients created at import time
+  - clients:     AWS clients / resources that exist after import
+  - first_use_ms: creating the clients the module declared lazily
+                  (paid by the first invocation instead of init)
+
+No AWS calls are made; dummy credentials keep client creation offline.
+With --ref the same measurement runs against the backend/lambda tree of a
+git ref (e.g. the commit before a change), so regressions show up as a diff.
+
+Usage:
+    python bench_cold_start.py                    # 5 runs per module, median
+    python bench_cold_start.py --runs 10 --ref HEAD~1
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+LAMBDA_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+HANDLER_MODULES = [
+    'lambda1_generate_job',
+    'lambda_segment_video',
+    'lambda2_run_rekognition',
+    'lambda3_process_and_store',
+    'lambda_chatbot_advanced',
+    'roster_manifest',
+]
+
+# Runs inside the child process: import one module, report what init cost
+PROBE = r'''
+import json, os, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+module = __import__(sys.argv[2])
+import_ms = (time.perf_counter() - start) * 1000
+
+from botocore.client import BaseClient
+project = [m for m in list(sys.modules.values())
+           if getattr(m, '__file__', None) and os.path.dirname(os.path.abspath(m.__file__)) == sys.argv[1]]
+
+def live_clients():
+    found = set()
+    for m in project:
+        for name, value in vars(m).items():
+            if isinstance(value, BaseClient):
+                found.add(value.meta.service_model.service_name)
+            elif type(value).__name__ == 'dynamodb.ServiceResource':
+                found.add('dynamodb (resource)')
+            elif type(value).__name__ == 'dynamodb.Table':
+                found.add('dynamodb (table)')
+    aws_clients = sys.modules.get('aws_clients')
+    if aws_clients:
+        found.update(aws_clients.created())
+    return sorted(found)
+
+clients = live_clients()
+
+start = time.perf_counter()
+for m in project:
+    for value in list(vars(m).values()):
+        if type(value).__name__ == 'LazyHandle':
+            value._factory(*value._args, **value._kwargs)
+first_use_ms = (time.perf_counter() - start) * 1000
+
+print(json.dumps({'import_ms': import_ms, 'clients': clients, 'first_use_ms': first_use_ms}))
+'''
+
+
+def probe_env():
+    env = dict(os.environ)
+    env.update({
+        'AWS_ACCESS_KEY_ID': 'bench',
+        'AWS_SECRET_ACCESS_KEY': 'bench',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'AWS_EC2_METADATA_DISABLED': 'true',
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    return env
+
+
+def measure(lambda_dir, module, runs):
+    """Median import / first-use time of a module over fresh processes"""
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-c', PROBE, lambda_dir, module],
+            capture_output=True, text=True, env=probe_env(), cwd=lambda_dir
+        )
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            return {'error': error[-1] if error else 'failed'}
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    return {
+        'import_ms': statistics.median(r['import_ms'] for r in results),
+        'first_use_ms': statistics.median(r['first_use_ms'] for r in results),
+        'clients': results[0]['clients'],
+    }
+
+
+def extract_ref(ref, target):
+    """Write backend/lambda of a git ref into target; returns the lambda dir"""
+    repo_root = subprocess.run(
+        ['git', 'rev-parse', '--show-toplevel'],
+        capture_output=True, text=True, check=True, cwd=LAMBDA_DIR
+    ).stdout.strip()
+    prefix = os.path.relpath(LAMBDA_DIR, repo_root)
+
+    archive = os.path.join(target, 'ref.tar')
+    subprocess.run(
+        ['git', 'archive', '--format=tar', '-o', archive, ref, prefix],
+        check=True, cwd=repo_root
+    )
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return os.path.join(target, prefix)
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print(f"  {'module':<28} {'import ms':>10} {'first use ms':>13}  clients at import")
+    for module, result in rows:
+        if 'error' in result:
+            print(f"  {module:<28} {'-':>10} {'-':>13}  {result['error']}")
+            continue
+        print(f"  {module:<28} {result['import_ms']:>10.1f} {result['first_use_ms']:>13.1f}  "
+              f"{', '.join(result['clients']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per module (median reported)')
+    parser.add_argument('--ref', help='also measure backend/lambda at this git ref')
+    parser.add_argument('--modules', nargs='+', default=HANDLER_MODULES)
+    args = parser.parse_args()
+
+    current = [(module, measure(LAMBDA_DIR, module, args.runs)) for module in args.modules]
+    print_table('Working tree', current)
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as target:
+            ref_dir = extract_ref(args.ref, target)
+            baseline = [(module, measure(ref_dir, module, args.runs)) for module in args.modules]
+        print_table(f"{args.ref}", baseline)
+
+        print("\nImport time change (working tree vs ref)")
+        for (module, now), (_, then) in zip(current, baseline):
+            if 'error' in now or 'error' in then:
+                continue
+            delta = now['import_ms'] - then['import_ms']
+            print(f"  {module:<28} {delta:>+10.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
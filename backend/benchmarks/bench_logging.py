@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark handler time and log volume at each LOG_LEVEL
+
+Lambda 3 (process & store) is run in-process against in-memory AWS fakes
+for a synthetic class of --students students, once per LOG_LEVEL in a
+fresh Python process, and measured:
+  - handler_ms: median handler duration over --runs warm invocations
+  - log_lines / log_kb: what one invocation writes to stdout (CloudWatch)
+
+No AWS calls are made. With --ref the same handler runs from the
+backend/lambda tree of a git ref (e.g. the print-based tree before
+structured logging), so the difference shows up side by side.
+
+Usage:
+    python bench_logging.py                          # 300 students, 20 runs
+    python bench_logging.py --students 1000 --ref HEAD~1
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+
+from bench_cold_start import LAMBDA_DIR, extract_ref, probe_env
+
+LEVELS = ['OFF', 'ERROR', 'INFO', 'DEBUG']
+
+# Runs inside the child process: fake the AWS clients, time the handler
+PROBE = r'''
+import io, json, random, statistics, sys, tempfile, time
+sys.path.insert(0, sys.argv[1])
+students, runs = int(sys.argv[2]), int(sys.argv[3])
+
+
+class FakeAWS:
+    """Any client / table: every call succeeds with a canned (or empty) response"""
+
+    def __init__(self, **responses):
+        self.responses = responses
+
+    def __getattr__(self, name):
+        response = self.responses.get(name, {})
+        return lambda *args, **kwargs: response() if callable(response) else response
+
+
+rnd = random.Random(7)
+student_data = {}
+for student_id in range(1, students + 1):
+    present = rnd.random() < 0.85
+    student_data[str(student_id)] = {
+        'StudentName': str(student_id),
+        'PresenceDuration(sec)': round(rnd.uniform(600, 3000), 2) if present else 0,
+        'AvgConfidence': rnd.uniform(90, 100) if present else 0,
+        'AvgSimilarity': rnd.uniform(80, 100) if present else 0,
+        'AvgYaw': rnd.uniform(-40, 40) if present else 0,
+        'AvgPitch': rnd.uniform(-20, 20) if present else 0,
+        'AvgRoll': rnd.uniform(-10, 10) if present else 0,
+        'AvgBrightness': rnd.uniform(40, 90) if present else 0,
+        'AvgSharpness': rnd.uniform(5, 60) if present else 0,
+        'AvgBoundingBoxSize': rnd.uniform(0.005, 0.03) if present else 0,
+    }
+body = json.dumps({'student_data': student_data}).encode('utf-8')
+
+s3 = FakeAWS(get_object=lambda: {'Body': io.BytesIO(body), 'ContentType': 'application/json'})
+dynamodb = FakeAWS(batch_write_item={'UnprocessedItems': {}})
+table = FakeAWS()
+
+import aws_clients
+aws_clients.get_client = lambda service, *args, **kwargs: {'s3': s3, 'dynamodb': dynamodb}.get(service, FakeAWS())
+aws_clients.get_table = lambda name: table
+
+handler = __import__('lambda3_process_and_store')
+
+
+event = {'job_id': 'bench', 'record_id': 'bench', 'bucket': 'bench', 'results_key': 'results/bench.json'}
+real_stdout = sys.stdout
+durations = []
+for run in range(runs + 1):
+    # A real file, like the pipe Lambda's stdout is
+    sys.stdout = stream = tempfile.TemporaryFile('w+')
+    start = time.perf_counter()
+    result = handler.lambda_handler(dict(event), None)
+    stream.flush()
+    elapsed = (time.perf_counter() - start) * 1000
+    sys.stdout = real_stdout
+    if run:  # first run warms up imports / clients
+        durations.append(elapsed)
+
+assert result['records_written'] == students, result
+stream.seek(0)
+output = stream.read()
+print(json.dumps({
+    'handler_ms': statistics.median(durations),
+    'log_lines': output.count('\n'),
+    'log_kb': len(output) / 1024
+}))
+'''
+
+
+def measure(lambda_dir, level, students, runs):
+    env = probe_env()
+    env['LOG_LEVEL'] = level
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE, lambda_dir, str(students), str(runs)],
+        capture_output=True, text=True, env=env, cwd=lambda_dir
+    )
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()
+        return {'error': error[-1] if error else 'failed'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_row(label, result):
+    if 'error' in result:
+        print(f"  {label:<22} {result['error']}")
+        return
+    print(f"  {label:<22} {result['handler_ms']:>10.1f} {result['log_lines']:>10} {result['log_kb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--runs', type=int, default=20, help='warm invocations per level (median reported)')
+    parser.add_argument('--ref', help='also run the handler from backend/lambda at this git ref')
+    args = parser.parse_args()
+
+    print(f"\nLambda 3, {args.students} students")
+    print(f"  {'tree / LOG_LEVEL':<22} {'handler ms':>10} {'log lines':>10} {'log KB':>9}")
+    for level in LEVELS:
+        print_row(f"working tree / {level}", measure(LAMBDA_DIR, level, args.students, args.runs))
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as target:
+            ref_dir = extract_ref(args.ref, target)
+            print_row(args.ref, measure(ref_dir, 'INFO', args.students, args.runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Regression benchmarks for aggregation and scoring, against tracked baselines
+
+Cases run on synthetic lectures from backend/local/synthetic_faces.py:
+  - aggregate_stream:   Lambda 2's collect path - add_persons_page per
+                        1000-entry page, then build_student_data
+  - absences_list:      process_rekognition_results_with_absences on the
+                        whole detection list
+  - absences_large:     the same for a 300-student, 3-hour lecture
+  - scoring:            calculate_attendance_score, calculate_engagement_score
+                        and estimate_speaking_time per student record
+  - scoring_batch:      score_students on the same records, one batch per
+                        40-student session (what backfill_scores.py runs)
+
+Each case reports throughput (best of --repeat timed runs, in items per
+second) and peak memory (tracemalloc, one extra run; the input is built
+before tracing starts, so only the code under test counts).
+
+Results are compared with baselines.json next to this script. A case
+fails when its throughput drops by more than --max-slowdown or its peak
+memory grows by more than --max-memory-growth; the exit code is 1 if any
+case fails. Baselines are machine specific: record them with --update on
+the machine that runs the check, and commit the file with the change that
+moves them.
+
+Usage:
+    python bench_suite.py                      # compare with baselines.json
+    python bench_suite.py --update             # record new baselines
+    python bench_suite.py --cases scoring --repeat 9 --max-slowdown 0.1
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'lambda'))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'local'))
+
+# Per-student log lines would be part of the measurement otherwise
+os.environ['LOG_LEVEL'] = 'OFF'
+
+import face_search_aggregator as aggregator  # noqa: E402
+import synthetic_faces  # noqa: E402
+from lambda2_run_rekognition import process_rekognition_results_with_absences  # noqa: E402
+from scoring import (  # noqa: E402
+    calculate_attendance_score, calculate_engagement_score, estimate_speaking_time, presence_seconds, score_students
+)
+
+BASELINES_PATH = os.path.join(BENCH_DIR, 'baselines.json')
+
+# Scoring runs over this many student records (the aggregate's, repeated)
+SCORING_RECORDS = 50000
+
+# Students per score_students batch in scoring_batch
+SESSION_STUDENTS = 40
+
+# Peak memory changes smaller than this are noise, whatever the percentage
+MEMORY_NOISE_KB = 64
+
+
+def setup_aggregate_stream():
+    profile = synthetic_faces.lecture_profile(students=40, minutes=50, fps=2.0)
+    pages = list(synthetic_faces.persons_pages(profile, seed=1))
+    return (pages, synthetic_faces.roster(profile)), sum(len(page) for page in pages)
+
+
+def run_aggregate_stream(data):
+    pages, student_ids = data
+    aggregate = aggregator.new_aggregate()
+    for page in pages:
+        aggregator.add_persons_page(aggregate, page)
+    return aggregator.build_student_data(aggregate, student_ids)
+
+
+def setup_absences(students, minutes, fps):
+    profile = synthetic_faces.lecture_profile(students=students, minutes=minutes, fps=fps)
+    persons = list(synthetic_faces.lecture_persons(profile, seed=2))
+    return (persons, synthetic_faces.roster(profile)), len(persons)
+
+
+def run_absences(data):
+    persons, student_ids = data
+    return process_rekognition_results_with_absences(persons, student_ids)
+
+
+def setup_scoring():
+    (pages, student_ids), _ = setup_aggregate_stream()
+    records = list(run_aggregate_stream((pages, student_ids)).values())
+    records = (records * (SCORING_RECORDS // len(records) + 1))[:SCORING_RECORDS]
+    return records, len(records)
+
+
+def run_scoring(records):
+    for record in records:
+        calculate_attendance_score(record)
+        calculate_engagement_score(record)
+        estimate_speaking_time(record, int(presence_seconds(record)))
+
+
+def run_scoring_batch(records):
+    for start in range(0, len(records), SESSION_STUDENTS):
+        score_students(records[start:start + SESSION_STUDENTS])
+
+
+# name -> (setup() -> (data, items), run(data), unit)
+CASES = {
+    'aggregate_stream': (setup_aggregate_stream, run_aggregate_stream, 'detections'),
+    'absences_list': (lambda: setup_absences(40, 50, 2.0), run_absences, 'detections'),
+    'absences_large': (lambda: setup_absences(300, 180, 0.5), run_absences, 'detections'),
+    'scoring': (setup_scoring, run_scoring, 'students'),
+    'scoring_batch': (setup_scoring, run_scoring_batch, 'students'),
+}
+
+
+def measure(name, repeat):
+    setup, run, unit = CASES[name]
+    data, items = setup()
+
+    # Warm-up (imports, caches), then timed runs. Like timeit, the collector
+    # is off while timing: with a large input alive its passes dominate the noise.
+    run(data)
+    durations = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(data)
+            durations.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    run(data)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    seconds = min(durations)
+    return {
+        'items': items,
+        'unit': unit,
+        'seconds': round(seconds, 4),
+        'throughput': round(items / seconds, 1),
+        'peak_kb': round(peak_bytes / 1024, 1)
+    }
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as baselines_file:
+        return json.load(baselines_file).get('cases', {})
+
+
+def save_baselines(path, results):
+    document = {
+        'recorded_with': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'numpy': getattr(aggregator.np, '__version__', None)
+        },
+        'cases': results
+    }
+    with open(path, 'w', encoding='utf-8') as baselines_file:
+        json.dump(document, baselines_file, indent=2, sort_keys=True)
+        baselines_file.write('\n')
+
+
+def compare(result, baseline, max_slowdown, max_memory_growth):
+    """(throughput change, memory change, regressions) of a case against its baseline"""
+    throughput_change = result['throughput'] / baseline['throughput'] - 1
+    memory_change = result['peak_kb'] / baseline['peak_kb'] - 1 if baseline['peak_kb'] else 0.0
+
+    regressions = []
+    if throughput_change < -max_slowdown:
+        regressions.append(f"throughput {throughput_change:+.0%}")
+    if memory_change > max_memory_growth and result['peak_kb'] - baseline['peak_kb'] > MEMORY_NOISE_KB:
+        regressions.append(f"peak memory {memory_change:+.0%}")
+    return throughput_change, memory_change, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case (best reported)')
+    parser.add_argument('--baselines', default=BASELINES_PATH)
+    parser.add_argument('--update', action='store_true', help='record the results as the new baselines')
+    parser.add_argument('--max-slowdown', type=float, default=0.25,
+                        help='allowed throughput drop vs baseline (0.25 = 25%%)')
+    parser.add_argument('--max-memory-growth', type=float, default=0.25,
+                        help='allowed peak memory growth vs baseline')
+    args = parser.parse_args()
+
+    baselines = load_baselines(args.baselines)
+    results = {}
+    failed = []
+
+    print(f"{'case':<18} {'items':>10} {'throughput':>14} {'unit/s':<11} {'peak_kb':>10} "
+          f"{'vs base':>8} {'mem vs':>7}  result")
+
+    for name in args.cases:
+        result = results[name] = measure(name, args.repeat)
+        baseline = baselines.get(name)
+
+        if baseline is None or args.update:
+            verdict, throughput_text, memory_text = ('recorded' if args.update else 'no baseline'), '-', '-'
+        else:
+            throughput_change, memory_change, regressions = compare(
+                result, baseline, args.max_slowdown, args.max_memory_growth
+            )
+            throughput_text = f"{throughput_change:+.0%}"
+            memory_text = f"{memory_change:+.0%}"
+            verdict = 'ok' if not regressions else 'REGRESSION: ' + ', '.join(regressions)
+            if regressions:
+                failed.append(name)
+
+        print(f"{name:<18} {result['items']:>10,} {result['throughput']:>14,.0f} {result['unit']:<11} "
+              f"{result['peak_kb']:>10,.1f} {throughput_text:>8} {memory_text:>7}  {verdict}")
+
+    if args.update:
+        merged = dict(load_baselines(args.baselines), **results)
+        save_baselines(args.baselines, merged)
+        print(f"\nBaselines written to {args.baselines}")
+        return 0
+
+    if failed:
+        print(f"\n{len(failed)} case(s) regressed beyond the thresholds: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Shared, lazily created AWS clients
+
+Lambda modules declare their clients at import time as lazy handles:
+
+    s3 = aws_clients.lazy_client('s3')
+    TABLE = aws_clients.lazy_table('StudentlyticsData')
+
+Nothing is created until the first call (s3.get_object(...)), so a cold
+start only pays for the clients the invocation actually uses; boto3 itself
+is imported on first use too (it is most of a handler's import time).
+Clients are cached per process - every module asking for 's3' shares one
+client, and warm invocations reuse it with its open connections. boto3
+resources (and the Table handles made from them) are not thread-safe, so
+those are cached per thread: code running on a worker pool gets its own.
+
+All clients get one botocore Config: connection pool size, TCP keep-alive,
+connect / read timeouts and standard-mode retries, tunable by env:
+
+    AWS_MAX_POOL_CONNECTIONS  (default 20)
+    AWS_CONNECT_TIMEOUT       (seconds, default 3)
+    AWS_READ_TIMEOUT          (seconds, default 30; bedrock-runtime 120)
+    AWS_MAX_ATTEMPTS          (default 3)
+
+override() swaps in stand-in objects for a service (the offline pipeline
+harness in backend/local uses it); every lazy handle picks them up.
+"""
+import os
+import threading
+
+REGION = os.environ.get('AWS_REGION', 'us-east-1')
+
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '20'))
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '3'))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '30'))
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '3'))
+
+# Per-service Config settings on top of the defaults
+SERVICE_CONFIG = {
+    # Model responses (and streams) take longer than a normal API call
+    'bedrock-runtime': {'read_timeout': 120},
+}
+
+_clients = {}
+_client_overrides = {}
+_resource_overrides = {}
+_lock = threading.Lock()
+
+# Per-thread resources and tables, dropped when `_generation` moves on (override)
+_thread = threading.local()
+_generation = 0
+# Services a resource was created for, in any thread (for created())
+_resource_services = set()
+
+
+def client_config(service, **overrides):
+    from botocore.config import Config
+
+    settings = {
+        'region_name': REGION,
+        'max_pool_connections': MAX_POOL_CONNECTIONS,
+        'connect_timeout': CONNECT_TIMEOUT,
+        'read_timeout': READ_TIMEOUT,
+        'tcp_keepalive': True,
+        'retries': {'mode': 'standard', 'max_attempts': MAX_ATTEMPTS},
+    }
+    settings.update(SERVICE_CONFIG.get(service, {}))
+    settings.update(overrides)
+    return Config(**settings)
+
+
+def get_client(service, endpoint_url=None, **config_overrides):
+    """
+    The process-wide client for a service (created on first use)
+
+    Clients with different endpoint_url or Config overrides are cached
+    separately.
+    """
+    if service in _client_overrides:
+        return _client_overrides[service]
+
+    key = (service, endpoint_url, tuple(sorted(config_overrides.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    # Client creation from the default session is not thread-safe
+    with _lock:
+        if key not in _clients:
+            import boto3
+
+            _clients[key] = boto3.client(
+                service,
+                endpoint_url=endpoint_url,
+                config=client_config(service, **config_overrides)
+            )
+        return _clients[key]
+
+
+def _thread_cache():
+    """This thread's {'resources': {}, 'tables': {}}, reset after override()"""
+    cache = getattr(_thread, 'cache', None)
+    if cache is None or cache['generation'] != _generation:
+        cache = _thread.cache = {'generation': _generation, 'resources': {}, 'tables': {}}
+    return cache
+
+
+def get_resource(service):
+    """The calling thread's boto3 resource for a service (created on first use)"""
+    if service in _resource_overrides:
+        return _resource_overrides[service]
+
+    resources = _thread_cache()['resources']
+    resource = resources.get(service)
+    if resource is not None:
+        return resource
+
+    with _lock:
+        import boto3
+
+        resource = resources[service] = boto3.resource(service, config=client_config(service))
+        _resource_services.add(service)
+    return resource
+
+
+def get_table(table_name):
+    """The calling thread's DynamoDB Table handle (created on first use)"""
+    tables = _thread_cache()['tables']
+    table = tables.get(table_name)
+    if table is None:
+        table = tables[table_name] = get_resource('dynamodb').Table(table_name)
+    return table
+
+
+class LazyHandle:
+    """Module-level stand-in that resolves the real client / table on first attribute access"""
+
+    def __init__(self, factory, *args, **kwargs):
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+
+    def __getattr__(self, name):
+        return getattr(self._factory(*self._args, **self._kwargs), name)
+
+
+def lazy_client(service, **config_overrides):
+    return LazyHandle(get_client, service, **config_overrides)
+
+
+def lazy_resource(service):
+    return LazyHandle(get_resource, service)
+
+
+def lazy_table(table_name):
+    return LazyHandle(get_table, table_name)
+
+
+def override(service, client=None, resource=None):
+    """
+    Serve stand-ins instead of real AWS objects for a service
+
+    client replaces get_client(service) (any endpoint / config), resource
+    replaces get_resource(service) and with it every get_table handle for
+    dynamodb. Objects already created for the service are dropped.
+    """
+    global _generation
+
+    with _lock:
+        if client is not None:
+            _client_overrides[service] = client
+            for key in [key for key in _clients if key[0] == service]:
+                del _clients[key]
+        if resource is not None:
+            _resource_overrides[service] = resource
+            _generation += 1
+
+
+def clear_overrides():
+    global _generation
+
+    with _lock:
+        _client_overrides.clear()
+        _resource_overrides.clear()
+        _generation += 1
+
+
+def created():
+    """Names of the clients / resources created so far (for init benchmarks)"""
+    return sorted(
+        [key[0] for key in _clients] +
+        [f"{service} (resource)" for service in _resource_services]
+    )
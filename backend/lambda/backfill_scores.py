@@ -0,0 +1,274 @@
+"""
+Re-score historical sessions from their saved face search results
+
+Attendance and engagement are computed from the per-student aggregates in
+rekognition-results/, so new scoring weights (scoring.py) can be applied
+to past sessions without running Rekognition again:
+
+  1. list the results objects (rekognition-results/{record_id}_results.*)
+     and map each to the sessions stored from it - its own record_id, plus
+     duplicate uploads that reused it (the summary's `results_key`)
+  2. fetch, decode and score the sessions on a worker pool, one vectorized
+     score_students batch per session
+  3. update attendance / engagement / time_inside_class / speaking_time /
+     status on every student record with a conditional UpdateItem that only
+     replaces scores from an older SCORING_VERSION, so reruns and concurrent
+     Lambda 3 writes are safe
+  4. rebuild the session summary from the re-scored records (the same
+     build_session_summary as Lambda 3), update it the same way, and
+     publish a new session version for the chatbot caches
+
+Writes go through one RateLimiter shared by all workers (BACKFILL_WRITE_TPS
+UpdateItem calls per second), so a backfill leaves capacity for live ingest.
+They use the low-level client, which the workers can share (clients are
+thread-safe, resources are not).
+
+Run as a Lambda ({"sessions": [...], "dry_run": true} are both optional) or
+from the command line:
+
+    python backfill_scores.py [--workers 16] [--tps 100] [--sessions S1 S2] [--dry-run]
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+import results_format
+import structured_log
+from dynamodb_batch import serialize_item
+from rate_limiter import RateLimiter
+from scoring import SCORING_VERSION, score_students, was_present
+from session_summary import build_session_summary
+from studentlytics_data import SESSION_KEY, catalog_items, publish_session_version, query_session, summary_key
+
+BUCKET_NAME = 'hackathon-attendance-media'
+RESULTS_PREFIX = 'rekognition-results/'
+RESULTS_SUFFIXES = ('_results.ndjson.gz', '_results.json')
+
+BACKFILL_WORKERS = int(os.environ.get('BACKFILL_WORKERS', '16'))
+BACKFILL_WRITE_TPS = float(os.environ.get('BACKFILL_WRITE_TPS', '100'))
+
+TABLE_NAME = 'StudentlyticsData'
+
+# Replace scores only where they came from an older scoring version
+OLDER_VERSION_CONDITION = (
+    'attribute_exists(record_id) AND '
+    '(attribute_not_exists(scoring_version) OR scoring_version < :version)'
+)
+
+# Student record attributes read by build_session_summary
+SUMMARY_RECORD_ATTRIBUTES = [
+    'student_id', 'student_name', 'status', 'attendance', 'engagement', 'time_inside_class',
+    'session_id', 'session_date', 'class_id', 'class_name'
+]
+
+# Summary attributes that describe the ingest, not the scores - kept as stored
+INGEST_SUMMARY_FIELDS = ('record_id', 'scoring_version', 'records_failed', 'results_key', 'ingested_at')
+
+s3 = aws_clients.lazy_client('s3')
+dynamodb_client = aws_clients.lazy_client('dynamodb', max_pool_connections=BACKFILL_WORKERS * 2)
+
+log = structured_log.get_logger('backfill_scores')
+
+
+def record_id_from_results_key(key):
+    """rekognition-results/{record_id}_results.ndjson.gz -> record_id (None for other objects)"""
+    name = key[len(RESULTS_PREFIX):] if key.startswith(RESULTS_PREFIX) else None
+    if not name or '/' in name:
+        return None
+    for suffix in RESULTS_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+def list_results_objects(bucket):
+    """{results_key: record_id} of every session-level results object"""
+    objects = {}
+    paginator = s3.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=RESULTS_PREFIX):
+        for obj in page.get('Contents', []):
+            record_id = record_id_from_results_key(obj['Key'])
+            if record_id:
+                objects[obj['Key']] = record_id
+
+    return objects
+
+
+def plan_sessions(bucket, only_sessions=None):
+    """
+    {results_key: [record_id, ...]} - the sessions to re-score from each object
+
+    Duplicate uploads have no results object of their own; their summary
+    records the results_key they were stored from.
+    """
+    plan = {key: {record_id} for key, record_id in list_results_objects(bucket).items()}
+
+    for summary in catalog_items(attributes=[SESSION_KEY, 'results_key']):
+        key = summary.get('results_key')
+        if key in plan:
+            plan[key].add(summary[SESSION_KEY])
+
+    if only_sessions:
+        only_sessions = set(only_sessions)
+        plan = {key: record_ids & only_sessions for key, record_ids in plan.items()}
+
+    return {key: sorted(record_ids) for key, record_ids in plan.items() if record_ids}
+
+
+def load_student_data(bucket, results_key):
+    response = s3.get_object(Bucket=bucket, Key=results_key)
+    results_data = results_format.decode_results(response['Body'].read(), response.get('ContentType'))
+    return results_data.get('student_data', {})
+
+
+def conditional_update(limiter, key, assignments):
+    """
+    SET the given attributes plus scoring_version if the item was scored
+    by an older version; returns False when the condition failed
+    """
+    names = {f"#a{i}": name for i, name in enumerate(assignments)}
+    values = {f":a{i}": value for i, value in enumerate(assignments.values())}
+    values[':version'] = SCORING_VERSION
+
+    limiter.acquire()
+    try:
+        dynamodb_client.update_item(
+            TableName=TABLE_NAME,
+            Key=serialize_item({'record_id': key}),
+            UpdateExpression='SET ' + ', '.join(f"{name} = :a{i}" for i, name in enumerate(names)) + ', scoring_version = :version',
+            ConditionExpression=OLDER_VERSION_CONDITION,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=serialize_item(values)
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+    return True
+
+
+def backfill_results_object(bucket, results_key, record_ids, limiter, dry_run=False):
+    """Re-score every session stored from one results object; returns its counters"""
+    student_data = load_student_data(bucket, results_key)
+    student_ids = list(student_data)
+    scores = score_students([student_data[student_id] for student_id in student_ids])
+    statuses = [was_present(student_data[student_id]) for student_id in student_ids]
+
+    counts = {'sessions': len(record_ids), 'students': len(student_ids) * len(record_ids),
+              'updated': 0, 'current': 0, 'summaries_updated': 0}
+    if dry_run:
+        return counts
+
+    for record_id in record_ids:
+        changed = False
+        records = {item['student_id']: item for item in query_session(record_id, attributes=SUMMARY_RECORD_ATTRIBUTES)}
+
+        for student_id, (attendance, engagement, time_inside_class, speaking_time), status in zip(student_ids, scores, statuses):
+            rescored = {
+                'attendance': Decimal(str(round(attendance, 2))),
+                'engagement': Decimal(str(round(engagement, 2))),
+                'time_inside_class': time_inside_class,
+                'speaking_time': speaking_time,
+                'status': status
+            }
+            if conditional_update(limiter, f"{record_id}#{int(student_id)}", rescored):
+                counts['updated'] += 1
+                changed = True
+            else:
+                # Already at this version, or never stored
+                counts['current'] += 1
+
+            if int(student_id) in records:
+                records[int(student_id)].update(rescored)
+
+        # Counts, absent list and averages all follow the new status and scores
+        if records:
+            summary = build_session_summary(record_id, list(records.values()))
+            if conditional_update(limiter, summary_key(record_id), {
+                name: value for name, value in summary.items() if name not in INGEST_SUMMARY_FIELDS
+            }):
+                counts['summaries_updated'] += 1
+                changed = True
+
+        if changed:
+            publish_session_version(record_id)
+
+    return counts
+
+
+def backfill_scores(bucket=BUCKET_NAME, workers=BACKFILL_WORKERS, tps=BACKFILL_WRITE_TPS,
+                    sessions=None, dry_run=False):
+    """
+    Re-score historical sessions with the current SCORING_VERSION
+
+    Args:
+        bucket: bucket holding rekognition-results/
+        workers: results objects processed in parallel
+        tps: max UpdateItem calls per second, across all workers
+        sessions: only these record_ids (default: every session with results)
+        dry_run: fetch and score, but write nothing
+
+    Returns the totals: sessions, students, updated, current,
+    summaries_updated and failed (results objects that could not be processed).
+    """
+    plan = plan_sessions(bucket, sessions)
+    log.info("Backfill planned", results_objects=len(plan), sessions=sum(len(ids) for ids in plan.values()),
+             scoring_version=SCORING_VERSION, dry_run=dry_run)
+
+    limiter = RateLimiter(tps)
+    totals = {'sessions': 0, 'students': 0, 'updated': 0, 'current': 0, 'summaries_updated': 0, 'failed': 0}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(backfill_results_object, bucket, key, record_ids, limiter, dry_run): key
+            for key, record_ids in plan.items()
+        }
+
+        for future in as_completed(futures):
+            try:
+                counts = future.result()
+            except Exception as e:
+                log.error("Error re-scoring results object", results_key=futures[future], error=str(e))
+                totals['failed'] += 1
+                continue
+
+            for name, value in counts.items():
+                totals[name] += value
+            log.item("Results object re-scored", results_key=futures[future], **counts)
+
+    return totals
+
+
+def lambda_handler(event, context):
+    """
+    Re-score historical sessions (maintenance; invoke after changing scoring.py)
+
+    Event (all optional): {"sessions": [record_id, ...], "dry_run": bool}
+    """
+    structured_log.start_invocation(context)
+
+    totals = backfill_scores(sessions=event.get('sessions'), dry_run=bool(event.get('dry_run')))
+
+    log.summary("Backfill complete", scoring_version=SCORING_VERSION, **totals)
+    return dict(totals, scoring_version=SCORING_VERSION)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Re-score historical sessions with the current scoring weights')
+    parser.add_argument('--bucket', default=BUCKET_NAME)
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS)
+    parser.add_argument('--tps', type=float, default=BACKFILL_WRITE_TPS, help='max UpdateItem calls per second')
+    parser.add_argument('--sessions', nargs='+', help='only these record_ids')
+    parser.add_argument('--dry-run', action='store_true', help='score without writing')
+    args = parser.parse_args()
+
+    structured_log.start_invocation()
+    totals = backfill_scores(args.bucket, args.workers, args.tps, args.sessions, args.dry_run)
+    print(json.dumps(dict(totals, scoring_version=SCORING_VERSION), indent=2))
@@ -1,60 +1,98 @@
 #!/usr/bin/env python3
-"""Check DynamoDB for students with different status values"""
-import boto3
-from decimal import Decimal
-
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('StudentlyticsData')
-
-# Query all records for record_test006
-response = table.scan(
-    FilterExpression='begins_with(record_id, :rid_prefix)',
-    ExpressionAttributeValues={':rid_prefix': 'record_test006'}
-)
-
-items = response.get('Items', [])
-
-print(f"Found {len(items)} records for record_test006\n")
-print("="*80)
-
-for item in items:
-    student_id = item.get('student_id')
-    student_name = item.get('student_name', 'Unknown')
-    status = item.get('status')
-    
-    print(f"Student ID: {student_id}")
-    print(f"Name: {student_name}")
-    print(f"Status: {status} (type: {type(status).__name__})")
-    print(f"Status value: {repr(status)}")
-    print("-"*80)
-
-# Also check if there are any students with 'false' status in ANY record
-print("\n\nChecking for records with status='false' (string)...")
-print("="*80)
-
-response_all = table.scan()
-all_items = response_all.get('Items', [])
-
-false_string_count = 0
-false_bool_count = 0
-true_string_count = 0
-true_bool_count = 0
-
-for item in all_items:
-    status = item.get('status')
-    if status == 'false' or status == 'False':
-        false_string_count += 1
-        print(f"Found string 'false': {item.get('student_id')}, session: {item.get('record_id')}")
-    elif status == False:
-        false_bool_count += 1
-    elif status == 'true' or status == 'True':
-        true_string_count += 1
-    elif status == True:
-        true_bool_count += 1
-
-print(f"\nSummary:")
-print(f"  Students with status='false' (string): {false_string_count}")
-print(f"  Students with status=False (boolean): {false_bool_count}")
-print(f"  Students with status='true' (string): {true_string_count}")
-print(f"  Students with status=True (boolean): {true_bool_count}")
+"""
+Check DynamoDB for students with different status values
 
+Lambda 3 stores `status` as a boolean. This audit counts every student
+record in the table by status value and type, and lists the records that
+hold the string 'false'. The table is read with a parallel segmented scan
+(parallel_scan.py), so a full audit scales with --workers. With --session,
+the records of one session are printed first (a SessionIndex query).
+
+    python check_dynamodb_status.py [--session record_test006] [--workers 16] [--segments 64] [--rcu 500]
+"""
+import argparse
+from collections import Counter
+
+from parallel_scan import SCAN_READ_CAPACITY, SCAN_WORKERS, ParallelScan
+from studentlytics_data import TABLE_NAME, query_session
+
+
+# status_kind buckets
+BOOL_TRUE, BOOL_FALSE = 'True', 'False'
+STRING_TRUE, STRING_FALSE = "'true'", "'false'"
+
+
+def status_kind(status):
+    """Bucket a status value: boolean, 'true' / 'false' string (any case), missing or other"""
+    if isinstance(status, bool):
+        return BOOL_TRUE if status else BOOL_FALSE
+    if isinstance(status, str) and status.lower() in ('true', 'false'):
+        return STRING_TRUE if status.lower() == 'true' else STRING_FALSE
+    return 'missing' if status is None else f"other ({type(status).__name__})"
+
+
+def print_session(record_id):
+    items = query_session(record_id, attributes=['student_id', 'student_name', 'status'])
+
+    print(f"Found {len(items)} records for {record_id}\n")
+    print("="*80)
+
+    for item in items:
+        status = item.get('status')
+        print(f"Student ID: {item.get('student_id')}")
+        print(f"Name: {item.get('student_name', 'Unknown')}")
+        print(f"Status: {status} (type: {type(status).__name__})")
+        print(f"Status value: {repr(status)}")
+        print("-"*80)
+
+
+def audit_status(workers=SCAN_WORKERS, segments=None, read_capacity=SCAN_READ_CAPACITY):
+    """Scan every student record; returns (Counter of status kinds, scan stats)"""
+    print("\n\nChecking status values across all records...")
+    print("="*80)
+
+    scan = ParallelScan(
+        TABLE_NAME,
+        workers=workers,
+        segments=segments,
+        attributes=['record_id', 'student_id', 'status'],
+        filter_expression='attribute_exists(student_id)',
+        read_capacity=read_capacity
+    )
+    counts = Counter()
+
+    for item in scan:
+        kind = status_kind(item.get('status'))
+        counts[kind] += 1
+        if kind == STRING_FALSE:
+            print(f"Found string 'false': {item.get('student_id')}, session: {item.get('record_id')}")
+
+    return counts, scan.stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Audit the status attribute of student records')
+    parser.add_argument('--session', help='also print the records of this session (record_id)')
+    parser.add_argument('--workers', type=int, default=SCAN_WORKERS)
+    parser.add_argument('--segments', type=int, help='scan segments (default: one per worker)')
+    parser.add_argument('--rcu', type=float, default=SCAN_READ_CAPACITY,
+                        help='max read capacity units per second (0 = unlimited)')
+    args = parser.parse_args()
+
+    if args.session:
+        print_session(args.session)
+
+    counts, stats = audit_status(args.workers, args.segments, args.rcu)
+
+    print(f"\nSummary:")
+    print(f"  Students with status='false' (string): {counts[STRING_FALSE]}")
+    print(f"  Students with status=False (boolean): {counts[BOOL_FALSE]}")
+    print(f"  Students with status='true' (string): {counts[STRING_TRUE]}")
+    print(f"  Students with status=True (boolean): {counts[BOOL_TRUE]}")
+    for kind in sorted(set(counts) - {STRING_FALSE, BOOL_FALSE, STRING_TRUE, BOOL_TRUE}):
+        print(f"  Students with status {kind}: {counts[kind]}")
+
+    rate = stats['scanned'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"\nScanned {stats['scanned']} items in {stats['pages']} pages over {stats['segments']} segments "
+          f"({stats['workers']} workers): {stats['seconds']}s, {rate:,.0f} items/s, "
+          f"{stats['consumed_capacity']:,.1f} RCU")
@@ -0,0 +1,158 @@
+"""
+Server-side chatbot conversations
+
+One item per conversation in the StudentlyticsConversations table
+(partition key `conversation_id`, TTL attribute `expires_at`):
+
+  - turns: past turns, each {'question', 'answer', 'messages'}, where
+    messages is the turn's full Bedrock message list (tool_use /
+    tool_result included)
+  - tool_results: results of the tool calls made so far, by cache key,
+    with the session versions they were computed at (see tool_cache.py)
+  - owner: the caller that started it (see caller_identity)
+
+Conversation ids are generated here (uuid4), never taken from the client,
+and a stored conversation is only resumed by its owner: any other caller
+sending its id gets a new conversation.
+
+History sent back to the model is compacted: the last FULL_TURNS turns
+keep their messages, older turns are collapsed to question + answer, and
+at most MAX_TURNS turns are kept. JSON is stored as strings, so nested
+tool results round-trip unchanged and the item stays well under 400 KB.
+"""
+import json
+import os
+import time
+import uuid
+
+import aws_clients
+import structured_log
+
+CONVERSATIONS_TABLE = os.environ.get('CONVERSATIONS_TABLE', 'StudentlyticsConversations')
+CONVERSATION_TTL_SEC = int(os.environ.get('CONVERSATION_TTL_SEC', '3600'))
+MAX_TURNS = int(os.environ.get('CONVERSATION_MAX_TURNS', '10'))
+FULL_TURNS = int(os.environ.get('CONVERSATION_FULL_TURNS', '2'))
+MAX_TOOL_RESULTS = int(os.environ.get('CONVERSATION_MAX_TOOL_RESULTS', '20'))
+
+# Stay clear of the 400 KB item limit
+MAX_ITEM_CHARS = 300000
+
+table = aws_clients.lazy_table(CONVERSATIONS_TABLE)
+log = structured_log.get_logger('conversation_store')
+
+
+def caller_identity(event):
+    """
+    Who is calling, from the API Gateway request context
+
+    The authorizer's principal (Cognito / JWT `sub`, Lambda authorizer
+    principalId, IAM caller), else the WebSocket connection id; None for
+    anonymous callers (direct invocation), whose conversations are only
+    protected by their unguessable id.
+    """
+    request_context = event.get('requestContext') or {}
+    authorizer = request_context.get('authorizer') or {}
+    claims = authorizer.get('claims') or (authorizer.get('jwt') or {}).get('claims') or {}
+    identity = request_context.get('identity') or {}
+
+    for caller in (claims.get('sub'), authorizer.get('principalId'), identity.get('userArn'),
+                   identity.get('cognitoIdentityId'), request_context.get('connectionId')):
+        if caller:
+            return str(caller)
+    return None
+
+
+def new_conversation(owner=None):
+    return {
+        'conversation_id': str(uuid.uuid4()),
+        'owner': owner,
+        'turns': [],
+        'tool_results': {}
+    }
+
+
+def load_conversation(conversation_id, owner=None):
+    """
+    The stored conversation, or a new one (none given, unknown or expired id,
+    or the conversation belongs to another caller)
+    """
+    if not conversation_id:
+        return new_conversation(owner)
+
+    item = table.get_item(Key={'conversation_id': conversation_id}).get('Item')
+
+    # TTL deletion is lazy - an expired item can still be returned
+    if not item or int(item.get('expires_at', 0)) < time.time():
+        return new_conversation(owner)
+
+    if item.get('owner') != owner:
+        log.warning("Conversation of another caller", conversation_id=conversation_id)
+        return new_conversation(owner)
+
+    return {
+        'conversation_id': conversation_id,
+        'owner': owner,
+        'turns': json.loads(item.get('turns', '[]')),
+        'tool_results': json.loads(item.get('tool_results', '{}'))
+    }
+
+
+def history_messages(conversation):
+    """Compacted Bedrock message history of the conversation's past turns"""
+    turns = conversation['turns']
+    messages = []
+
+    for index, turn in enumerate(turns):
+        full = index >= len(turns) - FULL_TURNS
+        turn_messages = turn.get('messages') or []
+
+        # Full turns must end with the assistant's answer to keep roles alternating
+        if full and turn_messages and turn_messages[-1]['role'] == 'assistant':
+            messages.extend(turn_messages)
+        else:
+            messages.append({'role': 'user', 'content': turn['question']})
+            messages.append({'role': 'assistant', 'content': turn['answer']})
+
+    return messages
+
+
+def add_turn(conversation, question, answer, messages):
+    """Record a finished turn, dropping the oldest ones beyond MAX_TURNS"""
+    conversation['turns'].append({
+        'question': question,
+        'answer': answer,
+        'messages': messages
+    })
+    del conversation['turns'][:-MAX_TURNS]
+
+
+def save_conversation(conversation):
+    """Write the conversation back, extending its TTL"""
+    tool_results = conversation['tool_results']
+    for key in list(tool_results)[:-MAX_TOOL_RESULTS]:
+        del tool_results[key]
+
+    turns_json = json.dumps(conversation['turns'], default=str)
+    results_json = json.dumps(tool_results, default=str)
+
+    # Too large: keep fewer full turns / results rather than failing the write
+    while len(turns_json) + len(results_json) > MAX_ITEM_CHARS and (tool_results or conversation['turns']):
+        if tool_results:
+            del tool_results[next(iter(tool_results))]
+        else:
+            del conversation['turns'][0]
+        turns_json = json.dumps(conversation['turns'], default=str)
+        results_json = json.dumps(tool_results, default=str)
+
+    now = int(time.time())
+    item = {
+        'conversation_id': conversation['conversation_id'],
+        'turns': turns_json,
+        'tool_results': results_json,
+        'turn_count': len(conversation['turns']),
+        'updated_at': now,
+        'expires_at': now + CONVERSATION_TTL_SEC
+    }
+    if conversation.get('owner'):
+        item['owner'] = conversation['owner']
+    table.put_item(Item=item)
@@ -0,0 +1,116 @@
+"""
+Bulk DynamoDB writes with BatchWriteItem
+
+Items are split into 25-item chunks (the BatchWriteItem limit), chunks are
+written concurrently on a thread pool, and UnprocessedItems are retried
+with exponential backoff and jitter. Every chunk gets a report, so callers
+can tell exactly what was and was not written.
+
+The low-level client is used (clients are thread-safe, resources are not);
+items are plain Python / Decimal values and are serialized here.
+"""
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+BATCH_SIZE = 25
+MAX_WORKERS = int(os.environ.get('BATCH_WRITE_WORKERS', '8'))
+MAX_RETRIES = int(os.environ.get('BATCH_WRITE_MAX_RETRIES', '8'))
+BASE_BACKOFF_SEC = 0.05
+MAX_BACKOFF_SEC = 5.0
+
+RETRYABLE_ERRORS = (
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+)
+
+dynamodb_client = aws_clients.lazy_client('dynamodb', max_pool_connections=MAX_WORKERS * 2)
+
+_serializer = None
+
+
+def chunked(items, size=BATCH_SIZE):
+    """Split a list into consecutive chunks of at most `size` items"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def backoff(attempt):
+    """Sleep with exponential backoff and full jitter"""
+    time.sleep(random.uniform(0, min(MAX_BACKOFF_SEC, BASE_BACKOFF_SEC * (2 ** attempt))))
+
+
+def serialize_item(item):
+    """Convert a Python item to DynamoDB attribute values"""
+    global _serializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeSerializer
+        _serializer = TypeSerializer()
+    return {key: _serializer.serialize(value) for key, value in item.items()}
+
+
+def write_chunk(table_name, chunk_index, items):
+    """
+    Write one chunk (<= 25 items), retrying unprocessed items with backoff
+
+    Returns a report: {'chunk', 'items', 'written', 'failed', 'retries', 'error'}
+    """
+    requests = [{'PutRequest': {'Item': serialize_item(item)}} for item in items]
+    retries = 0
+    error = None
+
+    while requests:
+        try:
+            response = dynamodb_client.batch_write_item(RequestItems={table_name: requests})
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+            error = None
+        except ClientError as e:
+            error = e.response['Error']['Code']
+            if error not in RETRYABLE_ERRORS:
+                error = str(e)
+                break
+
+        if not requests:
+            break
+
+        if retries >= MAX_RETRIES:
+            error = error or f"{len(requests)} items still unprocessed after {retries} retries"
+            break
+
+        backoff(retries)
+        retries += 1
+
+    return {
+        'chunk': chunk_index,
+        'items': len(items),
+        'written': len(items) - len(requests),
+        'failed': len(requests),
+        'retries': retries,
+        'error': error
+    }
+
+
+def batch_put_items(table_name, items, max_workers=None):
+    """
+    Put all items into a table with concurrent BatchWriteItem calls
+
+    Returns the per-chunk reports in chunk order.
+    """
+    chunks = chunked(list(items))
+    if not chunks:
+        return []
+
+    workers = min(max_workers or MAX_WORKERS, len(chunks))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(write_chunk, table_name, index, chunk)
+            for index, chunk in enumerate(chunks)
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,411 @@
+"""
+Incremental per-student aggregation of Rekognition face search results
+
+get_face_search pages are fed in one at a time with add_persons_page and
+then dropped. Only running statistics are kept per student, so memory
+grows with the roster size, not with the length of the video.
+
+Presence is kept as run-length intervals: a student's detections are
+merged into [start, end] runs (ms), and detections no more than
+PRESENCE_GAP_SEC apart join the same run. A student who leaves for longer
+than that starts a new run when they come back. Memory per student is
+bounded by the number of runs, not by the number of frames. The output
+has both the span (first to last detection) and the covered time.
+
+A detection stands for the time around it, not an instant: for the
+covered time every run is widened by half the gap tolerance on each side,
+clipped to the span (see covered_ms). A student seen every 90 seconds
+still gets most of the lecture counted, while a 40-minute absence does
+not.
+
+Each page is converted to typed NumPy columns (student index, timestamp
+and one float column per metric) and all per-student statistics are
+updated in one grouped pass. Without NumPy the same statistics are
+updated row by row.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # row-by-row fallback below
+    np = None
+
+import os
+
+import structured_log
+
+log = structured_log.get_logger('face_search_aggregator')
+
+# (running-sum field, output field, decimals) for every averaged metric
+METRICS = [
+    ('confidence', 'AvgConfidence', 1),
+    ('similarity', 'AvgSimilarity', 1),
+    ('yaw', 'AvgYaw', 2),
+    ('pitch', 'AvgPitch', 2),
+    ('roll', 'AvgRoll', 2),
+    ('brightness', 'AvgBrightness', 1),
+    ('sharpness', 'AvgSharpness', 2),
+    ('bbox_size', 'AvgBoundingBoxSize', 5),
+]
+
+MIN_SIMILARITY = 80
+
+# Detections of one student at most this far apart belong to the same
+# presence run; keep it above the gap between sampled frames
+PRESENCE_GAP_MS = int(float(os.environ.get('PRESENCE_GAP_SEC', '60')) * 1000)
+
+_EMPTY = {}
+
+
+def new_aggregate():
+    """Return an empty aggregate (plain dict, JSON-serializable)"""
+    return {
+        'total_detections': 0,
+        'students': {}
+    }
+
+
+def new_student_stats():
+    """Return empty running statistics for one student"""
+    stats = {
+        'count': 0,
+        # Merged presence runs, [[start_ms, end_ms], ...] in time order
+        'runs': []
+    }
+    for name, _, _ in METRICS:
+        stats[name] = 0
+    return stats
+
+
+def add_runs(runs, new_runs, gap_ms=PRESENCE_GAP_MS):
+    """
+    Merge time-ordered [start, end] runs into runs (in place)
+
+    Runs at most gap_ms apart are joined. Pages arrive in timestamp
+    order, so new runs usually start after the existing ones and are
+    folded in one pass. Otherwise (merged segments) everything is sorted
+    and merged again.
+    """
+    if runs and new_runs and new_runs[0][0] < runs[-1][0]:
+        new_runs = sorted(runs + list(new_runs))
+        runs.clear()
+
+    for start, end in new_runs:
+        if runs and start - runs[-1][1] <= gap_ms:
+            if end > runs[-1][1]:
+                runs[-1][1] = end
+        else:
+            runs.append([start, end])
+
+    return runs
+
+
+def covered_ms(runs, gap_ms=PRESENCE_GAP_MS):
+    """
+    Time covered by merged runs (ms): each run widened by gap_ms / 2 on
+    both sides, clipped to the span from the first to the last detection
+
+    Widened runs cannot overlap, because merged runs are more than gap_ms apart.
+    """
+    if not runs:
+        return 0
+    first, last = runs[0][0], runs[-1][1]
+    half_gap = gap_ms / 2
+    return sum(min(end + half_gap, last) - max(start - half_gap, first) for start, end in runs)
+
+
+def page_runs(student_index, timestamps, students, gap_ms=PRESENCE_GAP_MS):
+    """
+    Presence runs of one page per student position (one pass over the
+    page sorted by student, then timestamp)
+    """
+    runs = [[] for _ in range(students)]
+    if not len(timestamps):
+        return runs
+
+    order = np.lexsort((timestamps, student_index))
+    sorted_index = student_index[order]
+    sorted_timestamps = timestamps[order]
+
+    # A run ends where the student changes or the next detection is too far off
+    breaks = np.flatnonzero((np.diff(sorted_index) != 0) | (np.diff(sorted_timestamps) > gap_ms)) + 1
+    firsts = np.concatenate(([0], breaks))
+    lasts = np.concatenate((breaks - 1, [len(sorted_timestamps) - 1]))
+
+    for position, start, end in zip(
+        sorted_index[firsts].tolist(), sorted_timestamps[firsts].tolist(), sorted_timestamps[lasts].tolist()
+    ):
+        runs[position].append([start, end])
+    return runs
+
+
+def extract_detection(person):
+    """
+    Pull the matched student and face metrics out of one Persons entry
+
+    Returns (student_id, timestamp_ms, values) with values in METRICS
+    order, or None if the detection does not match a student with
+    enough similarity.
+    """
+    timestamp_ms = person.get('Timestamp', 0)
+    face_matches = person.get('FaceMatches', [])
+
+    if not face_matches:
+        return None
+
+    best_match = face_matches[0]
+    matched_face = best_match.get('Face', {})
+    similarity = best_match.get('Similarity', 0)
+
+    if similarity < MIN_SIMILARITY:
+        return None
+
+    try:
+        student_id = str(int(matched_face['ExternalImageId']))
+    except (ValueError, KeyError):
+        return None
+
+    # Get face details
+    person_face = person.get('Person', {}).get('Face', {})
+    pose = person_face.get('Pose', {})
+    quality = person_face.get('Quality', {})
+    bbox = person_face.get('BoundingBox', {})
+
+    values = (
+        person_face.get('Confidence', 0),
+        similarity,
+        pose.get('Yaw', 0),
+        pose.get('Pitch', 0),
+        pose.get('Roll', 0),
+        quality.get('Brightness', 0),
+        quality.get('Sharpness', 0),
+        bbox.get('Width', 0) * bbox.get('Height', 0)
+    )
+
+    return student_id, timestamp_ms, values
+
+
+def page_columns(persons):
+    """
+    Convert one page of Persons into typed columns
+
+    Same filtering as extract_detection, inlined: this loop is the hot
+    path, and ExternalImageId -> student_id parsing is done once per
+    distinct id instead of once per detection.
+
+    Returns (student_ids, student_index, timestamps, values):
+      - student_ids:   distinct student ids in the page, in first-seen order
+      - student_index: int32 array, position of each row's student in student_ids
+      - timestamps:    int64 array of detection timestamps (ms)
+      - values:        float64 array of shape (rows, len(METRICS))
+    """
+    positions = {}
+    raw_positions = {}
+    student_index = []
+    timestamps = []
+    flat_values = []
+
+    for person in persons:
+        face_matches = person.get('FaceMatches')
+        if not face_matches:
+            continue
+
+        best_match = face_matches[0]
+        similarity = best_match.get('Similarity', 0)
+        if similarity < MIN_SIMILARITY:
+            continue
+
+        external_id = best_match.get('Face', _EMPTY).get('ExternalImageId')
+        position = raw_positions.get(external_id)
+        if position is None:
+            try:
+                student_id = str(int(external_id))
+            except (TypeError, ValueError):
+                continue
+            position = positions.get(student_id)
+            if position is None:
+                position = positions[student_id] = len(positions)
+            raw_positions[external_id] = position
+
+        person_face = person.get('Person', _EMPTY).get('Face', _EMPTY)
+        pose = person_face.get('Pose', _EMPTY)
+        quality = person_face.get('Quality', _EMPTY)
+        bbox = person_face.get('BoundingBox', _EMPTY)
+
+        student_index.append(position)
+        timestamps.append(person.get('Timestamp', 0))
+        flat_values.extend((
+            person_face.get('Confidence', 0),
+            similarity,
+            pose.get('Yaw', 0),
+            pose.get('Pitch', 0),
+            pose.get('Roll', 0),
+            quality.get('Brightness', 0),
+            quality.get('Sharpness', 0),
+            bbox.get('Width', 0) * bbox.get('Height', 0)
+        ))
+
+    return (
+        list(positions),
+        np.array(student_index, dtype=np.int32),
+        np.array(timestamps, dtype=np.int64),
+        np.array(flat_values, dtype=np.float64).reshape(len(timestamps), len(METRICS))
+    )
+
+
+def add_persons_page(aggregate, persons):
+    """
+    Fold one page of get_face_search Persons into the aggregate
+
+    The page is not referenced after this returns.
+    """
+    aggregate['total_detections'] += len(persons)
+
+    if np is None:
+        return _add_persons_page_rows(aggregate, persons)
+
+    student_ids, student_index, timestamps, values = page_columns(persons)
+    if not student_ids:
+        return aggregate
+
+    students = aggregate['students']
+    page_stats = [students.get(student_id) or new_student_stats() for student_id in student_ids]
+
+    # Seed the grouped pass with the running values, so sums continue in
+    # detection order exactly like the row-by-row path
+    counts = np.bincount(student_index, minlength=len(student_ids))
+    sums = np.array(
+        [[stats[name] for name, _, _ in METRICS] for stats in page_stats],
+        dtype=np.float64
+    )
+    np.add.at(sums, student_index, values)
+
+    runs = page_runs(student_index, timestamps, len(student_ids))
+
+    for position, (student_id, stats) in enumerate(zip(student_ids, page_stats)):
+        stats['count'] += int(counts[position])
+        add_runs(stats['runs'], runs[position])
+
+        for column, (name, _, _) in enumerate(METRICS):
+            stats[name] = float(sums[position, column])
+
+        students[student_id] = stats
+
+    return aggregate
+
+
+def _add_persons_page_rows(aggregate, persons):
+    """Row-by-row fallback of add_persons_page (no NumPy)"""
+    students = aggregate['students']
+
+    for person in persons:
+        detection = extract_detection(person)
+        if detection is None:
+            continue
+
+        student_id, timestamp_ms, values = detection
+
+        stats = students.get(student_id)
+        if stats is None:
+            stats = students[student_id] = new_student_stats()
+
+        stats['count'] += 1
+        add_runs(stats['runs'], [[timestamp_ms, timestamp_ms]])
+
+        for (name, _, _), value in zip(METRICS, values):
+            stats[name] += value
+
+    return aggregate
+
+
+def merge_aggregates(aggregate, other, offset_ms=0):
+    """
+    Fold another aggregate (e.g. of one video segment) into aggregate
+
+    offset_ms re-bases the other aggregate's timestamps: a segment's
+    detections are timed from the start of the segment, not of the video.
+    All statistics are running sums and presence runs are merged with the
+    same gap tolerance, so merging segment aggregates gives the same
+    student_data as aggregating the whole video in one job.
+    """
+    aggregate['total_detections'] += other['total_detections']
+    students = aggregate['students']
+
+    for student_id, other_stats in other['students'].items():
+        if not other_stats['count']:
+            continue
+
+        stats = students.get(student_id)
+        if stats is None:
+            stats = students[student_id] = new_student_stats()
+
+        stats['count'] += other_stats['count']
+
+        add_runs(stats['runs'], [[start + offset_ms, end + offset_ms] for start, end in other_stats['runs']])
+
+        for name, _, _ in METRICS:
+            stats[name] += other_stats[name]
+
+    return aggregate
+
+
+def build_student_data(aggregate, expected_student_ids):
+    """
+    Build the `student_data` dict for ALL expected students
+
+    Students that were never detected get an absent record with zeros.
+    """
+    students = aggregate['students']
+    results = {}
+
+    for student_id in expected_student_ids:
+        student_id_str = str(student_id)
+        stats = students.get(student_id_str)
+
+        if stats and stats['count']:
+            # Student WAS detected - calculate metrics
+            count = stats['count']
+            runs = stats['runs']
+            timestamp_start = runs[0][0]
+            timestamp_end = runs[-1][1]
+            presence_duration_sec = (timestamp_end - timestamp_start) / 1000.0
+            covered_duration_sec = covered_ms(runs) / 1000.0
+
+            record = {
+                'StudentName': student_id_str,
+                'TimestampStart': timestamp_start,
+                'TimestampEnd': timestamp_end,
+                'DetectionCount': count,
+                # Span from first to last detection, and the part of it in presence runs
+                'PresenceDuration(sec)': round(presence_duration_sec, 2),
+                'CoveredDuration(sec)': round(covered_duration_sec, 2),
+                'PresenceRuns': [[start, end] for start, end in runs]
+            }
+            for name, field, decimals in METRICS:
+                record[field] = round(stats[name] / count, decimals)
+
+            results[student_id_str] = record
+
+            structured_log.count('students_present')
+            log.item("Student present", student_id=student_id, presence_sec=round(presence_duration_sec, 1),
+                     covered_sec=round(covered_duration_sec, 1), runs=len(runs))
+
+        else:
+            # Student was NOT detected - create absent record with zeros
+            record = {
+                'StudentName': student_id_str,
+                'TimestampStart': 0,
+                'TimestampEnd': 0,
+                'DetectionCount': 0,
+                'PresenceDuration(sec)': 0,
+                'CoveredDuration(sec)': 0,
+                'PresenceRuns': []
+            }
+            for _, field, _ in METRICS:
+                record[field] = 0
+
+            results[student_id_str] = record
+
+            structured_log.count('students_absent')
+            log.item("Student absent", student_id=student_id)
+
+    return results
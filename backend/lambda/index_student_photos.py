@@ -1,16 +1,35 @@
-import boto3
+import json
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
 from botocore.exceptions import ClientError
 
+import aws_clients
+from rate_limiter import RateLimiter
+
+# Worker pool size and IndexFaces calls per second (stay under the Rekognition TPS limit)
+INDEX_WORKERS = int(os.environ.get('INDEX_WORKERS', '8'))
+INDEX_FACES_TPS = float(os.environ.get('INDEX_FACES_TPS', '5'))
+
 # Initialize clients
-rekognition = boto3.client('rekognition', region_name='us-east-1')
-s3 = boto3.client('s3', region_name='us-east-1')
+rekognition = aws_clients.lazy_client('rekognition', max_pool_connections=INDEX_WORKERS)
+s3 = aws_clients.lazy_client('s3')
 
 # Configuration
 BUCKET_NAME = 'hackathon-attendance-media'  # Your bucket name
 COLLECTION_ID = 'hackathon-student-faces'
 PHOTOS_PREFIX = 'photos/'
 
+# Persisted photo key -> {etag, face_id, student_id}: only new or changed photos are indexed
+FACE_INDEX_MANIFEST_KEY = 'manifests/face_index.json'
+CHECKPOINT_EVERY = 500
+
+THROTTLING_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException')
+MAX_THROTTLE_RETRIES = 6
+
 def index_student_photo(bucket, photo_key, student_id):
     """
     Index a single student photo into Rekognition collection
@@ -19,7 +38,19 @@ def index_student_photo(bucket, photo_key, student_id):
         bucket: S3 bucket name
         photo_key: S3 key of the photo (e.g., 'photos/student_12345.jpg')
         student_id: Student ID to use as external ID
+    
+    Throttled calls are retried with exponential backoff.
     """
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        try:
+            return _index_faces(bucket, photo_key, student_id)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in THROTTLING_ERRORS or attempt == MAX_THROTTLE_RETRIES:
+                raise
+            time.sleep(random.uniform(0, 0.2 * (2 ** attempt)))
+
+
+def _index_faces(bucket, photo_key, student_id):
     try:
         response = rekognition.index_faces(
             CollectionId=COLLECTION_ID,
@@ -49,70 +80,191 @@ def index_student_photo(bucket, photo_key, student_id):
             print(f"❌ Invalid image format for student {student_id}")
         elif error_code == 'InvalidS3ObjectException':
             print(f"❌ Cannot access S3 object: {photo_key}")
+        elif error_code in THROTTLING_ERRORS:
+            raise
         else:
             print(f"❌ Error indexing student {student_id}: {e}")
         return None
 
-def index_all_student_photos():
+def load_face_index(bucket=BUCKET_NAME):
+    """Read the photo key -> {etag, face_id, student_id} manifest ({} if missing)"""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=FACE_INDEX_MANIFEST_KEY)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return {}
+        raise
+    return json.loads(response['Body'].read().decode('utf-8')).get('photos', {})
+
+
+def save_face_index(photos, bucket=BUCKET_NAME):
+    """Persist the face index manifest"""
+    s3.put_object(
+        Bucket=bucket,
+        Key=FACE_INDEX_MANIFEST_KEY,
+        Body=json.dumps({
+            'updated_at': datetime.now().isoformat(),
+            'collection_id': COLLECTION_ID,
+            'photos': photos
+        }, separators=(',', ':')),
+        ContentType='application/json'
+    )
+
+
+def list_student_photos(bucket=BUCKET_NAME):
     """
-    Index all student photos from S3 photos folder
+    List every student photo under photos/ (all pages)
+
+    Returns {photo_key: (student_id, etag)}
+    """
+    photos = {}
+    paginator = s3.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=PHOTOS_PREFIX):
+        for obj in page.get('Contents', []):
+            photo_key = obj['Key']
+            filename = os.path.basename(photo_key)
+
+            # Assuming format: photos/student_12345.jpg
+            if not filename.startswith('student_'):
+                if filename:
+                    print(f"⚠️ Skipping file (invalid naming): {filename}")
+                continue
+
+            try:
+                student_id = int(filename.replace('student_', '').split('.')[0])
+            except ValueError:
+                print(f"⚠️ Invalid student ID format in filename: {filename}")
+                continue
+
+            photos[photo_key] = (student_id, obj['ETag'])
+
+    return photos
+
+
+def faces_by_student():
+    """Map ExternalImageId -> [FaceId] for every face in the collection (all pages)"""
+    faces = {}
+    paginator = rekognition.get_paginator('list_faces')
+
+    for page in paginator.paginate(CollectionId=COLLECTION_ID):
+        for face in page.get('Faces', []):
+            faces.setdefault(face.get('ExternalImageId'), []).append(face['FaceId'])
+
+    return faces
+
+
+def delete_faces(face_ids):
+    """Remove stale faces from the collection"""
+    face_ids = [face_id for face_id in face_ids if face_id]
+    for i in range(0, len(face_ids), 4096):
+        rekognition.delete_faces(CollectionId=COLLECTION_ID, FaceIds=face_ids[i:i + 4096])
+
+
+def index_all_student_photos(workers=INDEX_WORKERS, tps=INDEX_FACES_TPS, full=False):
+    """
+    Index new and changed student photos from the S3 photos folder
+
+    Photos whose ETag matches the face index manifest are skipped. Changed
+    photos replace their old face; deleted photos have their face removed.
+    Every other face of a student being indexed that the manifest does not
+    know (e.g. indexed after the last checkpoint of a crashed run) is
+    removed too, so re-running never leaves duplicates.
+    IndexFaces calls run on a worker pool, limited to `tps` calls per second.
+
+    Args:
+        workers: worker pool size
+        tps: max IndexFaces calls per second
+        full: ignore the manifest and re-index every photo
     """
     print(f"🔍 Searching for student photos in s3://{BUCKET_NAME}/{PHOTOS_PREFIX}")
-    
+
     try:
-        # List all photos in the photos folder
-        response = s3.list_objects_v2(
-            Bucket=BUCKET_NAME,
-            Prefix=PHOTOS_PREFIX
-        )
-        
-        if 'Contents' not in response:
-            print("⚠️ No photos found in the photos folder!")
-            return
-        
-        photos = [obj for obj in response['Contents'] if not obj['Key'].endswith('/')]
-        print(f"📸 Found {len(photos)} photos to index\n")
-        
-        indexed_count = 0
-        failed_count = 0
-        
-        for photo_obj in photos:
-            photo_key = photo_obj['Key']
-            
-            # Extract student ID from filename
-            # Assuming format: photos/student_12345.jpg
-            filename = os.path.basename(photo_key)
-            
-            # Extract student ID (between 'student_' and file extension)
-            if filename.startswith('student_'):
-                student_id = filename.replace('student_', '').split('.')[0]
-                
-                # Try to convert to int to validate
-                try:
-                    student_id_int = int(student_id)
-                    
-                    # Index the photo
-                    face_id = index_student_photo(BUCKET_NAME, photo_key, student_id_int)
-                    
-                    if face_id:
-                        indexed_count += 1
-                    else:
-                        failed_count += 1
-                        
-                except ValueError:
-                    print(f"⚠️ Invalid student ID format in filename: {filename}")
-                    failed_count += 1
-            else:
-                print(f"⚠️ Skipping file (invalid naming): {filename}")
-                failed_count += 1
-        
-        print(f"\n{'='*50}")
-        print(f"✅ Successfully indexed: {indexed_count} students")
-        print(f"❌ Failed: {failed_count} photos")
-        print(f"{'='*50}")
-        
+        photos = list_student_photos()
     except ClientError as e:
         print(f"❌ Error accessing S3: {e}")
+        return
+
+    indexed = {} if full else load_face_index()
+
+    to_index = [
+        (photo_key, student_id, etag)
+        for photo_key, (student_id, etag) in photos.items()
+        if indexed.get(photo_key, {}).get('etag') != etag
+    ]
+    removed = [photo_key for photo_key in indexed if photo_key not in photos]
+
+    # Faces the manifest does not account for (no manifest, or indexed after
+    # the last checkpoint of a run that died) are replaced per student
+    stale_faces = {}
+    if to_index:
+        reindexed = {photo_key for photo_key, _, _ in to_index}
+        kept = {entry.get('face_id') for photo_key, entry in indexed.items() if photo_key not in reindexed}
+        students = {str(student_id) for _, student_id, _ in to_index}
+        stale_faces = {
+            external_id: [face_id for face_id in face_ids if face_id not in kept]
+            for external_id, face_ids in faces_by_student().items()
+            if external_id in students
+        }
+
+    print(f"📸 Found {len(photos)} photos: {len(to_index)} new or changed, "
+          f"{len(photos) - len(to_index)} unchanged, {len(removed)} removed\n")
+
+    if removed:
+        delete_faces([indexed[photo_key].get('face_id') for photo_key in removed])
+        for photo_key in removed:
+            del indexed[photo_key]
+
+    limiter = RateLimiter(tps)
+
+    def index_one(photo_key, student_id):
+        limiter.acquire()
+        return index_student_photo(BUCKET_NAME, photo_key, student_id)
+
+    indexed_count = 0
+    failed_count = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {
+            pool.submit(index_one, photo_key, student_id): (photo_key, student_id, etag)
+            for photo_key, student_id, etag in to_index
+        }
+
+        for future in as_completed(futures):
+            photo_key, student_id, etag = futures[future]
+
+            try:
+                face_id = future.result()
+            except Exception as e:
+                print(f"❌ Error indexing student {student_id}: {e}")
+                face_id = None
+
+            if not face_id:
+                failed_count += 1
+                continue
+
+            # The new face is in; drop whatever this photo (or student) had before
+            previous = indexed.get(photo_key, {}).get('face_id')
+            delete_faces([previous] + stale_faces.pop(str(student_id), []))
+
+            indexed[photo_key] = {
+                'etag': etag,
+                'face_id': face_id,
+                'student_id': student_id
+            }
+            indexed_count += 1
+
+            if indexed_count % CHECKPOINT_EVERY == 0:
+                save_face_index(indexed)
+
+    save_face_index(indexed)
+
+    print(f"\n{'='*50}")
+    print(f"✅ Successfully indexed: {indexed_count} students")
+    print(f"⏭️  Unchanged (skipped): {len(photos) - len(to_index)} photos")
+    print(f"❌ Failed: {failed_count} photos")
+    print(f"{'='*50}")
+
 
 def list_indexed_faces():
     """
@@ -137,10 +289,18 @@ def list_indexed_faces():
         return []
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Index student photos into the Rekognition collection')
+    parser.add_argument('--workers', type=int, default=INDEX_WORKERS)
+    parser.add_argument('--tps', type=float, default=INDEX_FACES_TPS, help='max IndexFaces calls per second')
+    parser.add_argument('--full', action='store_true', help='re-index every photo, ignoring the manifest')
+    args = parser.parse_args()
+
     print("🎓 Student Photo Indexing System\n")
     
-    # Index all photos
-    index_all_student_photos()
+    # Index new and changed photos
+    index_all_student_photos(workers=args.workers, tps=args.tps, full=args.full)
     
     # List what's in the collection
     list_indexed_faces()
\ No newline at end of file
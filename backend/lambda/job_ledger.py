@@ -0,0 +1,231 @@
+"""
+Job ledger: one face search run per distinct video
+
+Lambda 1 fingerprints every uploaded video and claims the fingerprint in
+the RekognitionJobQueue table (pk='ledger#{fingerprint}', sk='ledger'):
+
+  - new:       no entry yet - this job runs face search and owns the entry
+  - complete:  a run already produced results - reuse its results object
+  - in_flight: a run is in progress - wait for it (task token in `waiters`)
+
+The owner marks the entry complete once its results object is saved
+(Lambda 2) and resumes every waiter with the results key; if the owner
+fails, the entry is released and the waiters fail with it.
+
+The fingerprint covers the video content plus everything else the results
+depend on: the face collection and the expected student ids. Content is
+identified by size plus a hash of sampled byte ranges (default), or by
+size plus ETag (DEDUPE_FINGERPRINT=etag; cheaper, but multipart ETags
+change with the upload's part size).
+"""
+import hashlib
+import json
+import os
+import time
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+JOB_LEDGER_TABLE = os.environ.get('JOB_QUEUE_TABLE', 'RekognitionJobQueue')
+
+# 'sample' | 'etag' | 'off'
+DEDUPE_FINGERPRINT = os.environ.get('DEDUPE_FINGERPRINT', 'sample')
+SAMPLE_COUNT = int(os.environ.get('DEDUPE_SAMPLE_COUNT', '4'))
+SAMPLE_BYTES = int(os.environ.get('DEDUPE_SAMPLE_BYTES', str(256 * 1024)))
+
+# A 'running' entry older than this is assumed dead and can be taken over
+STALE_RUN_SEC = int(os.environ.get('DEDUPE_STALE_RUN_SEC', '21600'))
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETE = 'complete'
+
+table = aws_clients.lazy_table(JOB_LEDGER_TABLE)
+s3 = aws_clients.lazy_client('s3')
+stepfunctions = aws_clients.lazy_client('stepfunctions')
+
+
+def ledger_key(fingerprint):
+    return {'pk': f"ledger#{fingerprint}", 'sk': 'ledger'}
+
+
+def sample_offsets(size):
+    """Start offsets of the sampled ranges: first, last and evenly spaced between"""
+    if size <= SAMPLE_COUNT * SAMPLE_BYTES:
+        return [0]
+    last = size - SAMPLE_BYTES
+    return [round(last * index / (SAMPLE_COUNT - 1)) for index in range(SAMPLE_COUNT)]
+
+
+def video_fingerprint(bucket, video_key, head, collection_id, student_ids):
+    """
+    Fingerprint of a video run, or None when deduplication is off
+
+    head is the video's head_object response (size and ETag).
+    """
+    if DEDUPE_FINGERPRINT == 'off':
+        return None
+
+    size = head['ContentLength']
+    digest = hashlib.sha256()
+    digest.update(json.dumps([collection_id, sorted(student_ids), size]).encode('utf-8'))
+
+    if DEDUPE_FINGERPRINT == 'etag':
+        digest.update(head['ETag'].encode('utf-8'))
+    elif size <= SAMPLE_COUNT * SAMPLE_BYTES:
+        digest.update(s3.get_object(Bucket=bucket, Key=video_key)['Body'].read())
+    else:
+        for offset in sample_offsets(size):
+            response = s3.get_object(
+                Bucket=bucket,
+                Key=video_key,
+                Range=f"bytes={offset}-{offset + SAMPLE_BYTES - 1}"
+            )
+            digest.update(response['Body'].read())
+
+    return f"{DEDUPE_FINGERPRINT}-{digest.hexdigest()}"
+
+
+def claim(fingerprint, job_id, record_id):
+    """
+    Claim a fingerprint for a job
+
+    Returns (status, entry): ('new', None) when this job now owns the run,
+    otherwise ('complete' | 'in_flight', the existing entry).
+    """
+    now = int(time.time())
+
+    try:
+        table.put_item(
+            Item={
+                **ledger_key(fingerprint),
+                'status': STATUS_RUNNING,
+                'job_id': job_id,
+                'record_id': record_id,
+                'started_at': now
+            },
+            ConditionExpression='attribute_not_exists(pk) OR (#status = :running AND started_at < :stale)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':running': STATUS_RUNNING, ':stale': now - STALE_RUN_SEC}
+        )
+        return 'new', None
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+    entry = table.get_item(Key=ledger_key(fingerprint), ConsistentRead=True).get('Item')
+    if entry is None:
+        # Released between the two calls - try again
+        return claim(fingerprint, job_id, record_id)
+
+    return ('complete' if entry['status'] == STATUS_COMPLETE else 'in_flight'), entry
+
+
+def forget(fingerprint, job_id):
+    """Drop a complete entry whose results are gone (e.g. deleted)"""
+    try:
+        table.delete_item(
+            Key=ledger_key(fingerprint),
+            ConditionExpression='job_id = :job_id',
+            ExpressionAttributeValues={':job_id': job_id}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def add_waiter(fingerprint, task_token):
+    """
+    Park a duplicate job's task token on a running entry
+
+    Returns None if parked, otherwise the entry as it is now (complete, or
+    None if the run was released) - the caller resumes the task itself.
+    """
+    try:
+        table.update_item(
+            Key=ledger_key(fingerprint),
+            UpdateExpression='SET waiters = list_append(if_not_exists(waiters, :empty), :token)',
+            ConditionExpression='#status = :running',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':empty': [], ':token': [task_token], ':running': STATUS_RUNNING}
+        )
+        return None
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+    return table.get_item(Key=ledger_key(fingerprint), ConsistentRead=True).get('Item') or {}
+
+
+def duplicate_output(entry):
+    """What a waiting duplicate job resumes with"""
+    return {
+        'results_key': entry['results_key'],
+        'source_job_id': entry['job_id'],
+        'source_record_id': entry['record_id']
+    }
+
+
+def complete(fingerprint, job_id, results_key):
+    """Mark the owner's run complete and resume its waiters; returns how many"""
+    try:
+        response = table.update_item(
+            Key=ledger_key(fingerprint),
+            UpdateExpression='SET #status = :complete, results_key = :results_key, completed_at = :now REMOVE waiters',
+            ConditionExpression='job_id = :job_id',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':complete': STATUS_COMPLETE,
+                ':results_key': results_key,
+                ':now': int(time.time()),
+                ':job_id': job_id
+            },
+            ReturnValues='ALL_OLD'
+        )
+    except ClientError as e:
+        # Taken over after going stale - the new owner resumes the waiters
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return 0
+        raise
+
+    entry = dict(response.get('Attributes', {}), results_key=results_key)
+    output = json.dumps(duplicate_output(entry))
+    waiters = entry.get('waiters', [])
+    for task_token in waiters:
+        resume(task_token, output=output)
+    return len(waiters)
+
+
+def release(fingerprint, job_id, cause):
+    """Drop the owner's running entry after a failure and fail its waiters"""
+    try:
+        response = table.delete_item(
+            Key=ledger_key(fingerprint),
+            ConditionExpression='job_id = :job_id AND #status = :running',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':job_id': job_id, ':running': STATUS_RUNNING},
+            ReturnValues='ALL_OLD'
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return 0
+        raise
+
+    waiters = response.get('Attributes', {}).get('waiters', [])
+    for task_token in waiters:
+        resume(task_token, error=cause)
+    return len(waiters)
+
+
+def resume(task_token, output=None, error=None):
+    """Resume a waiting duplicate job; an expired token is ignored"""
+    try:
+        if error is None:
+            stepfunctions.send_task_success(taskToken=task_token, output=output)
+        else:
+            stepfunctions.send_task_failure(taskToken=task_token, error='DuplicateSourceFailed', cause=error)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('TaskTimedOut', 'TaskDoesNotExist', 'InvalidToken'):
+            raise
@@ -0,0 +1,323 @@
+"""
+Admission control for Rekognition video jobs
+
+Every face search job (one per video segment) goes through a queue in the
+RekognitionJobQueue table (partition key `pk`, sort key `sk`, both String)
+and only starts while a slot is free:
+
+  - pk='slots',   sk='counter'            in_flight: jobs holding a slot
+  - pk='running', sk=job_id               started_at: one item per slot holder
+  - pk='queue',   sk='{priority}#{job_id}' job: the start event (JSON), waiting
+                                          claimed_until: lease of the admitter starting it
+
+(The same table holds the job ledger of job_ledger.py, pk='ledger#...'.)
+
+Acquiring a slot increments in_flight (only while below MAX_IN_FLIGHT_JOBS)
+and puts the running item in one transaction; releasing deletes it and
+decrements. Both are idempotent per job_id, so a duplicated SNS
+notification cannot free a slot twice. Queue items sort by priority (ms
+timestamp, zero-padded) - class start if known, else upload time - and by
+job_id, which keeps a video's segments together.
+
+An admitter claims a queue item with a lease (a conditional update of
+claimed_until) and deletes it only once the job has started or failed.
+If it dies in between, the lease runs out and the next admitter takes the
+job over; acquire_slot is idempotent and Rekognition dedupes the start by
+its ClientRequestToken (the job_id), so the job starts once.
+"""
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+
+JOB_QUEUE_TABLE = os.environ.get('JOB_QUEUE_TABLE', 'RekognitionJobQueue')
+
+# Rekognition's default quota is 20 concurrent stored video jobs per account
+MAX_IN_FLIGHT_JOBS = int(os.environ.get('MAX_IN_FLIGHT_JOBS', '20'))
+
+# A slot whose job never reported back is reclaimed after this long
+# (matches the RunRekognition task timeout in the state machine)
+SLOT_TIMEOUT_SEC = int(os.environ.get('JOB_SLOT_TIMEOUT_SEC', '21600'))
+
+# A claimed queue item goes back to other admitters after this long
+# (covers start_job with all of its throttling retries)
+CLAIM_LEASE_SEC = int(os.environ.get('JOB_CLAIM_LEASE_SEC', '300'))
+
+# 'class_start' or 'upload'; class start falls back to upload time when unknown
+JOB_PRIORITY = os.environ.get('JOB_PRIORITY', 'class_start')
+
+# Throttled StartFaceSearch calls are retried in place this many times
+START_MAX_RETRIES = int(os.environ.get('JOB_START_MAX_RETRIES', '3'))
+BASE_BACKOFF_SEC = 1.0
+MAX_BACKOFF_SEC = 20.0
+
+THROTTLING_ERRORS = (
+    'LimitExceededException',
+    'ThrottlingException',
+    'ProvisionedThroughputExceededException',
+)
+
+SLOTS_KEY = {'pk': 'slots', 'sk': 'counter'}
+RUNNING_PARTITION = 'running'
+QUEUE_PARTITION = 'queue'
+
+table = aws_clients.lazy_table(JOB_QUEUE_TABLE)
+dynamodb_client = aws_clients.lazy_client('dynamodb')
+
+
+def backoff(attempt):
+    """Sleep with exponential backoff and full jitter"""
+    time.sleep(random.uniform(0, min(MAX_BACKOFF_SEC, BASE_BACKOFF_SEC * (2 ** attempt))))
+
+
+def is_throttling(error):
+    return isinstance(error, ClientError) and error.response['Error']['Code'] in THROTTLING_ERRORS
+
+
+def priority_ms(job):
+    """Queue priority of a job: earlier class start / upload goes first"""
+    candidates = [job.get('uploaded_at')]
+    if JOB_PRIORITY == 'class_start':
+        candidates.insert(0, job.get('class_start'))
+
+    for value in candidates:
+        if not value:
+            continue
+        try:
+            return int(datetime.fromisoformat(value).timestamp() * 1000)
+        except (TypeError, ValueError):
+            continue
+
+    return int(time.time() * 1000)
+
+
+def enqueue(job):
+    """Add a job (its start event) to the queue"""
+    table.put_item(Item={
+        'pk': QUEUE_PARTITION,
+        'sk': f"{priority_ms(job):013d}#{job['job_id']}",
+        'job_id': job['job_id'],
+        'job': json.dumps(job),
+        'attempts': job.get('attempts', 0),
+        'enqueued_at': int(time.time())
+    })
+
+
+def queued_jobs(limit=10):
+    """
+    The first unclaimed queued items (or claims whose lease ran out), highest priority first
+
+    Limit caps the items read per page before the filter, so leased items
+    at the head of the queue would hide the rest: keep paging until `limit`
+    items pass or the queue ends.
+    """
+    query_args = {
+        'KeyConditionExpression': 'pk = :queue',
+        'FilterExpression': 'attribute_not_exists(claimed_until) OR claimed_until < :now',
+        'ExpressionAttributeValues': {':queue': QUEUE_PARTITION, ':now': int(time.time())},
+        'Limit': limit
+    }
+    items = []
+
+    while len(items) < limit:
+        response = table.query(**query_args)
+        items += response.get('Items', [])
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_args['ExclusiveStartKey'] = last_key
+
+    return items[:limit]
+
+
+def queue_key(item):
+    return {'pk': QUEUE_PARTITION, 'sk': item['sk']}
+
+
+def claim(item):
+    """
+    Lease a queued item for CLAIM_LEASE_SEC; returns its job, or None if
+    another admitter holds it (or already took it off the queue)
+    """
+    now = int(time.time())
+    try:
+        table.update_item(
+            Key=queue_key(item),
+            UpdateExpression='SET claimed_until = :until',
+            ConditionExpression='attribute_exists(sk) AND (attribute_not_exists(claimed_until) OR claimed_until < :now)',
+            ExpressionAttributeValues={':until': now + CLAIM_LEASE_SEC, ':now': now}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        raise
+
+    job = json.loads(item['job'])
+    job['attempts'] = int(item.get('attempts', 0))
+    return job
+
+
+def complete(item):
+    """Take a claimed item off the queue (its job started or failed)"""
+    table.delete_item(Key=queue_key(item))
+
+
+def unclaim(item, attempts):
+    """Put a claimed item back in line, at the same priority"""
+    table.update_item(
+        Key=queue_key(item),
+        UpdateExpression='SET attempts = :attempts REMOVE claimed_until',
+        ConditionExpression='attribute_exists(sk)',
+        ExpressionAttributeValues={':attempts': attempts}
+    )
+
+
+def in_flight():
+    item = table.get_item(Key=SLOTS_KEY, ConsistentRead=True).get('Item', {})
+    return int(item.get('in_flight', 0))
+
+
+def acquire_slot(job_id):
+    """Take a slot for a job; False when MAX_IN_FLIGHT_JOBS are in flight"""
+    try:
+        dynamodb_client.transact_write_items(TransactItems=[
+            {
+                'Update': {
+                    'TableName': JOB_QUEUE_TABLE,
+                    'Key': {'pk': {'S': SLOTS_KEY['pk']}, 'sk': {'S': SLOTS_KEY['sk']}},
+                    'UpdateExpression': 'SET in_flight = if_not_exists(in_flight, :zero) + :one',
+                    'ConditionExpression': 'attribute_not_exists(in_flight) OR in_flight < :max',
+                    'ExpressionAttributeValues': {
+                        ':zero': {'N': '0'},
+                        ':one': {'N': '1'},
+                        ':max': {'N': str(MAX_IN_FLIGHT_JOBS)}
+                    }
+                }
+            },
+            {
+                'Put': {
+                    'TableName': JOB_QUEUE_TABLE,
+                    'Item': {
+                        'pk': {'S': RUNNING_PARTITION},
+                        'sk': {'S': job_id},
+                        'started_at': {'N': str(int(time.time()))}
+                    },
+                    'ConditionExpression': 'attribute_not_exists(sk)'
+                }
+            }
+        ])
+        return True
+
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+        # The job already holds a slot (e.g. a retried start step)
+        return len(reasons) > 1 and reasons[1] == 'ConditionalCheckFailed' and reasons[0] != 'ConditionalCheckFailed'
+
+
+def release_slot(job_id):
+    """Free a job's slot; False if it held none (already released)"""
+    try:
+        dynamodb_client.transact_write_items(TransactItems=[
+            {
+                'Delete': {
+                    'TableName': JOB_QUEUE_TABLE,
+                    'Key': {'pk': {'S': RUNNING_PARTITION}, 'sk': {'S': job_id}},
+                    'ConditionExpression': 'attribute_exists(sk)'
+                }
+            },
+            {
+                'Update': {
+                    'TableName': JOB_QUEUE_TABLE,
+                    'Key': {'pk': {'S': SLOTS_KEY['pk']}, 'sk': {'S': SLOTS_KEY['sk']}},
+                    'UpdateExpression': 'SET in_flight = in_flight - :one',
+                    'ConditionExpression': 'in_flight > :zero',
+                    'ExpressionAttributeValues': {':zero': {'N': '0'}, ':one': {'N': '1'}}
+                }
+            }
+        ])
+        return True
+
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'TransactionCanceledException':
+            return False
+        raise
+
+
+def reclaim_stale_slots():
+    """Release slots held longer than SLOT_TIMEOUT_SEC; returns their job_ids"""
+    cutoff = int(time.time()) - SLOT_TIMEOUT_SEC
+    query_args = {
+        'KeyConditionExpression': 'pk = :running',
+        'FilterExpression': 'started_at < :cutoff',
+        'ExpressionAttributeValues': {':running': RUNNING_PARTITION, ':cutoff': cutoff}
+    }
+    stale = []
+
+    # Read every page before releasing, so the query is not paging over deleted items
+    while True:
+        response = table.query(**query_args)
+        stale += [item['sk'] for item in response.get('Items', [])]
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_args['ExclusiveStartKey'] = last_key
+
+    return [job_id for job_id in stale if release_slot(job_id)]
+
+
+def admit(start_job, batch_size=10):
+    """
+    Start queued jobs, in priority order, while slots are free
+
+    start_job(job) starts one job and returns 'started', 'throttled' (still
+    throttled after retries - the job goes back in the queue) or 'failed'
+    (the job is done; its slot is released).
+    A queue item is only deleted once start_job returned 'started' or
+    'failed'. Returns the job_ids that were started.
+    """
+    started = []
+
+    while in_flight() < MAX_IN_FLIGHT_JOBS:
+        items = queued_jobs(batch_size)
+        claimed_any = False
+
+        for item in items:
+            job = claim(item)
+            if job is None:
+                continue
+            claimed_any = True
+
+            if not acquire_slot(job['job_id']):
+                # Filled up since the check - back in line, same priority
+                unclaim(item, job['attempts'])
+                return started
+
+            outcome = start_job(job)
+
+            if outcome == 'started':
+                complete(item)
+                started.append(job['job_id'])
+                continue
+
+            release_slot(job['job_id'])
+
+            if outcome == 'throttled':
+                unclaim(item, job['attempts'] + 1)
+                return started
+
+            complete(item)
+
+        # Queue empty, or every item is held by other admitters
+        if not claimed_any:
+            break
+
+    return started
@@ -1,10 +1,14 @@
-import boto3
 import json
 import uuid
 from datetime import datetime
 
-s3 = boto3.client('s3', region_name='us-east-1')
-rekognition = boto3.client('rekognition', region_name='us-east-1')
+import aws_clients
+import job_ledger
+import structured_log
+from roster_manifest import ROSTER_MANIFEST_KEY, load_roster, rebuild_roster
+
+s3 = aws_clients.lazy_client('s3')
+log = structured_log.get_logger('lambda1_generate_job')
 
 BUCKET_NAME = 'hackathon-attendance-media'  # Replace with your bucket name
 COLLECTION_ID = 'hackathon-student-faces'
@@ -17,12 +21,17 @@ def lambda_handler(event, context):
     Input: EventBridge event containing S3 upload information
     Output: Job metadata (job_id, record_id, video info, student list)
     """
-    print("=" * 60)
-    print("🎬 LAMBDA 1: Generate Job for Uploaded Video")
-    print("=" * 60)
+    structured_log.start_invocation(context)
+    
+    # Ledger steps of the state machine
+    if event.get('action') == 'wait_for_duplicate':
+        return wait_for_duplicate(event)
+    if event.get('action') == 'release_ledger':
+        return release_ledger(event)
     
-    print(f"\n📨 Received event:")
-    print(json.dumps(event, indent=2))
+    # Full event only at DEBUG; INFO gets its shape
+    log.debug("Received event", event=event)
+    log.info("Generate job", event_keys=sorted(event.keys()), detail_type=event.get('detail-type'))
     
     # Extract video information from event
     # Handle both EventBridge format and direct S3 format
@@ -34,38 +43,34 @@ def lambda_handler(event, context):
         if 'detail' in event and 'bucket' in event['detail']:
             bucket = event['detail']['bucket']['name']
             video_key = event['detail']['object']['key']
-            print(f"\n✅ Detected EventBridge format")
+            event_format = 'eventbridge'
             
         # Try direct S3 event format (if triggered directly by S3)
         elif 'Records' in event and len(event['Records']) > 0:
             s3_event = event['Records'][0]['s3']
             bucket = s3_event['bucket']['name']
             video_key = s3_event['object']['key']
-            print(f"\n✅ Detected direct S3 event format")
+            event_format = 's3'
             
         # Try Step Functions direct input format
         elif 'bucket' in event and 'video_key' in event:
             bucket = event['bucket']
             video_key = event['video_key']
-            print(f"\n✅ Detected Step Functions input format")
+            event_format = 'stepfunctions'
             
         else:
-            print(f"\n❌ Unknown event format!")
-            print(f"Event keys: {list(event.keys())}")
+            log.error("Unknown event format", event_keys=list(event.keys()))
             raise Exception(f"Unsupported event format. Event keys: {list(event.keys())}")
         
-        print(f"\n📹 Video detected:")
-        print(f"   Bucket: {bucket}")
-        print(f"   Key: {video_key}")
+        log.info("Video detected", event_format=event_format, bucket=bucket, video_key=video_key)
         
     except KeyError as e:
-        print(f"❌ Error: Missing required field in event - {e}")
-        print(f"Event structure: {json.dumps(event, indent=2)}")
+        log.error("Missing required field in event", field=str(e), event=event)
         raise Exception(f"Invalid event structure: {e}")
     
     # Verify this is a video in the videos/ folder
     if not video_key.startswith('videos/'):
-        print(f"⚠️  File is not in videos/ folder. Skipping.")
+        log.warning("Not in videos/ folder, skipping", video_key=video_key)
         return {
             'statusCode': 200,
             'message': 'Not a video file, skipping',
@@ -77,52 +82,133 @@ def lambda_handler(event, context):
     filename = video_key.split('/')[-1]  # Get just the filename
     record_id = filename.rsplit('.', 1)[0]  # Remove file extension
     
-    print(f"\n🆔 Record ID extracted: {record_id}")
-    
     # Generate unique job ID for this processing job
     job_id = str(uuid.uuid4())
-    print(f"🔑 Job ID generated: {job_id}")
-    
-    # Get list of all student photos from S3
-    print(f"\n📸 Fetching student photos from s3://{bucket}/photos/...")
+    structured_log.bind(job_id=job_id, record_id=record_id)
     
+    # Get the student roster from the manifest (one GET, independent of roster size)
     try:
-        photos_response = s3.list_objects_v2(
-            Bucket=bucket,
-            Prefix='photos/'
-        )
-        
-        student_ids = []
-        student_photo_keys = {}
+        roster, _ = load_roster(bucket)
         
-        if 'Contents' in photos_response:
-            for obj in photos_response['Contents']:
-                key = obj['Key']
-                
-                # Only process image files
-                if key.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    # Extract student_id from filename
-                    # Expected format: photos/student_10001.jpg → student_id = 10001
-                    filename_only = key.split('/')[-1]
-                    
-                    # Remove "student_" prefix and file extension
-                    student_id_str = filename_only.replace('student_', '').rsplit('.', 1)[0]
-                    
-                    try:
-                        student_id = int(student_id_str)
-                        student_ids.append(student_id)
-                        student_photo_keys[student_id] = key
-                        print(f"   ✅ Found: Student {student_id} ({key})")
-                    except ValueError:
-                        print(f"   ⚠️  Skipping invalid filename: {key}")
+        if roster is None:
+            log.warning("No roster manifest yet, building it from photos/ (one time)", manifest_key=ROSTER_MANIFEST_KEY)
+            roster = rebuild_roster(bucket)
         
-        print(f"\n✅ Total students found: {len(student_ids)}")
+        student_photo_keys = {int(student_id): key for student_id, key in roster.items()}
+        student_ids = sorted(student_photo_keys)
         
     except Exception as e:
-        print(f"❌ Error fetching student photos: {e}")
+        log.error("Error loading student roster", manifest_key=ROSTER_MANIFEST_KEY, error=str(e))
         raise
     
-    # Get video metadata (file size, upload time)
+    # Get video metadata (file size, upload time, optional class start)
     try:
         video_metadata = s3.head_object(Bucket=bucket, Key=video_key)
-        video_size_mb = video_metadata['ContentLength']
\ No newline at end of file
+        video_size_mb = round(video_metadata['ContentLength'] / (1024 * 1024), 2)
+        uploaded_at = video_metadata['LastModified'].isoformat()
+        
+        # Set by the uploader as x-amz-meta-class-start (ISO 8601); orders the job queue
+        class_start = video_metadata.get('Metadata', {}).get('class-start')
+        
+    except Exception as e:
+        log.error("Error fetching video metadata", video_key=video_key, error=str(e))
+        raise
+    
+    # Same video (and roster) seen before: reuse or join that run
+    fingerprint = job_ledger.video_fingerprint(bucket, video_key, video_metadata, COLLECTION_ID, student_ids)
+    dedupe_status, entry = claim_video(bucket, fingerprint, job_id, record_id)
+    
+    output = {
+        'job_id': job_id,
+        'record_id': record_id,
+        'bucket': bucket,
+        'video_key': video_key,
+        'collection_id': COLLECTION_ID,
+        'student_ids': student_ids,
+        'roster_manifest_key': ROSTER_MANIFEST_KEY,
+        'video_size_mb': video_size_mb,
+        'uploaded_at': uploaded_at,
+        'class_start': class_start,
+        'fingerprint': fingerprint,
+        'dedupe_status': dedupe_status,
+        'results_key': entry['results_key'] if dedupe_status == 'complete' else None,
+        'duplicate_of': entry['record_id'] if entry else None,
+        'created_at': datetime.now().isoformat(),
+        'status': 'job_created'
+    }
+    
+    log.summary(
+        "Job created",
+        students=len(student_ids),
+        video_size_mb=video_size_mb,
+        uploaded_at=uploaded_at,
+        dedupe_status=dedupe_status,
+        duplicate_of=output['duplicate_of']
+    )
+    
+    return output
+
+
+def claim_video(bucket, fingerprint, job_id, record_id):
+    """
+    Claim the video's fingerprint in the job ledger
+
+    Returns (dedupe_status, entry) - see job_ledger.claim. A complete entry
+    whose results object no longer exists is dropped and claimed afresh.
+    """
+    if fingerprint is None:
+        return 'new', None
+    
+    dedupe_status, entry = job_ledger.claim(fingerprint, job_id, record_id)
+    
+    if dedupe_status == 'complete':
+        try:
+            s3.head_object(Bucket=bucket, Key=entry['results_key'])
+        except Exception:
+            log.warning("Results of earlier run are gone, running again", results_key=entry['results_key'])
+            job_ledger.forget(fingerprint, entry['job_id'])
+            dedupe_status, entry = job_ledger.claim(fingerprint, job_id, record_id)
+    
+    if entry:
+        structured_log.count('duplicate_videos')
+        log.info("Duplicate video", dedupe_status=dedupe_status,
+                 source_job_id=entry['job_id'], source_record_id=entry['record_id'])
+    
+    return dedupe_status, entry
+
+
+def wait_for_duplicate(event):
+    """
+    Ledger step (waitForTaskToken): park this job until the run it
+    duplicates completes. Resumed with {results_key, source_job_id,
+    source_record_id} - right away if that run finished in the meantime.
+    """
+    fingerprint = event['fingerprint']
+    task_token = event['task_token']
+    structured_log.bind(step='wait_for_duplicate', job_id=event.get('job_id'))
+    
+    entry = job_ledger.add_waiter(fingerprint, task_token)
+    
+    if entry is None:
+        log.summary("Waiting for duplicate run", fingerprint=fingerprint)
+    elif entry.get('status') == job_ledger.STATUS_COMPLETE:
+        job_ledger.resume(task_token, output=json.dumps(job_ledger.duplicate_output(entry)))
+        log.summary("Duplicate run already complete", source_job_id=entry['job_id'])
+    else:
+        job_ledger.resume(task_token, error='The run this video duplicates failed')
+        log.summary("Duplicate run failed", fingerprint=fingerprint)
+    
+    return {'fingerprint': fingerprint, 'waiting': entry is None}
+
+
+def release_ledger(event):
+    """Ledger step on the failure path: give up the video's run so re-uploads retry"""
+    fingerprint = event.get('fingerprint')
+    structured_log.bind(step='release_ledger', job_id=event.get('job_id'))
+    
+    if not fingerprint:
+        return {'failed_waiters': 0}
+    
+    failed_waiters = job_ledger.release(fingerprint, event['job_id'], 'The run this video duplicates failed')
+    log.summary("Ledger released", fingerprint=fingerprint, failed_waiters=failed_waiters)
+    return {'failed_waiters': failed_waiters}
@@ -1,113 +1,444 @@
-import boto3
 import json
-import time
+import os
 from datetime import datetime
 
-rekognition = boto3.client('rekognition', region_name='us-east-1')
-s3 = boto3.client('s3', region_name='us-east-1')
+import aws_clients
+import job_ledger
+import job_queue
+import structured_log
+from face_search_aggregator import new_aggregate, add_persons_page, merge_aggregates, build_student_data
+import results_format
+
+rekognition = aws_clients.lazy_client('rekognition')
+s3 = aws_clients.lazy_client('s3')
+stepfunctions = aws_clients.lazy_client('stepfunctions')
+log = structured_log.get_logger('lambda2_run_rekognition')
+
+# Rekognition publishes job completion to this SNS topic (using this role),
+# and the topic invokes this same Lambda with an SNS event.
+NOTIFICATION_TOPIC_ARN = os.environ.get('REKOGNITION_SNS_TOPIC_ARN', '')
+NOTIFICATION_ROLE_ARN = os.environ.get('REKOGNITION_SNS_ROLE_ARN', '')
+
+# Pending jobs: Step Functions task token parked until Rekognition finishes
+PENDING_JOBS_PREFIX = 'rekognition-jobs/'
+
+# Also keep every raw detection (gzip'd NDJSON) next to the results
+SAVE_RAW_DETECTIONS = os.environ.get('SAVE_RAW_DETECTIONS', 'false').lower() == 'true'
+
 
 def lambda_handler(event, context):
     """
     Lambda 2: Run Rekognition face search on video
+
+    One function, five entry points:
+      - SNS notification from Rekognition  -> handle_rekognition_notification
+      - {"action": "admit"} (schedule)     -> admit_queued_jobs
+      - {"action": "collect_segment", ...} -> collect_segment_results
+      - {"action": "merge", ...}           -> merge_segment_results
+      - anything else (job or segment)     -> start_face_search_job
     """
-    print("=" * 60)
-    print("LAMBDA 2: Run Rekognition Face Search")
-    print("=" * 60)
+    structured_log.start_invocation(context)
     
+    records = event.get('Records', [])
+    if records and records[0].get('EventSource') == 'aws:sns':
+        return handle_rekognition_notification(event)
+
+    if event.get('action') == 'admit':
+        return admit_queued_jobs(event)
+
+    if event.get('action') == 'collect_segment':
+        return collect_segment_results(event)
+
+    if event.get('action') == 'merge':
+        return merge_segment_results(event)
+
+    return start_face_search_job(event)
+
+
+def start_face_search_job(event):
+    """
+    Start step: queue the Rekognition job and return immediately.
+
+    Invoked by Step Functions with `.waitForTaskToken`. The task token is
+    parked in S3 under the job_id and the job joins the admission queue
+    (job_queue.py); it starts as soon as one of the MAX_IN_FLIGHT_JOBS
+    slots is free - possibly right away, in this invocation. Rekognition is
+    told to publish completion to SNS with JobTag=job_id. The state machine
+    stays paused (without a running Lambda) until
+    handle_rekognition_notification resumes it.
+    """
     # Get data from Lambda 1
     job_id = event['job_id']
     record_id = event['record_id']
     bucket = event['bucket']
     video_key = event['video_key']
-    collection_id = event['collection_id']
     student_ids = event.get('student_ids', [])
+    task_token = event.get('task_token')
     
-    print(f"\nJob Info:")
-    print(f"  Job ID: {job_id}")
-    print(f"  Record ID: {record_id}")
-    print(f"  Video: s3://{bucket}/{video_key}")
-    print(f"  Expected students: {len(student_ids)}")
+    structured_log.bind(step='start', job_id=job_id, record_id=record_id)
+    log.info("Start face search", bucket=bucket, video_key=video_key, expected_students=len(student_ids))
     
-    # Start Rekognition face search
-    print(f"\nStarting Rekognition face search...")
+    # Park the task token before starting, so a fast notification always finds it
+    pending_key = f"{PENDING_JOBS_PREFIX}{job_id}.json"
     
     try:
-        response = rekognition.start_face_search(
-            Video={
-                'S3Object': {
-                    'Bucket': bucket,
-                    'Name': video_key
-                }
-            },
-            CollectionId=collection_id,
-            FaceMatchThreshold=80.0
+        s3.put_object(
+            Bucket=bucket,
+            Key=pending_key,
+            Body=json.dumps({
+                'job_id': job_id,
+                'record_id': record_id,
+                'bucket': bucket,
+                'task_token': task_token,
+                'started_at': datetime.now().isoformat()
+            }),
+            ContentType='application/json'
         )
-        
-        rekognition_job_id = response['JobId']
-        print(f"Rekognition job started: {rekognition_job_id}")
-        
     except Exception as e:
-        print(f"Error starting Rekognition: {e}")
-        return {
+        log.error("Error saving pending job", pending_key=pending_key, error=str(e))
+        return finish_start_step(task_token, {
             'job_id': job_id,
             'record_id': record_id,
             'status': 'rekognition_failed',
             'error': str(e)
-        }
+        })
     
-    # Wait for Rekognition to complete
-    print(f"\nWaiting for Rekognition to process video...")
+    # Join the queue behind higher-priority jobs, then start whatever fits
+    job_queue.enqueue({
+        'job_id': job_id,
+        'record_id': record_id,
+        'bucket': bucket,
+        'video_key': video_key,
+        'collection_id': event['collection_id'],
+        'task_token': task_token,
+        'uploaded_at': event.get('uploaded_at'),
+        'class_start': event.get('class_start')
+    })
+    started = job_queue.admit(launch_face_search)
+    
+    # Waiting for the completion notification - Lambda exits now
+    log.summary("Face search queued", started_now=len(started), started_self=job_id in started)
     
-    max_wait = 600  # 10 minutes
-    start_time = time.time()
-    check_count = 0
+    return {
+        'job_id': job_id,
+        'record_id': record_id,
+        'status': 'rekognition_started' if job_id in started else 'rekognition_queued'
+    }
+
+
+def launch_face_search(job):
+    """
+    Start one queued job on Rekognition (called by job_queue.admit)
+
+    Throttled starts (concurrent job limit, TPS) are retried with backoff;
+    still throttled after that, the job goes back in the queue. Any other
+    error fails the job's state machine task.
+    """
+    job_id = job['job_id']
     
-    while time.time() - start_time < max_wait:
+    for attempt in range(job_queue.START_MAX_RETRIES + 1):
         try:
-            status_response = rekognition.get_face_search(JobId=rekognition_job_id)
-            status = status_response['JobStatus']
-            
-            check_count += 1
-            elapsed = int(time.time() - start_time)
-            
-            # Only print every 3rd check to reduce logs
-            if check_count % 3 == 0:
-                print(f"  [{elapsed}s] Status: {status}")
-            
-            if status == 'SUCCEEDED':
-                print(f"\nRekognition completed in {elapsed}s!")
-                break
-            elif status == 'FAILED':
-                error_msg = status_response.get('StatusMessage', 'Unknown error')
-                print(f"\nRekognition job failed: {error_msg}")
-                return {
+            response = rekognition.start_face_search(
+                Video={
+                    'S3Object': {
+                        'Bucket': job['bucket'],
+                        'Name': job['video_key']
+                    }
+                },
+                CollectionId=job['collection_id'],
+                FaceMatchThreshold=80.0,
+                NotificationChannel={
+                    'SNSTopicArn': NOTIFICATION_TOPIC_ARN,
+                    'RoleArn': NOTIFICATION_ROLE_ARN
+                },
+                JobTag=job_id,
+                # A job taken over after an expired queue lease is not started twice
+                ClientRequestToken=job_id
+            )
+            log.info("Rekognition job started", started_job_id=job_id,
+                     rekognition_job_id=response['JobId'], attempts=job.get('attempts', 0) + attempt)
+            return 'started'
+        
+        except Exception as e:
+            if not job_queue.is_throttling(e):
+                log.error("Error starting Rekognition", started_job_id=job_id, error=str(e))
+                s3.delete_object(Bucket=job['bucket'], Key=f"{PENDING_JOBS_PREFIX}{job_id}.json")
+                finish_start_step(job.get('task_token'), {
                     'job_id': job_id,
-                    'record_id': record_id,
+                    'record_id': job['record_id'],
                     'status': 'rekognition_failed',
-                    'error': error_msg
-                }
-            
-            time.sleep(10)
+                    'error': str(e)
+                })
+                return 'failed'
             
+            structured_log.count('start_throttled')
+            if attempt < job_queue.START_MAX_RETRIES:
+                job_queue.backoff(attempt)
+    
+    log.warning("Rekognition start still throttled, requeued", started_job_id=job_id)
+    return 'throttled'
+
+
+def admit_queued_jobs(event):
+    """
+    Admission step (scheduled, e.g. every minute): reclaim slots of jobs
+    that never reported back and start queued jobs while slots are free.
+
+    Notifications admit jobs as slots free up; this covers a queue left
+    waiting after throttled starts or lost notifications.
+    """
+    structured_log.bind(step='admit')
+    
+    reclaimed = job_queue.reclaim_stale_slots()
+    for job_id in reclaimed:
+        log.warning("Reclaimed stale slot", reclaimed_job_id=job_id)
+    
+    started = job_queue.admit(launch_face_search)
+    
+    log.summary("Queue admitted", started=len(started), reclaimed=len(reclaimed), in_flight=job_queue.in_flight())
+    return {'started': started, 'reclaimed': reclaimed}
+
+
+def finish_start_step(task_token, output):
+    """
+    Resume the paused state machine with the result of the start step.
+
+    Without a task token (direct invocation) the output is just returned.
+    """
+    if task_token:
+        stepfunctions.send_task_success(
+            taskToken=task_token,
+            output=json.dumps(output)
+        )
+    return output
+
+
+def handle_rekognition_notification(event):
+    """
+    Notification step: Rekognition finished, resume the state machine.
+
+    The SNS message carries JobId, Status and the JobTag (our job_id) set in
+    launch_face_search. Only the small status result is sent back; the
+    state machine then invokes the segment collect step. The job's admission slot
+    is released and handed to the next queued job.
+    """
+    structured_log.bind(step='notification')
+    resumed = 0
+    
+    for record in event.get('Records', []):
+        message = json.loads(record['Sns']['Message'])
+        
+        rekognition_job_id = message.get('JobId')
+        job_id = message.get('JobTag')
+        status = message.get('Status')
+        bucket = message.get('Video', {}).get('S3Bucket')
+        
+        log.info("Rekognition job finished", rekognition_job_id=rekognition_job_id, status=status, job_id=job_id)
+        
+        if message.get('API') != 'StartFaceSearch' or not job_id or not bucket:
+            log.warning("Not a face search job from this pipeline, skipping", rekognition_job_id=rekognition_job_id)
+            continue
+        
+        pending_key = f"{PENDING_JOBS_PREFIX}{job_id}.json"
+        
+        try:
+            response = s3.get_object(Bucket=bucket, Key=pending_key)
+            pending = json.loads(response['Body'].read().decode('utf-8'))
         except Exception as e:
-            print(f"  Error checking status: {e}")
-            time.sleep(10)
-    else:
-        print(f"\nTimeout after {max_wait}s")
+            log.warning("No pending job found", pending_key=pending_key, error=str(e))
+            continue
+        
+        if status == 'SUCCEEDED':
+            output = {
+                'job_id': job_id,
+                'record_id': pending['record_id'],
+                'rekognition_job_id': rekognition_job_id,
+                'status': 'rekognition_succeeded'
+            }
+        else:
+            output = {
+                'job_id': job_id,
+                'record_id': pending['record_id'],
+                'rekognition_job_id': rekognition_job_id,
+                'status': 'rekognition_failed',
+                'error': message.get('StatusMessage', f"Rekognition job {status}")
+            }
+        
+        finish_start_step(pending.get('task_token'), output)
+        s3.delete_object(Bucket=bucket, Key=pending_key)
+        job_queue.release_slot(job_id)
+        resumed += 1
+    
+    # Freed slots go to the next queued jobs
+    started = job_queue.admit(launch_face_search) if resumed else []
+    
+    log.summary("Notifications handled", resumed=resumed, started=len(started))
+    return {'resumed': resumed, 'started': started}
+
+
+def build_rekognition_notification(rekognition_job_id, job_id, bucket, video_key, status='SUCCEEDED'):
+    """
+    Build the SNS event Rekognition sends on completion.
+
+    Local stand-in for the notification path: feed the result to
+    lambda_handler to resume a job without SNS.
+    """
+    message = {
+        'JobId': rekognition_job_id,
+        'Status': status,
+        'API': 'StartFaceSearch',
+        'JobTag': job_id,
+        'Timestamp': int(datetime.now().timestamp() * 1000),
+        'Video': {
+            'S3ObjectName': video_key,
+            'S3Bucket': bucket
+        }
+    }
+    return {
+        'Records': [{
+            'EventSource': 'aws:sns',
+            'Sns': {
+                'Type': 'Notification',
+                'Message': json.dumps(message)
+            }
+        }]
+    }
+
+
+def collect_segment_results(event):
+    """
+    Segment collect step (inside the Map state): aggregate one segment's job
+
+    The per-student aggregate is saved to S3 as-is - timestamps are still
+    relative to the segment start - and only its key goes back to the
+    state machine, so the Map output stays small for any roster size.
+    """
+    job_id = event['job_id']
+    record_id = event['record_id']
+    bucket = event['bucket']
+    segment_index = event['segment_index']
+    rekognition_job_id = event['rekognition_job_id']
+    
+    structured_log.bind(step='collect_segment', job_id=job_id, record_id=record_id, segment_index=segment_index)
+    log.info("Collect segment results", rekognition_job_id=rekognition_job_id)
+    
+    aggregate, page_count, detections_key, error = aggregate_face_search(
+        job_id, bucket, rekognition_job_id,
+        results_format.segment_detections_key(record_id, segment_index)
+    )
+    if error:
         return {
             'job_id': job_id,
-            'record_id': record_id,
+            'segment_index': segment_index,
             'rekognition_job_id': rekognition_job_id,
-            'status': 'rekognition_timeout'
+            'status': 'rekognition_failed',
+            'error': error
         }
     
-    # Get all results with pagination
-    print(f"\nRetrieving face detection results...")
+    aggregate_key = results_format.segment_aggregate_key(record_id, segment_index)
+    s3.put_object(
+        Bucket=bucket,
+        Key=aggregate_key,
+        Body=json.dumps(aggregate, separators=(',', ':')),
+        ContentType=results_format.JSON_CONTENT_TYPE
+    )
+    
+    log.summary(
+        "Segment collected",
+        pages=page_count,
+        total_detections=aggregate['total_detections'],
+        students_detected=len(aggregate['students']),
+        aggregate_key=aggregate_key
+    )
+    
+    return {
+        'job_id': job_id,
+        'segment_index': segment_index,
+        'offset_ms': event['offset_ms'],
+        'video_key': event['video_key'],
+        'rekognition_job_id': rekognition_job_id,
+        'aggregate_key': aggregate_key,
+        'detections_key': detections_key,
+        'total_detections': aggregate['total_detections'],
+        'status': 'segment_complete'
+    }
+
+
+def merge_segment_results(event):
+    """
+    Merge step (after the Map state): combine the segment aggregates
+
+    Each segment aggregate is re-based by its offset and folded into one
+    video-wide aggregate, which is saved as the video's results. Segment videos and aggregates are deleted after.
+    """
+    job_id = event['job_id']
+    record_id = event['record_id']
+    bucket = event['bucket']
+    video_key = event['video_key']
+    segments = sorted(event['segment_results'], key=lambda segment: segment['segment_index'])
+    
+    structured_log.bind(step='merge', job_id=job_id, record_id=record_id)
+    log.info("Merge segment results", segments=len(segments))
+    
+    aggregate = new_aggregate()
+    for segment in segments:
+        response = s3.get_object(Bucket=bucket, Key=segment['aggregate_key'])
+        segment_aggregate = json.loads(response['Body'].read().decode('utf-8'))
+        merge_aggregates(aggregate, segment_aggregate, segment['offset_ms'])
+        log.item("Segment merged", segment_index=segment['segment_index'], offset_ms=segment['offset_ms'])
+    
+    rekognition_job_ids = [segment['rekognition_job_id'] for segment in segments]
+    output = save_student_results(event, aggregate, {
+        'rekognition_job_id': rekognition_job_ids[0] if len(rekognition_job_ids) == 1 else None,
+        'detections_key': None,
+        'segments': [
+            {
+                'segment_index': segment['segment_index'],
+                'offset_ms': segment['offset_ms'],
+                'rekognition_job_id': segment['rekognition_job_id'],
+                'total_detections': segment['total_detections'],
+                'detections_key': segment.get('detections_key')
+            }
+            for segment in segments
+        ]
+    }, segments=len(segments))
+    
+    if output['status'] == 'rekognition_complete':
+        # Intermediate objects are not needed once the results are saved
+        temporary_keys = [segment['aggregate_key'] for segment in segments]
+        temporary_keys += [segment['video_key'] for segment in segments if segment['video_key'] != video_key]
+        try:
+            s3.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in temporary_keys], 'Quiet': True}
+            )
+        except Exception as e:
+            log.warning("Error deleting segment objects", error=str(e))
     
-    all_persons = []
+    return output
+
+
+def aggregate_face_search(job_id, bucket, rekognition_job_id, detections_key):
+    """
+    Page through a finished face search job into a new aggregate
+
+    Returns (aggregate, page_count, detections_key, error). error is set if
+    the job did not succeed or a page could not be fetched - the aggregate
+    is then incomplete and must not be saved; detections_key is None unless
+    raw detections were saved (SAVE_RAW_DETECTIONS).
+    """
+    # Stream results page by page - each page is folded into per-student
+    # running statistics and dropped, so memory does not grow with video length
+    aggregate = new_aggregate()
     next_token = None
     page_count = 0
     
+    # Raw detections are streamed to /tmp, never held in memory
+    detections_file = None
+    detections_path = f"/tmp/{job_id}_detections.ndjson.gz"
+    if SAVE_RAW_DETECTIONS:
+        detections_file = results_format.open_detections_file(detections_path)
+    
     while True:
         page_count += 1
         
@@ -118,66 +449,104 @@ def lambda_handler(event, context):
         try:
             result = rekognition.get_face_search(**params)
             
-            if 'Persons' in result:
-                persons_in_page = len(result['Persons'])
-                all_persons.extend(result['Persons'])
-                print(f"  Page {page_count}: {persons_in_page} detections")
+            if result.get('JobStatus') != 'SUCCEEDED':
+                log.error("Job not succeeded, nothing to collect", job_status=result.get('JobStatus'))
+                if detections_file:
+                    detections_file.close()
+                    os.remove(detections_path)
+                return aggregate, page_count, None, result.get('StatusMessage', 'Job not complete')
+            
+            persons = result.get('Persons', [])
+            add_persons_page(aggregate, persons)
+            if detections_file:
+                results_format.write_detections(detections_file, persons)
+            log.item("Results page", page=page_count, detections=len(persons))
             
             next_token = result.get('NextToken')
             if not next_token:
                 break
                 
         except Exception as e:
-            print(f"  Error fetching results: {e}")
-            break
+            log.error("Error fetching results", page=page_count, error=str(e))
+            if detections_file:
+                detections_file.close()
+                os.remove(detections_path)
+            return aggregate, page_count, None, f"Error fetching results page {page_count}: {e}"
+    
+    if not detections_file:
+        return aggregate, page_count, None, None
+    
+    detections_file.close()
+    try:
+        s3.upload_file(
+            detections_path, bucket, detections_key,
+            ExtraArgs={
+                'ContentType': results_format.NDJSON_CONTENT_TYPE,
+                'ContentEncoding': 'gzip'
+            }
+        )
+    except Exception as e:
+        log.error("Error saving raw detections", detections_key=detections_key, error=str(e))
+        detections_key = None
+    finally:
+        os.remove(detections_path)
+    
+    return aggregate, page_count, detections_key, None
+
+
+def save_student_results(event, aggregate, job_fields, **summary_fields):
+    """
+    Build student_data for the whole roster from an aggregate, save it to S3
+    and return the output for Lambda 3
+
+    job_fields (rekognition_job_id, detections_key, ...) go into both the
+    results object and the output.
+    """
+    job_id = event['job_id']
+    record_id = event['record_id']
+    bucket = event['bucket']
+    video_key = event['video_key']
+    student_ids = event.get('student_ids', [])
     
-    print(f"Total detections: {len(all_persons)}")
+    total_detections = aggregate['total_detections']
     
     # Process results - include ALL students (detected and not detected)
-    print(f"\nProcessing results for ALL students...")
-    structured_results = process_rekognition_results_with_absences(
-        all_persons, 
-        student_ids
-    )
+    structured_results = build_student_data(aggregate, student_ids)
     
-    detected_count = sum(1 for data in structured_results.values() if data['PresenceDuration(sec)'] > 0)
+    detected_count = sum(1 for data in structured_results.values() if data['DetectionCount'] > 0)
     absent_count = len(structured_results) - detected_count
     
-    print(f"Students detected in video: {detected_count}")
-    print(f"Students NOT detected (absent): {absent_count}")
-    
     # Save results to S3
-    results_key = f"rekognition-results/{record_id}_results.json"
-    
-    print(f"\nSaving results to S3...")
+    results_key = results_format.results_key(record_id)
     
     try:
         results_content = {
             'job_id': job_id,
             'record_id': record_id,
-            'rekognition_job_id': rekognition_job_id,
+            **job_fields,
             'processed_at': datetime.now().isoformat(),
-            'total_detections': len(all_persons),
+            'total_detections': total_detections,
             'students_expected': len(student_ids),
             'students_detected': detected_count,
             'students_absent': absent_count,
             'student_data': structured_results
         }
         
+        body, content_args = results_format.encode_results(results_content)
+        
         s3.put_object(
             Bucket=bucket,
             Key=results_key,
-            Body=json.dumps(results_content, indent=2),
-            ContentType='application/json'
+            Body=body,
+            **content_args
         )
         
-        print(f"Results saved")
-        
     except Exception as e:
-        print(f"Error saving to S3: {e}")
+        log.error("Error saving results to S3", results_key=results_key, error=str(e))
         return {
             'job_id': job_id,
             'record_id': record_id,
+            'fingerprint': event.get('fingerprint'),
             'status': 's3_save_failed',
             'error': str(e)
         }
@@ -189,17 +558,30 @@ def lambda_handler(event, context):
         'bucket': bucket,
         'video_key': video_key,
         'results_key': results_key,
-        'rekognition_job_id': rekognition_job_id,
+        'rekognition_job_id': job_fields['rekognition_job_id'],
         'student_ids': student_ids,
-        'total_detections': len(all_persons),
+        'total_detections': total_detections,
         'students_detected': detected_count,
         'students_absent': absent_count,
+        'fingerprint': event.get('fingerprint'),
         'status': 'rekognition_complete'
     }
     
-    print("\n" + "=" * 60)
-    print("LAMBDA 2 COMPLETE")
-    print("=" * 60)
+    # Duplicate uploads waiting on this run get the same results
+    resumed_duplicates = 0
+    if event.get('fingerprint'):
+        resumed_duplicates = job_ledger.complete(event['fingerprint'], job_id, results_key)
+    
+    log.summary(
+        "Results collected",
+        resumed_duplicates=resumed_duplicates,
+        total_detections=total_detections,
+        students_detected=detected_count,
+        students_absent=absent_count,
+        results_key=results_key,
+        detections_key=job_fields['detections_key'],
+        **summary_fields
+    )
     
     return output
 
@@ -208,121 +590,8 @@ def process_rekognition_results_with_absences(persons, expected_student_ids):
     """
     Process Rekognition results and include students NOT detected
     
-    Returns data for ALL students (present and absent)
+    Returns data for ALL students (present and absent). Convenience wrapper
+    for callers that already hold every detection in one list.
     """
-    # First, process detected students
-    student_detections = {}
-    
-    for person in persons:
-        timestamp_ms = person.get('Timestamp', 0)
-        face_matches = person.get('FaceMatches', [])
-        
-        if not face_matches:
-            continue
-        
-        best_match = face_matches[0]
-        matched_face = best_match.get('Face', {})
-        similarity = best_match.get('Similarity', 0)
-        
-        if similarity < 80:
-            continue
-        
-        try:
-            student_id = str(int(matched_face['ExternalImageId']))
-        except (ValueError, KeyError):
-            continue
-        
-        # Get face details
-        person_face = person.get('Person', {}).get('Face', {})
-        confidence = person_face.get('Confidence', 0)
-        
-        pose = person_face.get('Pose', {})
-        yaw = pose.get('Yaw', 0)
-        pitch = pose.get('Pitch', 0)
-        roll = pose.get('Roll', 0)
-        
-        quality = person_face.get('Quality', {})
-        brightness = quality.get('Brightness', 0)
-        sharpness = quality.get('Sharpness', 0)
-        
-        bbox = person_face.get('BoundingBox', {})
-        bbox_width = bbox.get('Width', 0)
-        bbox_height = bbox.get('Height', 0)
-        bbox_size = bbox_width * bbox_height
-        
-        # Initialize or update student data
-        if student_id not in student_detections:
-            student_detections[student_id] = {
-                'timestamps': [],
-                'confidences': [],
-                'similarities': [],
-                'yaws': [],
-                'pitches': [],
-                'rolls': [],
-                'brightnesses': [],
-                'sharpnesses': [],
-                'bbox_sizes': []
-            }
-        
-        student_detections[student_id]['timestamps'].append(timestamp_ms)
-        student_detections[student_id]['confidences'].append(confidence)
-        student_detections[student_id]['similarities'].append(similarity)
-        student_detections[student_id]['yaws'].append(yaw)
-        student_detections[student_id]['pitches'].append(pitch)
-        student_detections[student_id]['rolls'].append(roll)
-        student_detections[student_id]['brightnesses'].append(brightness)
-        student_detections[student_id]['sharpnesses'].append(sharpness)
-        student_detections[student_id]['bbox_sizes'].append(bbox_size)
-    
-    # Now create results for ALL expected students
-    results = {}
-    
-    for student_id in expected_student_ids:
-        student_id_str = str(student_id)
-        
-        if student_id_str in student_detections:
-            # Student WAS detected - calculate metrics
-            data = student_detections[student_id_str]
-            timestamps = data['timestamps']
-            
-            timestamp_start = min(timestamps)
-            timestamp_end = max(timestamps)
-            presence_duration_sec = (timestamp_end - timestamp_start) / 1000.0
-            
-            results[student_id_str] = {
-                'StudentName': student_id_str,
-                'TimestampStart': timestamp_start,
-                'TimestampEnd': timestamp_end,
-                'PresenceDuration(sec)': round(presence_duration_sec, 2),
-                'AvgConfidence': round(sum(data['confidences']) / len(data['confidences']), 1),
-                'AvgSimilarity': round(sum(data['similarities']) / len(data['similarities']), 1),
-                'AvgYaw': round(sum(data['yaws']) / len(data['yaws']), 2),
-                'AvgPitch': round(sum(data['pitches']) / len(data['pitches']), 2),
-                'AvgRoll': round(sum(data['rolls']) / len(data['rolls']), 2),
-                'AvgBrightness': round(sum(data['brightnesses']) / len(data['brightnesses']), 1),
-                'AvgSharpness': round(sum(data['sharpnesses']) / len(data['sharpnesses']), 2),
-                'AvgBoundingBoxSize': round(sum(data['bbox_sizes']) / len(data['bbox_sizes']), 5)
-            }
-            
-            print(f"  Student {student_id_str}: PRESENT ({presence_duration_sec:.1f}s)")
-            
-        else:
-            # Student was NOT detected - create absent record with zeros
-            results[student_id_str] = {
-                'StudentName': student_id_str,
-                'TimestampStart': 0,
-                'TimestampEnd': 0,
-                'PresenceDuration(sec)': 0,
-                'AvgConfidence': 0,
-                'AvgSimilarity': 0,
-                'AvgYaw': 0,
-                'AvgPitch': 0,
-                'AvgRoll': 0,
-                'AvgBrightness': 0,
-                'AvgSharpness': 0,
-                'AvgBoundingBoxSize': 0
-            }
-            
-            print(f"  Student {student_id_str}: ABSENT (not detected)")
-    
-    return results
\ No newline at end of file
+    aggregate = add_persons_page(new_aggregate(), persons)
+    return build_student_data(aggregate, expected_student_ids)
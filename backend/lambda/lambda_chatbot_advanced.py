@@ -1,56 +1,67 @@
-import boto3
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-s3 = boto3.client('s3', region_name='us-east-1')
+import os
+
+import aws_clients
+import structured_log
+import studentlytics_data
+import conversation_store
+from tool_cache import ToolResultCache, cache_key
+from tool_results import shape_result
+from response_stream import StreamAssembler, BufferedWriter, WebSocketWriter, stream_events
+
+bedrock = aws_clients.lazy_client('bedrock-runtime')
+log = structured_log.get_logger('lambda_chatbot_advanced')
 
 TABLE_NAME = 'StudentlyticsData'
 BUCKET_NAME = 'hackathon-attendance-media'
 MODEL_ID = 'us.anthropic.claude-3-haiku-20240307-v1:0'  # Or whichever worked for you
 
-table = dynamodb.Table(TABLE_NAME)
+# Tool results cached across warm invocations, invalidated by Lambda 3's version items
+TOOL_CACHE = ToolResultCache(
+    studentlytics_data.get_global_version,
+    studentlytics_data.get_session_versions,
+    max_entries=int(os.environ.get('TOOL_CACHE_MAX_ENTRIES', '256')),
+    ttl_sec=float(os.environ.get('TOOL_CACHE_TTL_SEC', '300')),
+    version_check_sec=float(os.environ.get('TOOL_CACHE_VERSION_CHECK_SEC', '30'))
+)
+
+# Bedrock prompt caching (system prompt, tools and conversation prefix):
+# 'auto' enables it for models that support it, 'on' / 'off' force it
+PROMPT_CACHE_MODELS = ('claude-3-5-haiku', 'claude-3-7-sonnet', 'claude-sonnet-4', 'claude-opus-4', 'claude-haiku-4')
+PROMPT_CACHING = os.environ.get('PROMPT_CACHING', 'auto').lower()
+if PROMPT_CACHING == 'auto':
+    PROMPT_CACHING = any(model in MODEL_ID for model in PROMPT_CACHE_MODELS)
+else:
+    PROMPT_CACHING = PROMPT_CACHING == 'on'
+CACHE_POINT = {"type": "ephemeral"}
+
+# Tool calls requested in the same turn run concurrently, at most this many at once.
+# The pool lives across warm invocations, so each worker thread keeps the
+# DynamoDB resource it created (aws_clients: resources are per thread).
+TOOL_WORKERS = int(os.environ.get('TOOL_WORKERS', '4'))
+TOOL_POOL = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix='tool')
+
+# Per-session fields get_student_data returns (not the denormalized class/teacher/contact data)
+STUDENT_RECORD_ATTRIBUTES = [
+    'session_record_id', 'student_name', 'session_date', 'class_name', 'status',
+    'attendance', 'engagement', 'time_inside_class', 'speaking_time'
+]
 
 def get_latest_record_id():
-    """Return latest VIDEO_NAME based on timestamp or name order"""
+    """Return the most recently ingested VIDEO_NAME (session catalog, one-item Query)"""
     try:
-        all_videos = get_all_record_ids()
-        if not all_videos:
-            return None
-        latest = all_videos[0]
-        print(f"Latest video/session: {latest}")
+        latest = studentlytics_data.latest_session_id()
+        log.debug("Latest session", record_id=latest)
         return latest
     except Exception as e:
-        print(f"Error getting latest record_id: {e}")
+        log.error("Error getting latest record_id", error=str(e))
         return None
 
 
-def get_all_record_ids():
-    """Get list of all unique VIDEO_NAMEs (not full record_ids)"""
-    try:
-        response = table.scan(ProjectionExpression='record_id')
-        items = response.get('Items', [])
-        
-        # Extract only VIDEO_NAME part before '#'
-        video_names = set()
-        for item in items:
-            rid = item.get('record_id')
-            if rid and '#' in rid:
-                video_names.add(rid.split('#')[0])  # only video name
-            elif rid:
-                video_names.add(rid)  # fallback if no '#'
-
-        # Sort alphabetically or by timestamp if you store dates in name
-        video_list = sorted(list(video_names), reverse=True)
-        return video_list
-        
-    except Exception as e:
-        print(f"Error getting record_ids: {e}")
-        return []
-
-
 def decimal_to_float(obj):
     """Convert Decimal objects to float for JSON serialization"""
     if isinstance(obj, Decimal):
@@ -71,8 +82,10 @@ def clean_dynamodb_item(item):
 def lambda_handler(event, context):
     """Chatbot with function calling capabilities"""
     
-    print("Event received:")
-    print(json.dumps(event, default=str))
+    structured_log.start_invocation(context)
+    
+    # Full event only at DEBUG
+    log.debug("Event received", event=event)
     
     # Handle CORS preflight
     if event.get('httpMethod') == 'OPTIONS':
@@ -82,18 +95,18 @@ def lambda_handler(event, context):
     try:
         if 'body' in event and isinstance(event['body'], str):
             body = json.loads(event['body'])
-            user_message = body.get('message', '')
         elif 'body' in event and isinstance(event['body'], dict):
-            user_message = event['body'].get('message', '')
-        elif 'message' in event:
-            user_message = event.get('message', '')
+            body = event['body']
         else:
-            user_message = event.get('message', '')
+            body = event
+        user_message = body.get('message', '')
+        conversation_id = body.get('conversation_id')
+        stream = bool(body.get('stream')) or 'connectionId' in event.get('requestContext', {})
         
-        print(f"Parsed message: {user_message}")
+        log.info("Message received", message_chars=len(user_message), stream=stream)
         
     except Exception as e:
-        print(f"Error parsing request: {e}")
+        log.error("Error parsing request", error=str(e))
         return error_response('Invalid request format')
     
     if not user_message:
@@ -121,11 +134,74 @@ def lambda_handler(event, context):
                 "properties": {"record_id": {"type": "string"}}
             }
         },
-        # ... (rest of your tool definitions)
+        {
+            "name": "get_engagement_rankings",
+            "description": "Get the most engaged students of a session, highest engagement first. Defaults to the latest session.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "limit": {"type": "integer"},
+                    "record_id": {"type": "string"}
+                }
+            }
+        },
+        {
+            "name": "get_absent_students",
+            "description": "Get the students absent from a session. Defaults to the latest session.",
+            "input_schema": {
+                "type": "object",
+                "properties": {"record_id": {"type": "string"}}
+            }
+        },
+        {
+            "name": "list_all_sessions",
+            "description": "List the available sessions, most recent first. Pass next_page_token from a previous call as page_token for the next page.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "limit": {"type": "integer"},
+                    "page_token": {"type": "string"}
+                }
+            }
+        },
+        {
+            "name": "compare_sessions",
+            "description": "Compare attendance and engagement between two sessions.",
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "record_id_1": {"type": "string"},
+                    "record_id_2": {"type": "string"}
+                },
+                "required": ["record_id_1", "record_id_2"]
+            }
+        }
     ]
 
+    # Earlier turns and tool results of this conversation (only the caller's own)
+    caller = conversation_store.caller_identity(event)
+    try:
+        conversation = conversation_store.load_conversation(conversation_id, owner=caller)
+    except Exception as e:
+        log.error("Could not load conversation", conversation_id=conversation_id, error=str(e))
+        conversation = conversation_store.new_conversation(owner=caller)
+    history = conversation_store.history_messages(conversation)
+    messages = list(history)
+    structured_log.bind(conversation_id=conversation['conversation_id'])
+    log.info("Conversation loaded", earlier_turns=len(conversation['turns']))
+
+    # Streaming mode: WebSocket connection, or "stream": true
+    if stream:
+        return stream_response(event, user_message, tools, conversation, messages)
+
     # ✅ These two lines must align exactly with 'tools = [...]'
-    response = call_claude_with_tools(user_message, tools)
+    tool_usage = []
+    response = call_claude_with_tools(
+        user_message, tools, tool_usage=tool_usage,
+        messages=messages, conversation_results=conversation['tool_results']
+    )
+    remember_turn(conversation, user_message, response, messages[len(history):])
+    log.summary("Answered", tool_calls=len(tool_usage), saved_tokens=tool_token_report(tool_usage)['saved_tokens'])
 
     return {
         'statusCode': 200,
@@ -135,50 +211,129 @@ def lambda_handler(event, context):
         },
         'body': json.dumps({
             'response': response,
-            'timestamp': datetime.now().isoformat()
+            'conversation_id': conversation['conversation_id'],
+            'timestamp': datetime.now().isoformat(),
+            'cache': TOOL_CACHE.stats(),
+            'tool_tokens': tool_token_report(tool_usage)
         })
     }
 
 
 
-def call_claude_with_tools(user_message, tools, max_iterations=5):
+def remember_turn(conversation, user_message, response, turn_messages):
+    """Store the finished turn (and the conversation's tool results) for follow-ups"""
+    try:
+        conversation_store.add_turn(conversation, user_message, response, turn_messages)
+        conversation_store.save_conversation(conversation)
+    except Exception as e:
+        log.error("Could not save conversation", error=str(e))
+
+
+def build_request_body(messages, tools):
+    """
+    Bedrock request for one iteration of the tool loop
+
+    With prompt caching, cache points go after the system prompt, the tool
+    schemas and the last message, so each iteration and each follow-up
+    question re-reads the prefix from the cache.
+    """
+    system_prompt = """You are an AI assistant for Studentlytics, an attendance and engagement tracking system.
+
+        When presenting attendance results:
+        - Always report both present and absent counts.
+        - Never assume all students were present unless the absent count is exactly zero.
+        - Use the exact numbers returned by the tool (e.g., 'present': 5, 'absent': 1).
+        - If the function returns an attendance_rate below 100%, clearly state that not all students attended.
+        - Use concise, natural phrasing such as:
+        "Out of 6 students, 5 were present and 1 was absent (83.3% attendance)."
+        When presenting engagement or attendance summaries:
+        - Reference the session name or record_id.
+        - Include averages and attendance_rate values in sentences.
+        - Avoid summarizing incorrectly; trust the tool's numeric output."""
+    
+    if PROMPT_CACHING:
+        last = messages[-1]
+        content = last['content']
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        content = content[:-1] + [dict(content[-1], cache_control=CACHE_POINT)]
+        
+        system_prompt = [{"type": "text", "text": system_prompt, "cache_control": CACHE_POINT}]
+        tools = tools[:-1] + [dict(tools[-1], cache_control=CACHE_POINT)] if tools else tools
+        messages = messages[:-1] + [dict(last, content=content)]
+    
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 2000,
+        "system": system_prompt,
+        "messages": messages,
+        "tools": tools,
+        "temperature": 0.5
+    }
+
+
+def log_usage(usage):
+    """Token usage of one Bedrock call, including prompt cache reads / writes"""
+    if usage:
+        for name in ('input_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens', 'output_tokens'):
+            structured_log.count(name, usage.get(name, 0))
+        log.info("Bedrock usage", **usage)
+
+
+def run_tool_turn(content, tool_usage=None, conversation_results=None):
+    """
+    Execute the tool_use blocks of an assistant message
+
+    Returns the tool_result blocks for the next user message, shaped to the
+    token budget (tool_results.py); per-call token stats are appended to
+    `tool_usage` if given.
+    """
+    tool_uses = [block for block in content if block.get('type') == 'tool_use']
+    
+    # Execute the tools (concurrently when there are several)
+    results = execute_tools(tool_uses, conversation_results)
+    
+    tool_results = []
+    for block, result in zip(tool_uses, results):
+        content_text, stats = shape_result(block['name'], result)
+        log.info("Tool result", tool_input=block['input'], **stats)
+        if tool_usage is not None:
+            tool_usage.append(stats)
+        
+        tool_results.append({
+            "type": "tool_result",
+            "tool_use_id": block['id'],
+            "content": content_text
+        })
+    
+    return tool_results
+
+
+def call_claude_with_tools(user_message, tools, max_iterations=5, tool_usage=None,
+                           messages=None, conversation_results=None):
     """
     Call Claude with function calling capability
+
+    `messages` is the conversation history to continue; the turn's messages
+    are appended to it in place. Tool results already in
+    `conversation_results` are reused.
     """
-    messages = [{"role": "user", "content": user_message}]
+    if messages is None:
+        messages = []
+    messages.append({"role": "user", "content": user_message})
     
     for iteration in range(max_iterations):
-        print(f"Iteration {iteration + 1}")
-        
-        # Call Bedrock
-        request_body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 2000,
-           "system": """You are an AI assistant for Studentlytics, an attendance and engagement tracking system.
-
-            When presenting attendance results:
-            - Always report both present and absent counts.
-            - Never assume all students were present unless the absent count is exactly zero.
-            - Use the exact numbers returned by the tool (e.g., 'present': 5, 'absent': 1).
-            - If the function returns an attendance_rate below 100%, clearly state that not all students attended.
-            - Use concise, natural phrasing such as:
-            "Out of 6 students, 5 were present and 1 was absent (83.3% attendance)."
-            When presenting engagement or attendance summaries:
-            - Reference the session name or record_id.
-            - Include averages and attendance_rate values in sentences.
-            - Avoid summarizing incorrectly; trust the tool's numeric output.""",
-            "messages": messages,
-            "tools": tools,
-            "temperature": 0.5
-        }
+        structured_log.count('bedrock_calls')
         
         try:
+            # Call Bedrock
             response = bedrock.invoke_model(
                 modelId=MODEL_ID,
-                body=json.dumps(request_body)
+                body=json.dumps(build_request_body(messages, tools))
             )
             
             response_body = json.loads(response['body'].read())
+            log_usage(response_body.get('usage'))
             
             # Check stop reason
             stop_reason = response_body.get('stop_reason')
@@ -198,43 +353,234 @@ def call_claude_with_tools(user_message, tools, max_iterations=5):
                 return "I completed the task."
             
             elif stop_reason == 'tool_use':
-                # Claude wants to use a tool
-                tool_results = []
-                
-                for block in content:
-                    if block.get('type') == 'tool_use':
-                        tool_name = block['name']
-                        tool_input = block['input']
-                        tool_use_id = block['id']
-                        
-                        print(f"Using tool: {tool_name} with {tool_input}")
-                        
-                        # Execute the tool
-                        result = execute_tool(tool_name, tool_input)
-                        
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_id,
-                            "content": json.dumps(result)
-                        })
-                
-                # Add tool results to messages
+                # Claude wants to use one or more tools
                 messages.append({
                     "role": "user",
-                    "content": tool_results
+                    "content": run_tool_turn(content, tool_usage, conversation_results)
                 })
                 
                 # Continue loop to get Claude's next response
                 continue
             
         except Exception as e:
-            print(f"Error calling Bedrock: {e}")
+            log.error("Error calling Bedrock", iteration=iteration + 1, error=str(e))
+            return f"Error: {str(e)}"
+    
+    return "Maximum iterations reached."
+
+
+def stream_claude_with_tools(user_message, tools, writer, max_iterations=5, tool_usage=None,
+                             messages=None, conversation_results=None):
+    """
+    Streaming variant of call_claude_with_tools
+
+    Text deltas go to `writer` as Bedrock generates them. When a streamed
+    message stops for tool_use, the tool_use blocks (input JSON assembled
+    from its fragments) are executed and the next message is streamed.
+    Returns the text of the final message.
+    """
+    if messages is None:
+        messages = []
+    messages.append({"role": "user", "content": user_message})
+    
+    for iteration in range(max_iterations):
+        structured_log.count('bedrock_calls')
+        
+        try:
+            response = bedrock.invoke_model_with_response_stream(
+                modelId=MODEL_ID,
+                body=json.dumps(build_request_body(messages, tools))
+            )
+            
+            message = StreamAssembler()
+            for event in stream_events(response):
+                text = message.feed(event)
+                if text:
+                    writer.write({"type": "text", "text": text})
+            log_usage(message.usage)
+            
+            messages.append({
+                "role": "assistant",
+                "content": message.content
+            })
+            
+            if message.stop_reason == 'tool_use':
+                tool_names = [block['name'] for block in message.content if block.get('type') == 'tool_use']
+                writer.write({"type": "tool_use", "tools": tool_names})
+                
+                messages.append({
+                    "role": "user",
+                    "content": run_tool_turn(message.content, tool_usage, conversation_results)
+                })
+                continue
+            
+            if message.stop_reason == 'end_turn':
+                text = ''.join(block.get('text', '') for block in message.content if block.get('type') == 'text')
+                return text or "I completed the task."
+            
+        except Exception as e:
+            log.error("Error streaming from Bedrock", iteration=iteration + 1, error=str(e))
+            if not report_stream_error(writer, e):
+                # The stream itself is broken: fail with the original error
+                raise
             return f"Error: {str(e)}"
     
     return "Maximum iterations reached."
 
 
+def report_stream_error(writer, error):
+    """Send an error event to the client; False if the stream could not take it"""
+    try:
+        writer.write({"type": "error", "message": str(error)})
+        return True
+    except Exception as e:
+        log.error("Error reporting to client", error=str(e), original_error=str(error))
+        return False
+
+
+def tool_token_report(tool_usage):
+    return {
+        'calls': tool_usage,
+        'saved_tokens': sum(call['saved_tokens'] for call in tool_usage)
+    }
+
+
+def stream_response(event, user_message, tools, conversation, messages):
+    """
+    Answer in streaming mode
+
+    WebSocket requests (API Gateway, requestContext.connectionId) get every
+    event pushed to the connection as it happens. Plain HTTP requests with
+    "stream": true get the same events as an NDJSON body.
+    """
+    request_context = event.get('requestContext', {})
+    connection_id = request_context.get('connectionId')
+    
+    if connection_id:
+        writer = WebSocketWriter(request_context['domainName'], request_context['stage'], connection_id)
+    else:
+        writer = BufferedWriter()
+    
+    tool_usage = []
+    history_length = len(messages)
+    response = stream_claude_with_tools(
+        user_message, tools, writer, tool_usage=tool_usage,
+        messages=messages, conversation_results=conversation['tool_results']
+    )
+    remember_turn(conversation, user_message, response, messages[history_length:])
+    
+    writer.write({
+        'type': 'done',
+        'response': response,
+        'conversation_id': conversation['conversation_id'],
+        'first_text_ms': writer.first_text_ms,
+        'timestamp': datetime.now().isoformat(),
+        'cache': TOOL_CACHE.stats(),
+        'tool_tokens': tool_token_report(tool_usage)
+    })
+    log.summary(
+        "Answered (streaming)",
+        first_text_ms=writer.first_text_ms,
+        tool_calls=len(tool_usage),
+        saved_tokens=tool_token_report(tool_usage)['saved_tokens']
+    )
+    
+    if connection_id:
+        return {'statusCode': 200}
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/x-ndjson'
+        },
+        'body': writer.ndjson()
+    }
+
+
+def execute_tools(tool_uses, conversation_results=None):
+    """
+    Execute the tool_use blocks of one turn on the bounded tool pool
+
+    Returns the results in tool_use order, so the turn takes about as long
+    as its slowest tool. A tool that raises gets an error result instead of
+    failing the whole turn. With `conversation_results` (the conversation's
+    stored tool results), results still current are reused and new ones
+    are added.
+    """
+    def run(block):
+        if conversation_results is not None:
+            return execute_conversation_tool(block['name'], block['input'], conversation_results)
+        try:
+            return execute_tool(block['name'], block['input'])
+        except Exception as e:
+            log.error("Tool failed", tool=block['name'], error=str(e))
+            return {"error": str(e)}
+    
+    if len(tool_uses) <= 1:
+        return [run(block) for block in tool_uses]
+    
+    return list(TOOL_POOL.map(run, tool_uses))
+
+
+def execute_conversation_tool(tool_name, tool_input, conversation_results):
+    """Execute tool, reusing this conversation's earlier result if no ingest changed it since"""
+    key = cache_key(tool_name, tool_input)
+    stored = conversation_results.pop(key, None)
+    
+    if stored is not None:
+        try:
+            TOOL_CACHE.refresh_versions()
+            current = TOOL_CACHE.is_current(stored['depends_on'])
+        except Exception as e:
+            log.warning("Version marker unavailable, not reusing conversation result", error=str(e))
+            current = False
+        
+        if current:
+            structured_log.count('conversation_reuse')
+            log.info("Conversation result reused", tool=tool_name)
+            conversation_results[key] = stored
+            return stored['result']
+    
+    try:
+        result = execute_tool(tool_name, tool_input)
+    except Exception as e:
+        log.error("Tool failed", tool=tool_name, error=str(e))
+        return {"error": str(e)}
+    
+    if "error" not in result:
+        conversation_results[key] = {
+            'result': result,
+            'depends_on': TOOL_CACHE.dependency_versions(tool_input)
+        }
+    
+    return result
+
+
 def execute_tool(tool_name, tool_input):
+    """Execute tool, answering from the in-container cache when possible"""
+    try:
+        TOOL_CACHE.refresh_versions()
+        result = TOOL_CACHE.get(tool_name, tool_input)
+    except Exception as e:
+        log.warning("Version marker unavailable, bypassing cache", error=str(e))
+        return run_tool(tool_name, tool_input)
+    
+    if result is not None:
+        structured_log.count('cache_hits')
+        log.info("Cache hit", tool=tool_name)
+        return result
+    
+    result = run_tool(tool_name, tool_input)
+    
+    # Errors (e.g. session not ingested yet) are not cached
+    if "error" not in result:
+        TOOL_CACHE.put(tool_name, tool_input, result)
+    
+    return result
+
+
+def run_tool(tool_name, tool_input):
     """Execute tool"""
     if tool_name == "get_student_data":
         return get_student_data(
@@ -251,7 +597,10 @@ def execute_tool(tool_name, tool_input):
     elif tool_name == "get_absent_students":
         return get_absent_students(tool_input.get('record_id'))
     elif tool_name == "list_all_sessions":
-        return list_all_sessions()
+        return list_all_sessions(
+            tool_input.get('limit', 10),
+            tool_input.get('page_token')
+        )
     elif tool_name == "compare_sessions":
         return compare_sessions(
             tool_input['record_id_1'],
@@ -264,35 +613,42 @@ def execute_tool(tool_name, tool_input):
 def get_student_data(student_id, record_id=None):
     """Get data for a specific student, optionally filtered by session"""
     try:
-        if record_id:
-            # Specific session
-            response = table.scan(
-                FilterExpression='student_id = :sid AND begins_with(record_id, :rid_prefix)',
-                ExpressionAttributeValues={
-                    ':sid': student_id,
-                    ':rid_prefix': record_id
-                }
-            )
-        else:
-            # All sessions for this student
-            response = table.scan(
-                FilterExpression='student_id = :sid',
-                ExpressionAttributeValues={':sid': student_id}
-            )
-        
-        items = response.get('Items', [])
+        # One session, or all sessions for this student (StudentIndex)
+        items = studentlytics_data.query_student(student_id, record_id, attributes=STUDENT_RECORD_ATTRIBUTES)
         
         if not items:
             return {"error": f"No data found for student {student_id}"}
         
         clean_items = [clean_dynamodb_item(item) for item in items]
+        total = len(clean_items)
+        
+        # Most recent sessions first, so budget truncation keeps them
+        records = sorted(
+            (
+                {
+                    "record_id": item.get('session_record_id'),
+                    "session_date": item.get('session_date'),
+                    "class_name": item.get('class_name'),
+                    "status": item.get('status'),
+                    "attendance": item.get('attendance', 0),
+                    "engagement": item.get('engagement', 0),
+                    "time_inside_class": item.get('time_inside_class', 0),
+                    "speaking_time": item.get('speaking_time', 0)
+                }
+                for item in clean_items
+            ),
+            key=lambda record: (record['session_date'] or '', record['record_id'] or ''),
+            reverse=True
+        )
         
         return {
             "student_id": student_id,
-            "student_name": clean_items[0].get('student_name') if clean_items else 'Unknown',
-            "records": clean_items,
-            "total_sessions": len(clean_items),
-            "sessions": list(set(item.get('record_id') for item in clean_items))
+            "student_name": clean_items[0].get('student_name', 'Unknown'),
+            "total_sessions": total,
+            "sessions_present": sum(1 for record in records if record['status'] is True),
+            "avg_attendance": round(sum(record['attendance'] for record in records) / total, 1),
+            "avg_engagement": round(sum(record['engagement'] for record in records) / total, 1),
+            "records": records
         }
         
     except Exception as e:
@@ -307,12 +663,16 @@ def get_class_summary(record_id=None):
             if not record_id:
                 return {"error": "No data found in database"}
 
-        response = table.scan(
-            FilterExpression='begins_with(record_id, :rid_prefix)',
-            ExpressionAttributeValues={':rid_prefix': record_id}
+        # Materialized at ingest by Lambda 3 - one GetItem
+        summary = studentlytics_data.get_session_summary(record_id)
+        if summary:
+            return session_summary_result(summary)
+
+        # Sessions ingested before summaries existed: compute from the records
+        items = studentlytics_data.query_session(
+            record_id,
+            attributes=['student_id', 'student_name', 'status', 'attendance', 'engagement']
         )
-        
-        items = response.get('Items', [])
         if not items:
             return {"error": f"No data found for session {record_id}"}
         
@@ -327,8 +687,6 @@ def get_class_summary(record_id=None):
             student_id = item.get('student_id')
             student_name = item.get('student_name')
             
-            print(f"DEBUG Student {student_id} ({student_name}): Raw status='{status}', type={type(status)}")
-            
             # Normalize all possible variants - FIRST check for explicit strings
             normalized_status = status
             
@@ -339,10 +697,8 @@ def get_class_summary(record_id=None):
                 # Now check against all possible "false" values
                 if status_str in ['false', 'f', '0', 'no', 'absent', 'n']:
                     normalized_status = False
-                    print(f"  -> Detected as FALSE: '{status}'")
                 elif status_str in ['true', 't', '1', 'yes', 'present', 'y']:
                     normalized_status = True
-                    print(f"  -> Detected as TRUE: '{status}'")
                 else:
                     # Try boolean conversion
                     if isinstance(status, bool):
@@ -351,64 +707,63 @@ def get_class_summary(record_id=None):
                         normalized_status = bool(status)
                     else:
                         normalized_status = None
-                        print(f"  -> Unknown status value: '{status}'")
             
-            print(f"DEBUG Student {student_id}: Final normalized status={normalized_status}")
+            # One line per student: all at DEBUG, sampled at INFO
+            log.item(
+                "Student status",
+                student_id=student_id,
+                student_name=student_name,
+                raw_status=str(status),
+                raw_status_type=type(status).__name__,
+                normalized_status=normalized_status
+            )
             
             # Count using the NORMALIZED status
             if normalized_status is True:
                 present += 1
-                print(f"  -> Counting as PRESENT")
             elif normalized_status is False:
                 absent += 1
-                print(f"  -> Counting as ABSENT")
-            else:
-                print(f"  -> Not counting (None/unknown)")
         
         avg_attendance = sum(i.get('attendance', 0) for i in clean_items) / total if total else 0
         avg_engagement = sum(i.get('engagement', 0) for i in clean_items) / total if total else 0
 
-        print(f"DEBUG FINAL: present={present}, absent={absent}, total={total}")
+        log.info("Class summary computed from records", record_id=record_id, present=present, absent=absent, total=total)
         
-        # Return with debug info
-        result = {
+        # Per-student status details stay in the logs, not in the prompt
+        return {
             "record_id": record_id,
             "total_students": total,
             "present": present,
             "absent": absent,
             "attendance_rate": round((present / total) * 100, 1) if total else 0,
             "avg_attendance_score": round(avg_attendance, 1),
-            "avg_engagement_score": round(avg_engagement, 1),
-            "debug_info": {  # Temporary debug info
-                "raw_items_count": len(items),
-                "present_count": present,
-                "absent_count": absent
-            }
+            "avg_engagement_score": round(avg_engagement, 1)
         }
-        
-        # Print all statuses for debugging
-        status_debug = []
-        for i, item in enumerate(clean_items):
-            student_id = item.get('student_id')
-            student_name = item.get('student_name')
-            raw_status = item.get('status')
-            print(f"DEBUG Item {i}: student_id={student_id}, status={raw_status}, type={type(raw_status)}")
-            status_debug.append({
-                'student_id': student_id,
-                'student_name': student_name,
-                'raw_status': str(raw_status),
-                'raw_status_type': str(type(raw_status))
-            })
-        
-        result['debug_info']['all_statuses'] = status_debug
-        
-        return result
 
     except Exception as e:
         return {"error": str(e)}
 
 
 
+def session_summary_result(summary):
+    """Shape a session summary item like the get_class_summary result"""
+    summary = clean_dynamodb_item(summary)
+    return {
+        "record_id": summary.get('session_record_id'),
+        "session_date": summary.get('session_date'),
+        "class_name": summary.get('class_name'),
+        "total_students": summary.get('total_students', 0),
+        "present": summary.get('present', 0),
+        "absent": summary.get('absent', 0),
+        "attendance_rate": summary.get('attendance_rate', 0),
+        "avg_attendance_score": summary.get('avg_attendance_score', 0),
+        "avg_engagement_score": summary.get('avg_engagement_score', 0),
+        "avg_time_inside_class": summary.get('avg_time_inside_class', 0),
+        "attendance_histogram": summary.get('attendance_histogram', {}),
+        "engagement_histogram": summary.get('engagement_histogram', {})
+    }
+
+
 def get_engagement_rankings(limit=5, record_id=None):
     """Get top students by engagement for a specific session"""
     try:
@@ -419,13 +774,11 @@ def get_engagement_rankings(limit=5, record_id=None):
                 return {"error": "No data found"}
         
         # Query specific session
-        response = table.scan(
-            FilterExpression='begins_with(record_id, :rid_prefix)',
-            ExpressionAttributeValues={':rid_prefix': record_id}
+        items = studentlytics_data.query_session(
+            record_id,
+            attributes=['student_id', 'student_name', 'engagement', 'attendance', 'session_date']
         )
         
-        items = response.get('Items', [])
-        
         if not items:
             return {"error": f"No data for session {record_id}"}
         
@@ -466,15 +819,24 @@ def get_absent_students(record_id=None):
             if not record_id:
                 return {"error": "No data found"}
         
-        # Query specific session - scan all records
-        response = table.scan(
-            FilterExpression='begins_with(record_id, :rid_prefix)',
-            ExpressionAttributeValues={
-                ':rid_prefix': record_id
+        # Absent list is part of the session summary
+        summary = studentlytics_data.get_session_summary(record_id)
+        if summary:
+            summary = clean_dynamodb_item(summary)
+            return {
+                "record_id": record_id,
+                "absent_students": [
+                    dict(student, session_date=summary.get('session_date'))
+                    for student in summary.get('absent_students', [])
+                ],
+                "total_absent": summary.get('absent', 0)
             }
-        )
         
-        items = response.get('Items', [])
+        # Query specific session - all records
+        items = studentlytics_data.query_session(
+            record_id,
+            attributes=['student_id', 'student_name', 'status', 'session_date']
+        )
         clean_items = [clean_dynamodb_item(item) for item in items]
         
         # Filter for absent students in Python
@@ -534,30 +896,34 @@ def error_response(message):
         'body': json.dumps({'error': message})
     }
 
-def list_all_sessions():
-    """List all available sessions"""
+def list_all_sessions(limit=10, page_token=None):
+    """
+    List available sessions, most recently ingested first (one catalog page)
+
+    The total (a COUNT query over the whole catalog) comes with the first
+    page only; follow-up pages just carry on from their page token.
+    """
     try:
-        record_ids = get_all_record_ids()
+        items, next_page_token = studentlytics_data.list_sessions(limit=int(limit), page_token=page_token)
         
-        # Get more info about each session
         sessions = []
-        for rid in record_ids[:10]:  # Limit to 10 most recent
-            response = table.scan(
-                FilterExpression='begins_with(record_id, :rid_prefix)',
-                ExpressionAttributeValues={':rid_prefix': rid},
-                Limit=1
-            )
-            if response.get('Items'):
-                item = clean_dynamodb_item(response['Items'][0])
-                sessions.append({
-                    "record_id": rid,
-                    "session_date": item.get('session_date', 'Unknown')
-                })
+        for item in items:
+            item = clean_dynamodb_item(item)
+            sessions.append({
+                "record_id": item[studentlytics_data.SESSION_KEY],
+                "session_date": item.get('session_date', 'Unknown'),
+                "class_name": item.get('class_name'),
+                "total_students": item.get('total_students'),
+                "attendance_rate": item.get('attendance_rate'),
+                "ingested_at": item.get('ingested_at')
+            })
         
-        return {
-            "total_sessions": len(record_ids),
-            "recent_sessions": sessions
-        }
+        result = {}
+        if not page_token:
+            result["total_sessions"] = studentlytics_data.count_sessions()
+        result["recent_sessions"] = sessions
+        result["next_page_token"] = next_page_token
+        return result
         
     except Exception as e:
         return {"error": str(e)}
@@ -572,6 +938,11 @@ def compare_sessions(record_id_1, record_id_2):
         if "error" in session1 or "error" in session2:
             return {"error": "One or both sessions not found"}
         
+        # Histograms are not needed to compare two sessions
+        for session in (session1, session2):
+            session.pop('attendance_histogram', None)
+            session.pop('engagement_histogram', None)
+        
         return {
             "session_1": session1,
             "session_2": session2,
@@ -0,0 +1,206 @@
+import csv
+import os
+import shutil
+import subprocess
+import time
+
+import aws_clients
+import structured_log
+
+s3 = aws_clients.lazy_client('s3')
+log = structured_log.get_logger('lambda_segment_video')
+
+# Target segment length; ffmpeg cuts at the first keyframe after each boundary
+SEGMENT_SECONDS = int(os.environ.get('SEGMENT_SECONDS', '600'))
+
+# Smaller videos are searched as one job (splitting would not pay off)
+MIN_SEGMENTED_VIDEO_MB = float(os.environ.get('SEGMENT_MIN_VIDEO_MB', '100'))
+
+# Static ffmpeg binary from a Lambda layer
+FFMPEG_PATH = os.environ.get('FFMPEG_PATH', '/opt/bin/ffmpeg')
+FFMPEG_TIMEOUT_SEC = int(os.environ.get('FFMPEG_TIMEOUT_SEC', '600'))
+
+# How often the segment list is checked for finished segments while ffmpeg runs
+SEGMENT_POLL_SEC = 0.5
+
+SEGMENTS_PREFIX = 'video-segments/'
+
+
+def lambda_handler(event, context):
+    """
+    Segment stage: split a long video into time-aligned chunks
+
+    Invoked by Step Functions between Lambda 1 and the Map state that runs
+    face search on every segment concurrently.
+    Input: Lambda 1 output (job_id, record_id, bucket, video_key, video_size_mb)
+    Output: list of segments, each
+        {index, job_id, video_key, offset_ms, duration_ms}
+    where offset_ms is where the segment starts in the original video. The
+    merge step re-bases each segment's timestamps by it.
+
+    Videos below SEGMENT_MIN_VIDEO_MB, videos shorter than one segment and
+    any splitting failure give one segment: the original video, offset 0.
+    """
+    structured_log.start_invocation(context)
+
+    job_id = event['job_id']
+    record_id = event['record_id']
+    bucket = event['bucket']
+    video_key = event['video_key']
+    video_size_mb = event.get('video_size_mb', 0)
+
+    structured_log.bind(job_id=job_id, record_id=record_id)
+
+    whole_video = [whole_video_segment(job_id, video_key)]
+
+    if video_size_mb < MIN_SEGMENTED_VIDEO_MB:
+        log.summary("Video not segmented", reason='small', video_size_mb=video_size_mb, segments=1)
+        return whole_video
+
+    work_dir = f"/tmp/{job_id}_segments"
+    try:
+        segments = split_video(bucket, video_key, record_id, job_id, work_dir)
+
+        if len(segments) < 2:
+            delete_segments(bucket, segments)
+            log.summary("Video not segmented", reason='short', video_size_mb=video_size_mb, segments=1)
+            return whole_video
+
+    except Exception as e:
+        # Splitting is an optimization - fall back to one job for the whole video
+        log.error("Error splitting video, searching it as one segment", video_key=video_key, error=str(e))
+        return whole_video
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    log.summary(
+        "Video segmented",
+        video_size_mb=video_size_mb,
+        segments=len(segments),
+        segment_seconds=SEGMENT_SECONDS,
+        video_duration_ms=segments[-1]['offset_ms'] + segments[-1]['duration_ms']
+    )
+
+    return segments
+
+
+def whole_video_segment(job_id, video_key):
+    return {
+        'index': 0,
+        'job_id': f"{job_id}-seg000",
+        'video_key': video_key,
+        'offset_ms': 0,
+        'duration_ms': None
+    }
+
+
+def read_segment_list(list_path):
+    """[(file_name, start_sec, end_sec)] of the segments ffmpeg has finished so far"""
+    try:
+        with open(list_path, newline='') as list_file:
+            text = list_file.read()
+    except FileNotFoundError:
+        return []
+
+    # The last line may still be being written
+    lines = text.split('\n')[:-1]
+    return [(name, float(start), float(end)) for name, start, end in csv.reader(lines)]
+
+
+def split_video(bucket, video_key, record_id, job_id, work_dir):
+    """
+    Split the video into SEGMENT_SECONDS pieces with ffmpeg (stream copy),
+    uploading each piece as soon as ffmpeg has finished it
+
+    ffmpeg reads the object through a presigned URL, so the source video is
+    never downloaded whole. It adds every finished piece to its segment
+    list; the list is polled while ffmpeg runs, and each new piece is
+    uploaded and deleted right away, so /tmp holds about one segment at a
+    time. Returns the segments in order, with the actual cut points. On
+    failure, the segments uploaded so far are deleted.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    list_path = os.path.join(work_dir, 'segments.csv')
+
+    source_url = s3.generate_presigned_url(
+        'get_object',
+        Params={'Bucket': bucket, 'Key': video_key},
+        ExpiresIn=FFMPEG_TIMEOUT_SEC + 60
+    )
+
+    command = [
+        FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+        '-i', source_url,
+        '-map', '0:v:0', '-an', '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', str(SEGMENT_SECONDS),
+        '-reset_timestamps', '1',
+        '-segment_list', list_path,
+        '-segment_list_type', 'csv',
+        os.path.join(work_dir, 'segment_%03d.mp4')
+    ]
+    segments = []
+    deadline = time.monotonic() + FFMPEG_TIMEOUT_SEC
+
+    with open(os.path.join(work_dir, 'ffmpeg.log'), 'w+b') as errors:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=errors)
+        try:
+            while True:
+                exited = process.poll() is not None
+
+                for piece in read_segment_list(list_path)[len(segments):]:
+                    segments.append(upload_segment(bucket, record_id, job_id, work_dir, len(segments), piece))
+
+                if exited:
+                    break
+                if time.monotonic() > deadline:
+                    raise subprocess.TimeoutExpired(command, FFMPEG_TIMEOUT_SEC)
+                time.sleep(SEGMENT_POLL_SEC)
+
+            if process.returncode != 0:
+                errors.seek(0)
+                raise subprocess.CalledProcessError(process.returncode, command, stderr=errors.read())
+
+        except Exception:
+            delete_segments(bucket, segments)
+            raise
+
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    return segments
+
+
+def upload_segment(bucket, record_id, job_id, work_dir, index, piece):
+    """Upload one finished segment file, delete it, and describe it for the Map state"""
+    file_name, start_sec, end_sec = piece
+    segment_key = f"{SEGMENTS_PREFIX}{record_id}/{job_id}/{file_name}"
+    file_path = os.path.join(work_dir, file_name)
+
+    s3.upload_file(file_path, bucket, segment_key, ExtraArgs={'ContentType': 'video/mp4'})
+    os.remove(file_path)
+
+    log.item("Segment uploaded", index=index, segment_key=segment_key, start_sec=start_sec, end_sec=end_sec)
+    return {
+        'index': index,
+        'job_id': f"{job_id}-seg{index:03d}",
+        'video_key': segment_key,
+        'offset_ms': int(round(start_sec * 1000)),
+        'duration_ms': int(round((end_sec - start_sec) * 1000))
+    }
+
+
+def delete_segments(bucket, segments):
+    """Best-effort removal of uploaded segment objects that will not be searched"""
+    if not segments:
+        return
+    try:
+        s3.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': segment['video_key']} for segment in segments], 'Quiet': True}
+        )
+    except Exception as e:
+        log.warning("Error deleting segment objects", error=str(e))
@@ -0,0 +1,39 @@
+#!/bin/bash
+
+GREEN='\033[0;32m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+echo -e "${BLUE}📦 Packaging Backfill Scores Lambda${NC}"
+
+LAMBDA_FILE="backfill_scores.py"
+SHARED_FILES="aws_clients.py structured_log.py results_format.py rate_limiter.py dynamodb_batch.py scoring.py session_summary.py studentlytics_data.py parallel_scan.py"
+PACKAGE_DIR="backfill_scores_package"
+OUTPUT_ZIP="backfill_scores.zip"
+
+echo "Cleaning up..."
+rm -rf "$PACKAGE_DIR" "$OUTPUT_ZIP"
+
+echo "Creating package..."
+mkdir -p "$PACKAGE_DIR"
+cp "$LAMBDA_FILE" "$PACKAGE_DIR/"
+for SHARED_FILE in $SHARED_FILES; do
+    cp "$SHARED_FILE" "$PACKAGE_DIR/"
+done
+
+echo "Installing dependencies..."
+cd "$PACKAGE_DIR"
+pip3 install --target . boto3 --quiet --no-warn-conflicts
+# NumPy for vectorized scoring (Linux wheels for the Lambda runtime)
+pip3 install --target . numpy --platform manylinux2014_x86_64 --only-binary=:all: --quiet
+cd ..
+
+echo "Creating ZIP..."
+cd "$PACKAGE_DIR"
+zip -r ../"$OUTPUT_ZIP" . -q
+cd ..
+rm -rf "$PACKAGE_DIR"
+
+echo -e "${GREEN}✅ Package created: $OUTPUT_ZIP${NC}"
+echo "Handler: backfill_scores.lambda_handler"
+ls -lh "$OUTPUT_ZIP"
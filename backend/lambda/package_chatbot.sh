@@ -7,6 +7,7 @@ NC='\033[0m'
 echo -e "${BLUE}📦 Packaging Chatbot Lambda${NC}"
 
 LAMBDA_FILE="lambda_chatbot_advanced.py"
+SHARED_FILES="aws_clients.py structured_log.py studentlytics_data.py parallel_scan.py rate_limiter.py tool_cache.py tool_results.py response_stream.py conversation_store.py"
 PACKAGE_DIR="chatbot_package"
 OUTPUT_ZIP="lambda_chatbot.zip"
 
@@ -16,6 +17,9 @@ rm -rf "$PACKAGE_DIR" "$OUTPUT_ZIP"
 echo "Creating package..."
 mkdir -p "$PACKAGE_DIR"
 cp "$LAMBDA_FILE" "$PACKAGE_DIR/"
+for SHARED_FILE in $SHARED_FILES; do
+    cp "$SHARED_FILE" "$PACKAGE_DIR/"
+done
 
 echo "Installing dependencies..."
 cd "$PACKAGE_DIR"
@@ -12,6 +12,7 @@ echo -e "${BLUE}========================================${NC}"
 echo ""
 
 LAMBDA_FILE="lambda2_run_rekognition.py"
+SHARED_FILES="aws_clients.py structured_log.py job_ledger.py job_queue.py face_search_aggregator.py results_format.py"
 PACKAGE_DIR="lambda2_package"
 OUTPUT_ZIP="lambda2_run_rekognition.zip"
 
@@ -40,12 +41,18 @@ echo ""
 echo -e "${YELLOW}Step 4: Copying Lambda function...${NC}"
 cp "$LAMBDA_FILE" "$PACKAGE_DIR/"
 echo -e "${GREEN}✅ Copied $LAMBDA_FILE${NC}"
+for SHARED_FILE in $SHARED_FILES; do
+    cp "$SHARED_FILE" "$PACKAGE_DIR/"
+    echo -e "${GREEN}✅ Copied $SHARED_FILE${NC}"
+done
 echo ""
 
 # Install dependencies
 echo -e "${YELLOW}Step 5: Installing dependencies...${NC}"
 cd "$PACKAGE_DIR"
 pip3 install --target . boto3 --quiet --no-warn-conflicts 2>&1 | grep -v "dependency conflicts" | grep -v "awscli" || true
+# NumPy for the columnar aggregation engine (Linux wheels for the Lambda runtime)
+pip3 install --target . numpy --platform manylinux2014_x86_64 --only-binary=:all: --quiet
 cd ..
 echo -e "${GREEN}✅ Dependencies installed${NC}"
 echo ""
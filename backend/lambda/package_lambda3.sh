@@ -12,6 +12,7 @@ echo -e "${BLUE}========================================${NC}"
 echo ""
 
 LAMBDA_FILE="lambda3_process_and_store.py"
+SHARED_FILES="aws_clients.py structured_log.py results_format.py dynamodb_batch.py studentlytics_data.py parallel_scan.py rate_limiter.py scoring.py session_summary.py"
 PACKAGE_DIR="lambda3_package"
 OUTPUT_ZIP="lambda3_process_and_store.zip"
 
@@ -31,6 +32,9 @@ echo ""
 echo -e "${YELLOW}Step 3: Creating package...${NC}"
 mkdir -p "$PACKAGE_DIR"
 cp "$LAMBDA_FILE" "$PACKAGE_DIR/"
+for SHARED_FILE in $SHARED_FILES; do
+    cp "$SHARED_FILE" "$PACKAGE_DIR/"
+done
 echo -e "${GREEN}✅ Package created${NC}"
 echo ""
 
@@ -14,6 +14,7 @@ echo ""
 
 # Configuration
 LAMBDA_FILE="lambda1_generate_job.py"
+SHARED_FILES="aws_clients.py structured_log.py job_ledger.py roster_manifest.py"
 PACKAGE_DIR="lambda1_package"
 OUTPUT_ZIP="lambda1_generate_job.zip"
 
@@ -43,6 +44,10 @@ echo ""
 echo -e "${YELLOW}Step 4: Copying Lambda function...${NC}"
 cp "$LAMBDA_FILE" "$PACKAGE_DIR/"
 echo -e "${GREEN}✅ Copied $LAMBDA_FILE to package${NC}"
+for SHARED_FILE in $SHARED_FILES; do
+    cp "$SHARED_FILE" "$PACKAGE_DIR/"
+    echo -e "${GREEN}✅ Copied $SHARED_FILE to package${NC}"
+done
 echo ""
 
 # Step 5: Install dependencies
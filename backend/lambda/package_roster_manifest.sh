@@ -0,0 +1,37 @@
+#!/bin/bash
+
+GREEN='\033[0;32m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+echo -e "${BLUE}📦 Packaging Roster Manifest Lambda${NC}"
+
+LAMBDA_FILE="roster_manifest.py"
+SHARED_FILES="aws_clients.py structured_log.py"
+PACKAGE_DIR="roster_manifest_package"
+OUTPUT_ZIP="roster_manifest.zip"
+
+echo "Cleaning up..."
+rm -rf "$PACKAGE_DIR" "$OUTPUT_ZIP"
+
+echo "Creating package..."
+mkdir -p "$PACKAGE_DIR"
+cp "$LAMBDA_FILE" "$PACKAGE_DIR/"
+for SHARED_FILE in $SHARED_FILES; do
+    cp "$SHARED_FILE" "$PACKAGE_DIR/"
+done
+
+echo "Installing dependencies..."
+cd "$PACKAGE_DIR"
+pip3 install --target . boto3 --quiet --no-warn-conflicts
+cd ..
+
+echo "Creating ZIP..."
+cd "$PACKAGE_DIR"
+zip -r ../"$OUTPUT_ZIP" . -q
+cd ..
+rm -rf "$PACKAGE_DIR"
+
+echo -e "${GREEN}✅ Package created: $OUTPUT_ZIP${NC}"
+echo "Handler: roster_manifest.lambda_handler"
+ls -lh "$OUTPUT_ZIP"
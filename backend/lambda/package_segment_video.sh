@@ -0,0 +1,38 @@
+#!/bin/bash
+
+GREEN='\033[0;32m'
+BLUE='\033[0;34m'
+NC='\033[0m'
+
+echo -e "${BLUE}📦 Packaging Segment Video Lambda${NC}"
+
+LAMBDA_FILE="lambda_segment_video.py"
+SHARED_FILES="aws_clients.py structured_log.py"
+PACKAGE_DIR="segment_video_package"
+OUTPUT_ZIP="lambda_segment_video.zip"
+
+echo "Cleaning up..."
+rm -rf "$PACKAGE_DIR" "$OUTPUT_ZIP"
+
+echo "Creating package..."
+mkdir -p "$PACKAGE_DIR"
+cp "$LAMBDA_FILE" "$PACKAGE_DIR/"
+for SHARED_FILE in $SHARED_FILES; do
+    cp "$SHARED_FILE" "$PACKAGE_DIR/"
+done
+
+echo "Installing dependencies..."
+cd "$PACKAGE_DIR"
+pip3 install --target . boto3 --quiet --no-warn-conflicts
+cd ..
+
+echo "Creating ZIP..."
+cd "$PACKAGE_DIR"
+zip -r ../"$OUTPUT_ZIP" . -q
+cd ..
+rm -rf "$PACKAGE_DIR"
+
+echo -e "${GREEN}✅ Package created: $OUTPUT_ZIP${NC}"
+echo "Handler: lambda_segment_video.lambda_handler"
+echo "Needs an ffmpeg layer (static binary at /opt/bin/ffmpeg, or set FFMPEG_PATH)"
+ls -lh "$OUTPUT_ZIP"
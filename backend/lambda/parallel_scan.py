@@ -0,0 +1,181 @@
+"""
+Parallel segmented Scan for table-wide jobs
+
+The scan is split into TotalSegments segments. DynamoDB hashes every item
+to exactly one segment, and the segments are read concurrently on a worker
+pool. Each segment follows LastEvaluatedKey to its end, so the result is
+the whole table (or index), however large it grows.
+
+    scan = ParallelScan('StudentlyticsData', attributes=['record_id', 'status'])
+    for item in scan:
+        ...
+    scan.stats   # pages, items, scanned, consumed_capacity, seconds
+
+Items are yielded as pages arrive, through a bounded queue. Memory stays
+at a few pages per worker, and a slow consumer holds the workers back.
+Leaving the loop early stops the workers.
+
+  - attributes: ProjectionExpression pushdown (names are aliased, so
+    reserved words like status are fine)
+  - filter_expression / expression_names / expression_values: a
+    FilterExpression, applied by DynamoDB before items are returned (it
+    does not reduce the read units consumed)
+  - read_capacity: max read units per second across all workers, metered
+    on the ConsumedCapacity of each page (0 = unlimited)
+
+The low-level client is used because clients are thread-safe and resources
+are not. Items come back as plain Python / Decimal values, like the Table
+API returns them.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+from rate_limiter import RateLimiter
+
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', '8'))
+SCAN_READ_CAPACITY = float(os.environ.get('SCAN_READ_CAPACITY', '0'))
+
+# Pages buffered per worker before workers wait for the consumer
+QUEUE_PAGES_PER_WORKER = 2
+
+dynamodb_client = aws_clients.lazy_client('dynamodb', max_pool_connections=SCAN_WORKERS * 2)
+
+_serializer = None
+_deserializer = None
+
+# Queue marker: a segment has no more pages
+_SEGMENT_DONE = object()
+
+
+def _types():
+    global _serializer, _deserializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+        _serializer = TypeSerializer()
+        _deserializer = TypeDeserializer()
+    return _serializer, _deserializer
+
+
+def build_scan_args(table_name, attributes=None, filter_expression=None, expression_names=None,
+                    expression_values=None, index_name=None, consistent_read=False, page_size=None):
+    """Scan request parameters (low-level client) shared by every segment"""
+    serializer, _ = _types()
+    scan_args = {'TableName': table_name, 'ReturnConsumedCapacity': 'TOTAL'}
+    names = dict(expression_names or {})
+
+    if attributes:
+        aliases = {f"#s{i}": attribute for i, attribute in enumerate(attributes)}
+        names.update(aliases)
+        scan_args['ProjectionExpression'] = ', '.join(aliases)
+    if filter_expression:
+        scan_args['FilterExpression'] = filter_expression
+    if names:
+        scan_args['ExpressionAttributeNames'] = names
+    if expression_values:
+        scan_args['ExpressionAttributeValues'] = {
+            name: serializer.serialize(value) for name, value in expression_values.items()
+        }
+    if index_name:
+        scan_args['IndexName'] = index_name
+    if consistent_read:
+        scan_args['ConsistentRead'] = True
+    if page_size:
+        scan_args['Limit'] = page_size
+
+    return scan_args
+
+
+class ParallelScan:
+    """
+    Iterable over every item of a table (or index), read by `workers`
+    threads over `segments` scan segments (default: one per worker)
+    """
+
+    def __init__(self, table_name, workers=SCAN_WORKERS, segments=None, attributes=None,
+                 filter_expression=None, expression_names=None, expression_values=None,
+                 index_name=None, read_capacity=SCAN_READ_CAPACITY, consistent_read=False, page_size=None):
+        self.workers = max(1, workers)
+        self.segments = max(1, segments or self.workers)
+        self.scan_args = build_scan_args(
+            table_name, attributes, filter_expression, expression_names, expression_values,
+            index_name, consistent_read, page_size
+        )
+        self.limiter = RateLimiter(read_capacity)
+        self.stats = {}
+
+    def scan_segment(self, segment, pages, stop):
+        """Read one segment to its end, putting (items, scanned, consumed) pages on the queue"""
+        _, deserializer = _types()
+        scan_args = dict(self.scan_args, Segment=segment, TotalSegments=self.segments)
+
+        try:
+            while not stop.is_set():
+                response = dynamodb_client.scan(**scan_args)
+                consumed = response.get('ConsumedCapacity', {}).get('CapacityUnits', 0)
+                items = [
+                    {name: deserializer.deserialize(value) for name, value in item.items()}
+                    for item in response.get('Items', [])
+                ]
+                self._put(pages, (items, response.get('ScannedCount', 0), consumed), stop)
+
+                # Pay for this page before reading the next one
+                self.limiter.acquire(consumed)
+
+                last_key = response.get('LastEvaluatedKey')
+                if not last_key:
+                    break
+                scan_args['ExclusiveStartKey'] = last_key
+        except Exception as error:
+            # Raised to the consumer, which stops the other segments
+            self._put(pages, error, stop)
+            return
+
+        self._put(pages, _SEGMENT_DONE, stop)
+
+    @staticmethod
+    def _put(pages, entry, stop):
+        # Wait for room, but give up once the consumer has gone away
+        while not stop.is_set():
+            try:
+                pages.put(entry, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        self.stats = {
+            'segments': self.segments, 'workers': self.workers,
+            'pages': 0, 'items': 0, 'scanned': 0, 'consumed_capacity': 0.0, 'seconds': 0.0
+        }
+        started = time.monotonic()
+        pages = queue.Queue(maxsize=self.workers * QUEUE_PAGES_PER_WORKER)
+        stop = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+
+        try:
+            for segment in range(self.segments):
+                pool.submit(self.scan_segment, segment, pages, stop)
+            remaining = self.segments
+
+            while remaining:
+                entry = pages.get()
+                if entry is _SEGMENT_DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(entry, Exception):
+                    raise entry
+
+                items, scanned, consumed = entry
+                self.stats['pages'] += 1
+                self.stats['items'] += len(items)
+                self.stats['scanned'] += scanned
+                self.stats['consumed_capacity'] += consumed
+                yield from items
+        finally:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.stats['seconds'] = round(time.monotonic() - started, 3)
@@ -0,0 +1,45 @@
+"""
+Thread-safe token bucket rate limiter
+
+Shared by the jobs that fan calls out over a worker pool and must stay
+under a service limit (e.g. Rekognition IndexFaces TPS).
+"""
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate` tokens per second, up to `burst` saved up
+
+    acquire() blocks until the requested tokens are available. Requests
+    larger than `burst` go through once the bucket is full and leave it in
+    debt, which later callers wait off. A rate of 0 or None disables
+    limiting.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate or 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        if not self.rate:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                needed = min(tokens, self.burst)
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return
+
+                wait = (needed - self.tokens) / self.rate
+
+            time.sleep(wait)
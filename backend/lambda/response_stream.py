@@ -0,0 +1,143 @@
+"""
+Streaming pieces for the chatbot
+
+  - StreamAssembler rebuilds the assistant message from the events of
+    bedrock invoke_model_with_response_stream (Anthropic messages API),
+    handing out text deltas as they arrive and collecting tool_use blocks
+    whose input JSON comes in fragments.
+  - Writers deliver stream events ({'type': 'text', 'text': ...}, ...) to
+    the client:
+      WebSocketWriter - API Gateway WebSocket connection (post_to_connection),
+                        the client sees text as it is generated
+      BufferedWriter  - collects events with their time offsets; used for
+                        plain HTTP (returned as NDJSON) and for local runs
+"""
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+import structured_log
+
+log = structured_log.get_logger('response_stream')
+
+
+class StreamAssembler:
+    """Accumulates one streamed assistant message"""
+
+    def __init__(self):
+        self.content = []
+        self.stop_reason = None
+        self.usage = {}
+        self._tool_json = {}
+
+    def feed(self, event):
+        """
+        Apply one decoded stream event
+
+        Returns the text delta it carried, or None.
+        """
+        event_type = event.get('type')
+
+        if event_type == 'message_start':
+            self.usage.update(event.get('message', {}).get('usage', {}))
+
+        elif event_type == 'content_block_start':
+            block = dict(event['content_block'])
+            if block.get('type') == 'tool_use':
+                block['input'] = {}
+                self._tool_json[event['index']] = []
+            self.content.append(block)
+
+        elif event_type == 'content_block_delta':
+            delta = event['delta']
+            block = self.content[event['index']]
+            if delta.get('type') == 'text_delta':
+                block['text'] = block.get('text', '') + delta['text']
+                return delta['text']
+            if delta.get('type') == 'input_json_delta':
+                self._tool_json[event['index']].append(delta.get('partial_json', ''))
+
+        elif event_type == 'content_block_stop':
+            fragments = self._tool_json.pop(event['index'], None)
+            if fragments is not None:
+                raw = ''.join(fragments)
+                self.content[event['index']]['input'] = json.loads(raw) if raw else {}
+
+        elif event_type == 'message_delta':
+            self.stop_reason = event.get('delta', {}).get('stop_reason', self.stop_reason)
+            self.usage.update(event.get('usage', {}))
+
+        return None
+
+
+def stream_events(response):
+    """Decoded events of an invoke_model_with_response_stream response"""
+    for part in response['body']:
+        chunk = part.get('chunk')
+        if chunk:
+            yield json.loads(chunk['bytes'])
+
+
+class StreamWriter:
+    """Base writer: stamps events with ms since the start, records time to first text"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_text_ms = None
+
+    def elapsed_ms(self):
+        return int((time.monotonic() - self.started) * 1000)
+
+    def write(self, event):
+        event = dict(event, t_ms=self.elapsed_ms())
+        if event.get('type') == 'text' and self.first_text_ms is None:
+            self.first_text_ms = event['t_ms']
+        self.send(event)
+
+    def send(self, event):
+        raise NotImplementedError
+
+
+class BufferedWriter(StreamWriter):
+    """Collects stream events (plain HTTP fallback and local runs)"""
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def send(self, event):
+        self.events.append(event)
+
+    def ndjson(self):
+        return '\n'.join(json.dumps(event, default=str) for event in self.events) + '\n'
+
+
+class WebSocketWriter(StreamWriter):
+    """Sends each stream event as one message on an API Gateway WebSocket connection"""
+
+    def __init__(self, domain_name, stage, connection_id):
+        super().__init__()
+        self.connection_id = connection_id
+        self.connected = True
+        # Cached per endpoint, so warm invocations reuse the connection
+        self.client = aws_clients.get_client(
+            'apigatewaymanagementapi',
+            endpoint_url=f"https://{domain_name}/{stage}"
+        )
+
+    def send(self, event):
+        if not self.connected:
+            return
+        try:
+            self.client.post_to_connection(
+                ConnectionId=self.connection_id,
+                Data=json.dumps(event, default=str).encode('utf-8')
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'GoneException':
+                raise
+            # Client went away - finish the turn without sending
+            log.warning("WebSocket connection is gone", connection_id=self.connection_id)
+            self.connected = False
@@ -0,0 +1,138 @@
+"""
+Storage format of rekognition-results/ objects
+
+Written by Lambda 2, read by Lambda 3 (and anything else that needs the
+per-student results).
+
+Formats:
+  - ndjson-gzip (default): gzip'd newline-delimited JSON. The first line is a
+    header with every top-level field except student_data, followed by one
+    compact line per student: {"student_id": "...", "data": {...}}
+  - json: the original single pretty-printed JSON document
+
+Videos are searched in segments: each keeps an intermediate aggregate under
+rekognition-results/segments/{record_id}/ until the merge step combines
+them. With SAVE_RAW_DETECTIONS, Lambda 2 also writes every Persons entry
+there as gzip'd NDJSON, per segment and timed from the segment start.
+
+Readers detect the format (gzip magic bytes, content type, header line), so
+objects written before the compact format existed still load.
+"""
+import gzip
+import json
+import os
+
+FORMAT_NDJSON_GZIP = 'ndjson-gzip'
+FORMAT_JSON = 'json'
+
+RESULTS_FORMAT = os.environ.get('RESULTS_FORMAT', FORMAT_NDJSON_GZIP)
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+JSON_CONTENT_TYPE = 'application/json'
+
+# Marker in the header line of an NDJSON results object
+NDJSON_HEADER_FORMAT = 'studentlytics-results/ndjson-v1'
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+_COMPACT = (',', ':')
+
+
+def results_key(record_id, results_format=None):
+    """S3 key of the results object for a record"""
+    if (results_format or RESULTS_FORMAT) == FORMAT_NDJSON_GZIP:
+        return f"rekognition-results/{record_id}_results.ndjson.gz"
+    return f"rekognition-results/{record_id}_results.json"
+
+
+def segment_detections_key(record_id, segment_index):
+    """S3 key of the optional raw detections object for one video segment"""
+    return f"rekognition-results/segments/{record_id}/{segment_index:03d}_detections.ndjson.gz"
+
+
+def segment_aggregate_key(record_id, segment_index):
+    """S3 key of the intermediate per-student aggregate of one video segment"""
+    return f"rekognition-results/segments/{record_id}/{segment_index:03d}_aggregate.json"
+
+
+def open_detections_file(path):
+    """Open a local gzip'd NDJSON file for raw detections (one Persons entry per line)"""
+    return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+
+
+def write_detections(detections_file, persons):
+    """Append one page of Persons to a file from open_detections_file"""
+    for person in persons:
+        detections_file.write(json.dumps(person, separators=_COMPACT))
+        detections_file.write('\n')
+
+
+def encode_results(results_content, results_format=None):
+    """
+    Serialize a results document
+
+    Returns (body_bytes, put_object_kwargs) where the kwargs carry the
+    ContentType / ContentEncoding that identify the format.
+    """
+    results_format = results_format or RESULTS_FORMAT
+
+    if results_format == FORMAT_JSON:
+        body = json.dumps(results_content, indent=2).encode('utf-8')
+        return body, {'ContentType': JSON_CONTENT_TYPE}
+
+    if results_format != FORMAT_NDJSON_GZIP:
+        raise ValueError(f"Unknown results format: {results_format}")
+
+    header = {key: value for key, value in results_content.items() if key != 'student_data'}
+    header['format'] = NDJSON_HEADER_FORMAT
+
+    lines = [json.dumps(header, separators=_COMPACT)]
+    for student_id, data in results_content.get('student_data', {}).items():
+        lines.append(json.dumps({'student_id': student_id, 'data': data}, separators=_COMPACT))
+
+    body = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'), compresslevel=6)
+    return body, {'ContentType': NDJSON_CONTENT_TYPE, 'ContentEncoding': 'gzip'}
+
+
+def decode_results(body, content_type=None):
+    """
+    Parse a results object body (bytes) written in any supported format
+
+    Returns the results document with `student_data` as a dict, the same
+    shape the original JSON objects had.
+    """
+    if body[:2] == GZIP_MAGIC:
+        body = gzip.decompress(body)
+
+    text = body.decode('utf-8')
+
+    if content_type == NDJSON_CONTENT_TYPE or _has_ndjson_header(text):
+        return _decode_ndjson(text)
+
+    return json.loads(text)
+
+
+def _has_ndjson_header(text):
+    first_line = text.split('\n', 1)[0]
+    try:
+        header = json.loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get('format') == NDJSON_HEADER_FORMAT
+
+
+def _decode_ndjson(text):
+    lines = iter(text.splitlines())
+
+    results = json.loads(next(lines))
+    results.pop('format', None)
+
+    student_data = {}
+    for line in lines:
+        if not line:
+            continue
+        entry = json.loads(line)
+        student_data[entry['student_id']] = entry['data']
+
+    results['student_data'] = student_data
+    return results
@@ -0,0 +1,240 @@
+"""
+Student roster manifest: one S3 object mapping student_id -> photo key
+
+Lambda 1 reads this single object instead of listing photos/ on every
+video upload. The manifest is kept up to date incrementally by this
+module's lambda_handler, triggered by S3 ObjectCreated / ObjectRemoved
+events on photos/ (EventBridge or direct S3 notifications).
+
+Updates are read-modify-write with S3 conditional writes (IfMatch /
+IfNoneMatch), retried when another writer got there first.
+"""
+import json
+import random
+import time
+from datetime import datetime
+from urllib.parse import unquote_plus
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+import structured_log
+
+s3 = aws_clients.lazy_client('s3')
+log = structured_log.get_logger('roster_manifest')
+
+BUCKET_NAME = 'hackathon-attendance-media'
+PHOTOS_PREFIX = 'photos/'
+ROSTER_MANIFEST_KEY = 'manifests/roster.json'
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+MAX_UPDATE_ATTEMPTS = 10
+
+# Another writer changed the manifest between our read and our write
+CONFLICT_ERRORS = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+
+def student_id_from_photo_key(key):
+    """
+    Extract the student id from a photo key
+
+    Expected format: photos/student_10001.jpg -> 10001. Returns None for
+    anything that is not a student photo.
+    """
+    if not key.startswith(PHOTOS_PREFIX) or not key.lower().endswith(PHOTO_EXTENSIONS):
+        return None
+
+    filename_only = key.split('/')[-1]
+    student_id_str = filename_only.replace('student_', '').rsplit('.', 1)[0]
+
+    try:
+        return int(student_id_str)
+    except ValueError:
+        return None
+
+
+def load_roster(bucket):
+    """
+    Read the roster manifest
+
+    Returns (students, etag), students being {"10001": "photos/student_10001.jpg"},
+    or (None, None) if the manifest does not exist yet.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=ROSTER_MANIFEST_KEY)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None, None
+        raise
+
+    manifest = json.loads(response['Body'].read().decode('utf-8'))
+    return manifest.get('students', {}), response['ETag']
+
+
+def manifest_body(students):
+    """Serialize the manifest document"""
+    return json.dumps({
+        'updated_at': datetime.now().isoformat(),
+        'student_count': len(students),
+        'students': students
+    }, separators=(',', ':'))
+
+
+def save_roster(bucket, students, etag=None):
+    """
+    Write the roster manifest
+
+    With an etag the write only succeeds if the manifest is unchanged since
+    it was read; without one it only succeeds if there is no manifest yet.
+    """
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+
+    s3.put_object(
+        Bucket=bucket,
+        Key=ROSTER_MANIFEST_KEY,
+        Body=manifest_body(students),
+        ContentType='application/json',
+        **condition
+    )
+
+
+def list_roster(bucket):
+    """Students mapping from a full (paginated) listing of photos/"""
+    students = {}
+    paginator = s3.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=PHOTOS_PREFIX):
+        for obj in page.get('Contents', []):
+            student_id = student_id_from_photo_key(obj['Key'])
+            if student_id is not None:
+                students[str(student_id)] = obj['Key']
+
+    return students
+
+
+def rebuild_roster(bucket):
+    """
+    Build the manifest from a full listing of photos/
+
+    Used once to bootstrap the manifest, or to repair it. The write is
+    conditional on the manifest read before listing, so a rebuild never
+    overwrites a newer manifest; on a conflict the listing is taken again.
+    """
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        _, etag = load_roster(bucket)
+        students = list_roster(bucket)
+
+        try:
+            save_roster(bucket, students, etag)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in CONFLICT_ERRORS:
+                raise
+            log.warning("Manifest changed during rebuild, retrying", attempt=attempt + 1)
+            time.sleep(random.uniform(0, 0.1 * (2 ** attempt)))
+            continue
+
+        log.info("Roster manifest rebuilt", bucket=bucket, students=len(students))
+        return students
+
+    raise Exception(f"Could not rebuild roster manifest after {MAX_UPDATE_ATTEMPTS} attempts")
+
+
+def apply_photo_changes(bucket, added, removed):
+    """
+    Apply added / removed photo keys to the manifest
+
+    Args:
+        added: photo keys that were created or overwritten
+        removed: photo keys that were deleted
+
+    Returns the updated students mapping.
+    """
+    for attempt in range(MAX_UPDATE_ATTEMPTS):
+        students, etag = load_roster(bucket)
+        if students is None:
+            # No manifest yet - a full listing already includes these changes
+            return rebuild_roster(bucket)
+
+        for key in added:
+            student_id = student_id_from_photo_key(key)
+            if student_id is not None:
+                students[str(student_id)] = key
+
+        for key in removed:
+            student_id = student_id_from_photo_key(key)
+            if student_id is not None and students.get(str(student_id)) == key:
+                del students[str(student_id)]
+
+        try:
+            save_roster(bucket, students, etag)
+            return students
+        except ClientError as e:
+            if e.response['Error']['Code'] not in CONFLICT_ERRORS:
+                raise
+            log.warning("Manifest changed concurrently, retrying", attempt=attempt + 1)
+            time.sleep(random.uniform(0, 0.1 * (2 ** attempt)))
+
+    raise Exception(f"Could not update roster manifest after {MAX_UPDATE_ATTEMPTS} attempts")
+
+
+def parse_photo_events(event):
+    """
+    Collect (bucket, added_keys, removed_keys) from an EventBridge or S3 event
+    """
+    bucket = None
+    added = []
+    removed = []
+
+    # EventBridge format (S3 -> EventBridge)
+    if 'detail' in event and 'bucket' in event['detail']:
+        bucket = event['detail']['bucket']['name']
+        key = event['detail']['object']['key']
+        if event.get('detail-type') == 'Object Deleted':
+            removed.append(key)
+        else:
+            added.append(key)
+
+    # Direct S3 event format
+    for record in event.get('Records', []):
+        s3_event = record['s3']
+        bucket = s3_event['bucket']['name']
+        key = unquote_plus(s3_event['object']['key'])
+        if record.get('eventName', '').startswith('ObjectRemoved'):
+            removed.append(key)
+        else:
+            added.append(key)
+
+    return bucket, added, removed
+
+
+def lambda_handler(event, context):
+    """
+    Keep the roster manifest in sync with photos/
+
+    Triggered by: S3 ObjectCreated / ObjectRemoved on photos/
+    Also accepts {"action": "rebuild", "bucket": "..."} to rebuild from a listing.
+    """
+    structured_log.start_invocation(context)
+
+    if event.get('action') == 'rebuild':
+        students = rebuild_roster(event.get('bucket', BUCKET_NAME))
+        log.summary("Roster rebuilt", student_count=len(students))
+        return {'status': 'rebuilt', 'student_count': len(students)}
+
+    bucket, added, removed = parse_photo_events(event)
+    if not bucket or not (added or removed):
+        log.info("No photo changes in event")
+        return {'status': 'skipped'}
+
+    structured_log.bind(bucket=bucket)
+    log.info("Roster update", added=len(added), removed=len(removed))
+    students = apply_photo_changes(bucket, added, removed)
+
+    log.summary("Roster updated", student_count=len(students), added=len(added), removed=len(removed))
+
+    return {
+        'status': 'updated',
+        'student_count': len(students),
+        'added': len(added),
+        'removed': len(removed)
+    }
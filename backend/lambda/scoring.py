@@ -0,0 +1,235 @@
+"""
+Attendance and engagement scoring of per-student face search results
+
+Lambda 3 scores each student of a new session; backfill_scores.py re-scores
+historical sessions from their saved rekognition-results/ objects. Both
+use the weights below, and every stored score is tagged with
+SCORING_VERSION so a backfill only rewrites records scored by an older
+version.
+
+score_students scores a whole session at once on NumPy columns. It gives
+exactly the same numbers as the per-student functions (the final rounding
+is done in Python for both); without NumPy it falls back to them.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # per-student fallback in score_students
+    np = None
+
+# Bump whenever a weight or formula below changes, then run backfill_scores.py
+#   1: presence = span from first to last detection
+#   2: presence = covered time of the presence runs, each run widened by half
+#      the gap tolerance (span for older results)
+SCORING_VERSION = 2
+
+# Attendance: presence (normalized to a 50-minute class), confidence, similarity
+FULL_PRESENCE_SEC = 3000
+ATTENDANCE_PRESENCE_WEIGHT = 0.50
+ATTENDANCE_CONFIDENCE_WEIGHT = 0.25
+ATTENDANCE_SIMILARITY_WEIGHT = 0.25
+
+# Engagement: head orientation, visibility, proximity (bounding box size)
+ENGAGEMENT_ORIENTATION_WEIGHT = 0.40
+ENGAGEMENT_VISIBILITY_WEIGHT = 0.30
+ENGAGEMENT_PROXIMITY_WEIGHT = 0.30
+SHARPNESS_SCALE = 5
+MIN_BBOX = 0.005
+MAX_BBOX = 0.03
+
+# Speaking time, as shares of the time inside class
+SPEAKING_BASE_SHARE = 0.15
+SPEAKING_MOVEMENT_SHARE = 0.10
+SPEAKING_FORWARD_SHARE = 0.10
+SPEAKING_MAX_SHARE = 0.50
+FORWARD_MAX_YAW = 20
+FORWARD_MAX_PITCH = 30
+
+# student_data fields read by the scores besides presence, in score_students column order
+SCORED_FIELDS = [
+    'AvgConfidence', 'AvgSimilarity', 'AvgYaw', 'AvgPitch',
+    'AvgRoll', 'AvgBrightness', 'AvgSharpness', 'AvgBoundingBoxSize'
+]
+
+
+def presence_seconds(student_data):
+    """
+    Time the student was in class: the covered time of their presence
+    runs, or the detection span for results saved before runs existed
+    """
+    return student_data.get('CoveredDuration(sec)', student_data.get('PresenceDuration(sec)', 0))
+
+
+def was_present(student_data):
+    """
+    Whether the student was detected at all. A single detection has a
+    zero span, so the detection count is used (or, for results saved
+    before it existed, a non-zero span or match confidence)
+    """
+    if 'DetectionCount' in student_data:
+        return student_data['DetectionCount'] > 0
+    return student_data.get('PresenceDuration(sec)', 0) > 0 or student_data.get('AvgConfidence', 0) > 0
+
+
+def calculate_attendance_score(student_data):
+    """
+    Calculate Attendance Score (0-100) based on:
+    - Presence, covered time in class (50%)
+    - Confidence (25%)
+    - Similarity (25%)
+    """
+    # Get raw values
+    presence_duration = presence_seconds(student_data)
+    avg_confidence = student_data.get('AvgConfidence', 0)
+    avg_similarity = student_data.get('AvgSimilarity', 0)
+
+    # Normalize presence duration to the full class length
+    presence_score = min(100, (presence_duration / FULL_PRESENCE_SEC) * 100)
+
+    # Confidence and similarity are already 0-100
+    attendance_score = (
+        ATTENDANCE_PRESENCE_WEIGHT * presence_score +
+        ATTENDANCE_CONFIDENCE_WEIGHT * avg_confidence +
+        ATTENDANCE_SIMILARITY_WEIGHT * avg_similarity
+    )
+
+    return round(attendance_score, 1)
+
+
+def calculate_engagement_score(student_data):
+    """
+    Calculate Engagement Score (0-100) based on:
+    - Head Orientation (40%): Yaw, Pitch, Roll
+    - Visibility (30%): Brightness, Sharpness
+    - Proximity (30%): BoundingBoxSize
+    """
+    # Get raw values
+    avg_yaw = abs(student_data.get('AvgYaw', 0))
+    avg_pitch = abs(student_data.get('AvgPitch', 0))
+    avg_roll = abs(student_data.get('AvgRoll', 0))
+    avg_brightness = student_data.get('AvgBrightness', 0)
+    avg_sharpness = student_data.get('AvgSharpness', 0)
+    avg_bbox_size = student_data.get('AvgBoundingBoxSize', 0)
+
+    # Head Orientation Score (lower angles = better engagement)
+    yaw_score = max(0, 100 - (avg_yaw / 180 * 100))
+    pitch_score = max(0, 100 - (avg_pitch / 90 * 100))
+    roll_score = max(0, 100 - (avg_roll / 180 * 100))
+    orientation_score = (yaw_score + pitch_score + roll_score) / 3
+
+    # Visibility Score (higher = better)
+    brightness_score = min(100, avg_brightness)
+    sharpness_score = min(100, avg_sharpness * SHARPNESS_SCALE)
+    visibility_score = (brightness_score + sharpness_score) / 2
+
+    # Proximity Score (larger bbox = closer = more engaged)
+    proximity_score = min(100, max(0, ((avg_bbox_size - MIN_BBOX) / (MAX_BBOX - MIN_BBOX)) * 100))
+
+    # Final Engagement Score
+    engagement_score = (
+        ENGAGEMENT_ORIENTATION_WEIGHT * orientation_score +
+        ENGAGEMENT_VISIBILITY_WEIGHT * visibility_score +
+        ENGAGEMENT_PROXIMITY_WEIGHT * proximity_score
+    )
+
+    return round(engagement_score, 1)
+
+
+def estimate_speaking_time(student_data, time_inside_class):
+    """
+    Estimate speaking time based on engagement indicators
+    """
+    avg_yaw = abs(student_data.get('AvgYaw', 0))
+    avg_pitch = abs(student_data.get('AvgPitch', 0))
+    avg_roll = abs(student_data.get('AvgRoll', 0))
+
+    # Base speaking time (share of presence)
+    base_speaking = time_inside_class * SPEAKING_BASE_SHARE
+
+    # Bonus for head movement
+    movement_factor = (avg_yaw + avg_pitch + avg_roll) / 450
+    movement_bonus = time_inside_class * SPEAKING_MOVEMENT_SHARE * movement_factor
+
+    # Bonus for forward orientation
+    if avg_yaw < FORWARD_MAX_YAW and avg_pitch < FORWARD_MAX_PITCH:
+        orientation_bonus = time_inside_class * SPEAKING_FORWARD_SHARE
+    else:
+        orientation_bonus = 0
+
+    total_speaking = base_speaking + movement_bonus + orientation_bonus
+
+    # Cap at a share of the time in class
+    return int(min(total_speaking, time_inside_class * SPEAKING_MAX_SHARE))
+
+
+def score_students(students):
+    """
+    Score a batch of student_data dicts (a whole session)
+
+    Returns one (attendance, engagement, time_inside_class, speaking_time)
+    tuple per student, in input order.
+    """
+    if np is None or not students:
+        scores = []
+        for student_data in students:
+            time_inside_class = int(presence_seconds(student_data))
+            scores.append((
+                calculate_attendance_score(student_data),
+                calculate_engagement_score(student_data),
+                time_inside_class,
+                estimate_speaking_time(student_data, time_inside_class)
+            ))
+        return scores
+
+    columns = np.array(
+        [[presence_seconds(student_data)] + [student_data.get(field, 0) for field in SCORED_FIELDS]
+         for student_data in students],
+        dtype=np.float64
+    ).T
+    presence, confidence, similarity, yaw, pitch, roll, brightness, sharpness, bbox_size = columns
+    yaw, pitch, roll = np.abs(yaw), np.abs(pitch), np.abs(roll)
+
+    # Same operations, in the same order, as the per-student functions
+    presence_score = np.minimum(100, (presence / FULL_PRESENCE_SEC) * 100)
+    attendance = (
+        ATTENDANCE_PRESENCE_WEIGHT * presence_score +
+        ATTENDANCE_CONFIDENCE_WEIGHT * confidence +
+        ATTENDANCE_SIMILARITY_WEIGHT * similarity
+    )
+
+    orientation_score = (
+        np.maximum(0, 100 - (yaw / 180 * 100)) +
+        np.maximum(0, 100 - (pitch / 90 * 100)) +
+        np.maximum(0, 100 - (roll / 180 * 100))
+    ) / 3
+    visibility_score = (np.minimum(100, brightness) + np.minimum(100, sharpness * SHARPNESS_SCALE)) / 2
+    proximity_score = np.minimum(100, np.maximum(0, ((bbox_size - MIN_BBOX) / (MAX_BBOX - MIN_BBOX)) * 100))
+    engagement = (
+        ENGAGEMENT_ORIENTATION_WEIGHT * orientation_score +
+        ENGAGEMENT_VISIBILITY_WEIGHT * visibility_score +
+        ENGAGEMENT_PROXIMITY_WEIGHT * proximity_score
+    )
+
+    time_inside_class = np.trunc(presence)
+    speaking = (
+        time_inside_class * SPEAKING_BASE_SHARE +
+        time_inside_class * SPEAKING_MOVEMENT_SHARE * ((yaw + pitch + roll) / 450) +
+        np.where((yaw < FORWARD_MAX_YAW) & (pitch < FORWARD_MAX_PITCH), time_inside_class * SPEAKING_FORWARD_SHARE, 0)
+    )
+    speaking = np.trunc(np.minimum(speaking, time_inside_class * SPEAKING_MAX_SHARE))
+
+    return [
+        (round(attendance_score, 1), round(engagement_score, 1), int(seconds), int(speaking_seconds))
+        for attendance_score, engagement_score, seconds, speaking_seconds in zip(
+            attendance.tolist(), engagement.tolist(), time_inside_class.tolist(), speaking.tolist()
+        )
+    ]
+
+
+def score_histogram(scores):
+    """Count scores (0-100) in ten-point bins: 0-9, 10-19, ..., 90-100"""
+    histogram = {f"{low}-{low + 9 if low < 90 else 100}": 0 for low in range(0, 100, 10)}
+    labels = list(histogram)
+    for score in scores:
+        histogram[labels[min(9, max(0, int(score // 10)))]] += 1
+    return histogram
@@ -0,0 +1,59 @@
+"""
+Session summary item: one per session, written next to its student records
+
+Lambda 3 builds it at ingest; backfill_scores.py rebuilds it after
+re-scoring the session's students, so both produce the same item.
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from scoring import SCORING_VERSION, score_histogram
+from studentlytics_data import CATALOG_KEY, CATALOG_PARTITION, summary_key
+
+
+def build_session_summary(record_id, records, records_failed=0, results_key=None):
+    """
+    Build the session summary item from a session's student records
+
+    Holds the counts, attendance rate, averages, score histograms and the
+    absent list that get_class_summary / get_absent_students report, and
+    is the session's entry in the catalog (CatalogIndex).
+    """
+    total = len(records)
+    present = sum(1 for record in records if record['status'])
+    absent = total - present
+    
+    attendance_scores = [float(record['attendance']) for record in records]
+    engagement_scores = [float(record['engagement']) for record in records]
+    
+    first = records[0] if records else {}
+    
+    return {
+        'record_id': summary_key(record_id),
+        'session_record_id': record_id,
+        'item_type': 'session_summary',
+        'session_id': first.get('session_id', f"session_{record_id}"),
+        'session_date': first.get('session_date', datetime.now().strftime('%Y-%m-%d')),
+        'class_id': first.get('class_id'),
+        'class_name': first.get('class_name'),
+        'total_students': total,
+        'present': present,
+        'absent': absent,
+        'attendance_rate': Decimal(str(round((present / total) * 100, 1) if total else 0)),
+        'avg_attendance_score': Decimal(str(round(sum(attendance_scores) / total, 1) if total else 0)),
+        'avg_engagement_score': Decimal(str(round(sum(engagement_scores) / total, 1) if total else 0)),
+        'avg_time_inside_class': Decimal(str(round(sum(record['time_inside_class'] for record in records) / total, 1) if total else 0)),
+        'attendance_histogram': score_histogram(attendance_scores),
+        'engagement_histogram': score_histogram(engagement_scores),
+        'absent_students': [
+            {'student_id': record['student_id'], 'student_name': record['student_name']}
+            for record in records if not record['status']
+        ],
+        'records_failed': records_failed,
+        # Where backfill_scores.py re-scores the session from (shared by duplicate uploads)
+        'results_key': results_key,
+        'scoring_version': SCORING_VERSION,
+        # Session catalog entry (CatalogIndex), ordered by ingest time
+        CATALOG_KEY: CATALOG_PARTITION,
+        'ingested_at': int(datetime.now().timestamp())
+    }
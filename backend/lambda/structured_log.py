@@ -0,0 +1,125 @@
+"""
+Leveled, sampled JSON logging for the Lambda handlers
+
+One JSON object per line on stdout (CloudWatch Logs Insights parses the
+fields), stamped with the logger name and the invocation's request id:
+
+    log = structured_log.get_logger('lambda3')
+
+    structured_log.start_invocation(context, record_id=record_id)
+    log.info("Results loaded", students=len(students))
+    for student in students:
+        log.item("Student scored", student_id=..., attendance=...)
+        structured_log.count('present')
+    log.summary("Records stored", records_written=n)
+
+  - Levels: LOG_LEVEL env = DEBUG | INFO (default) | WARNING | ERROR | OFF.
+    Disabled levels cost one comparison - no formatting, no write.
+  - Per-item lines (one per student / page / detection) go through item():
+    all of them at DEBUG, a LOG_ITEM_SAMPLE_RATE sample (default 1%) at INFO.
+  - summary() writes one line per invocation with the fields passed, the
+    count() counters, item totals and the invocation duration.
+"""
+import json
+import os
+import random
+import sys
+import time
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'OFF': 100}
+
+LOG_LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), LEVELS['INFO'])
+ITEM_SAMPLE_RATE = float(os.environ.get('LOG_ITEM_SAMPLE_RATE', '0.01'))
+
+# Per-invocation state shared by all loggers of the process
+_invocation = {'context': {}, 'counters': {}, 'items': 0, 'items_logged': 0, 'started': time.monotonic()}
+_sampler = random.Random()
+_loggers = {}
+
+
+def start_invocation(context=None, **fields):
+    """Reset the per-invocation state; fields are added to every line of this invocation"""
+    stamp = {'request_id': getattr(context, 'aws_request_id', None)}
+    stamp.update(fields)
+    _invocation.update({
+        'context': {name: value for name, value in stamp.items() if value is not None},
+        'counters': {},
+        'items': 0,
+        'items_logged': 0,
+        'started': time.monotonic()
+    })
+
+
+def bind(**fields):
+    """Add fields to every later line of this invocation (e.g. once job_id is known)"""
+    _invocation['context'].update(fields)
+
+
+def count(name, amount=1):
+    """Add to a per-invocation counter reported by summary()"""
+    counters = _invocation['counters']
+    counters[name] = counters.get(name, 0) + amount
+
+
+def set_level(level):
+    """Change the level at runtime ('DEBUG', ..., 'OFF')"""
+    global LOG_LEVEL
+    LOG_LEVEL = LEVELS[level.upper()]
+
+
+class Logger:
+    def __init__(self, name, stream=None):
+        self.name = name
+        self.stream = stream
+
+    def enabled(self, level):
+        return LEVELS[level] >= LOG_LEVEL
+
+    def _emit(self, level, msg, fields):
+        record = {'level': level, 'logger': self.name, 'msg': msg}
+        record.update(_invocation['context'])
+        record.update(fields)
+        (self.stream or sys.stdout).write(json.dumps(record, default=str) + '\n')
+
+    def debug(self, msg, **fields):
+        if LEVELS['DEBUG'] >= LOG_LEVEL:
+            self._emit('DEBUG', msg, fields)
+
+    def info(self, msg, **fields):
+        if LEVELS['INFO'] >= LOG_LEVEL:
+            self._emit('INFO', msg, fields)
+
+    def warning(self, msg, **fields):
+        if LEVELS['WARNING'] >= LOG_LEVEL:
+            self._emit('WARNING', msg, fields)
+
+    def error(self, msg, **fields):
+        if LEVELS['ERROR'] >= LOG_LEVEL:
+            self._emit('ERROR', msg, fields)
+
+    def item(self, msg, **fields):
+        """Per-item line: always at DEBUG, sampled at INFO"""
+        _invocation['items'] += 1
+
+        if LEVELS['DEBUG'] >= LOG_LEVEL:
+            self._emit('DEBUG', msg, fields)
+        elif LEVELS['INFO'] >= LOG_LEVEL and _sampler.random() < ITEM_SAMPLE_RATE:
+            _invocation['items_logged'] += 1
+            self._emit('INFO', msg, dict(fields, sampled=True))
+
+    def summary(self, msg, **fields):
+        """The invocation's summary line (INFO)"""
+        if LEVELS['INFO'] >= LOG_LEVEL:
+            fields.update(_invocation['counters'])
+            fields.update({
+                'items': _invocation['items'],
+                'items_logged': _invocation['items_logged'],
+                'duration_ms': int((time.monotonic() - _invocation['started']) * 1000)
+            })
+            self._emit('INFO', msg, fields)
+
+
+def get_logger(name):
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name]
@@ -0,0 +1,404 @@
+"""
+Key-based access to the StudentlyticsData table
+
+Student records are keyed `record_id = "{session}#{student_id}"`. To read
+a session or a student without scanning the table, Lambda 3 also writes
+`session_record_id` (the session part of the key), and two GSIs index it:
+
+  - SessionIndex: partition `session_record_id` (S), sort `student_id` (N)
+      -> every student of one session
+  - StudentIndex: partition `student_id` (N), sort `session_record_id` (S)
+      -> every session of one student
+
+All reads are Query calls that follow LastEvaluatedKey, so results are
+complete however large the table grows, and take an optional projection
+so only the needed attributes come back.
+
+Each session also has one summary item (see summary_key), so session-level
+questions are a single GetItem. Summary items double as the session catalog:
+they carry `catalog = "sessions"`, and a sparse GSI orders them by ingest time
+
+  - CatalogIndex: partition `catalog` (S), sort `ingested_at` (N)
+      -> latest session, paginated session listing
+"""
+import base64
+import json
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+from parallel_scan import ParallelScan
+
+TABLE_NAME = 'StudentlyticsData'
+SESSION_INDEX = 'SessionIndex'
+STUDENT_INDEX = 'StudentIndex'
+CATALOG_INDEX = 'CatalogIndex'
+
+SESSION_KEY = 'session_record_id'
+
+# Per-session summary item written by Lambda 3: record_id = "{session}#summary".
+# It has no student_id, so it stays out of both GSIs.
+SUMMARY_SUFFIX = '#summary'
+
+# Only summary items have the catalog attribute, so CatalogIndex holds one item per session
+CATALOG_KEY = 'catalog'
+CATALOG_PARTITION = 'sessions'
+CATALOG_SORT_KEY = 'ingested_at'
+CATALOG_ATTRIBUTES = [
+    SESSION_KEY, 'session_date', 'class_name', 'total_students',
+    'present', 'absent', 'attendance_rate', CATALOG_SORT_KEY
+]
+
+# Version items, bumped by Lambda 3 on every ingest (cache invalidation): the
+# marker holds a global `version` counter, and each session has its own
+# `_meta#version#{record_id}` item, so no item grows with the number of sessions
+META_PREFIX = '_meta#'
+VERSION_MARKER_KEY = f"{META_PREFIX}versions"
+SESSION_VERSION_PREFIX = f"{META_PREFIX}version#"
+
+# BatchGetItem limit, and retries of its UnprocessedKeys
+BATCH_GET_SIZE = 100
+BATCH_GET_MAX_RETRIES = 8
+
+table = aws_clients.lazy_table(TABLE_NAME)
+dynamodb = aws_clients.lazy_resource('dynamodb')
+
+
+def projection_args(attributes):
+    """
+    Build ProjectionExpression / ExpressionAttributeNames for a list of attributes
+
+    Every name is aliased, so reserved words (status, timestamp, ...) are safe.
+    """
+    if not attributes:
+        return {}
+
+    names = {f"#p{i}": attribute for i, attribute in enumerate(attributes)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+
+def summary_key(record_id):
+    """Primary key value of a session's summary item"""
+    return f"{record_id}{SUMMARY_SUFFIX}"
+
+
+def get_session_summary(record_id):
+    """The materialized summary of one session, or None if it was never written"""
+    response = table.get_item(Key={'record_id': summary_key(record_id)})
+    return response.get('Item')
+
+
+def session_version_key(record_id):
+    """Primary key value of a session's version item"""
+    return f"{SESSION_VERSION_PREFIX}{record_id}"
+
+
+def publish_session_version(record_id):
+    """
+    Mark a session as (re)ingested; returns the new session version
+
+    The session's version item is written before the global counter is
+    bumped, so a reader that sees the new counter also sees the new
+    session version.
+    """
+    bump = {
+        'UpdateExpression': 'ADD #version :one',
+        'ExpressionAttributeNames': {'#version': 'version'},
+        'ExpressionAttributeValues': {':one': 1}
+    }
+    response = table.update_item(Key={'record_id': session_version_key(record_id)}, ReturnValues='UPDATED_NEW', **bump)
+    table.update_item(Key={'record_id': VERSION_MARKER_KEY}, **bump)
+    return int(response['Attributes']['version'])
+
+
+def get_global_version():
+    """The global version counter (changes on every ingest)"""
+    item = table.get_item(
+        Key={'record_id': VERSION_MARKER_KEY},
+        **projection_args(['version'])
+    ).get('Item', {})
+    return int(item.get('version', 0))
+
+
+def get_session_versions(record_ids):
+    """
+    {record_id: version} of the given sessions (sessions never ingested are left out)
+
+    BatchGetItem, BATCH_GET_SIZE keys per call; UnprocessedKeys are retried
+    with backoff, and a session still unread after BATCH_GET_MAX_RETRIES
+    raises rather than passing for never ingested.
+    """
+    keys = [{'record_id': session_version_key(record_id)} for record_id in dict.fromkeys(record_ids)]
+    versions = {}
+
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        request = {TABLE_NAME: {'Keys': keys[start:start + BATCH_GET_SIZE], **projection_args(['record_id', 'version'])}}
+
+        for attempt in range(BATCH_GET_MAX_RETRIES + 1):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(TABLE_NAME, []):
+                versions[item['record_id'][len(SESSION_VERSION_PREFIX):]] = int(item['version'])
+
+            request = response.get('UnprocessedKeys')
+            if not request:
+                break
+            time.sleep(random.uniform(0, min(1.0, 0.05 * (2 ** attempt))))
+        else:
+            raise RuntimeError(f"Session versions unread after {BATCH_GET_MAX_RETRIES} retries: "
+                               f"{len(request[TABLE_NAME]['Keys'])} sessions")
+
+    return versions
+
+
+def query_all(limit=None, **query_args):
+    """
+    Run a Query and follow LastEvaluatedKey until done (or `limit` items)
+    """
+    items = []
+
+    while True:
+        if limit:
+            query_args['Limit'] = limit - len(items)
+
+        response = table.query(**query_args)
+        items.extend(response.get('Items', []))
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key or (limit and len(items) >= limit):
+            return items
+
+        query_args['ExclusiveStartKey'] = last_key
+
+
+def _key_query(index, partition_name, partition_value, sort_name=None, sort_value=None, attributes=None):
+    query_args = projection_args(attributes)
+    names = query_args.setdefault('ExpressionAttributeNames', {})
+
+    names['#pk'] = partition_name
+    condition = '#pk = :pk'
+    values = {':pk': partition_value}
+
+    if sort_name is not None and sort_value is not None:
+        names['#sk'] = sort_name
+        condition += ' AND #sk = :sk'
+        values[':sk'] = sort_value
+
+    query_args.update({
+        'IndexName': index,
+        'KeyConditionExpression': condition,
+        'ExpressionAttributeValues': values
+    })
+    return query_args
+
+
+def query_session(record_id, attributes=None, limit=None):
+    """All student records of one session (VIDEO_NAME)"""
+    return query_all(
+        limit=limit,
+        **_key_query(SESSION_INDEX, SESSION_KEY, record_id, attributes=attributes)
+    )
+
+
+def query_student(student_id, record_id=None, attributes=None):
+    """All session records of one student, or just the one for `record_id`"""
+    return query_all(
+        **_key_query(STUDENT_INDEX, 'student_id', student_id, SESSION_KEY, record_id, attributes)
+    )
+
+
+def encode_page_token(last_key):
+    """Opaque string for a LastEvaluatedKey (None when there are no more pages)"""
+    if not last_key:
+        return None
+    plain = {name: int(value) if not isinstance(value, str) else value for name, value in last_key.items()}
+    return base64.urlsafe_b64encode(json.dumps(plain).encode('utf-8')).decode('ascii')
+
+
+def decode_page_token(token):
+    if not token:
+        return None
+    return json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+
+
+def list_sessions(limit=10, page_token=None, attributes=None):
+    """
+    One page of the session catalog, most recently ingested first
+
+    Returns (summary_items, next_page_token).
+    """
+    query_args = _key_query(CATALOG_INDEX, CATALOG_KEY, CATALOG_PARTITION, attributes=attributes or CATALOG_ATTRIBUTES)
+    query_args.update({'ScanIndexForward': False, 'Limit': limit})
+
+    start_key = decode_page_token(page_token)
+    if start_key:
+        query_args['ExclusiveStartKey'] = start_key
+
+    response = table.query(**query_args)
+    return response.get('Items', []), encode_page_token(response.get('LastEvaluatedKey'))
+
+
+def catalog_items(attributes=None):
+    """Every summary item in the catalog (all pages), most recently ingested first"""
+    query_args = _key_query(CATALOG_INDEX, CATALOG_KEY, CATALOG_PARTITION, attributes=attributes or CATALOG_ATTRIBUTES)
+    query_args['ScanIndexForward'] = False
+    return query_all(**query_args)
+
+
+def latest_session_id():
+    """The most recently ingested session (VIDEO_NAME), or None if the catalog is empty"""
+    items, _ = list_sessions(limit=1, attributes=[SESSION_KEY])
+    return items[0][SESSION_KEY] if items else None
+
+
+def count_sessions():
+    """Number of sessions in the catalog (COUNT query, no items returned)"""
+    query_args = _key_query(CATALOG_INDEX, CATALOG_KEY, CATALOG_PARTITION)
+    query_args['Select'] = 'COUNT'
+    count = 0
+
+    while True:
+        response = table.query(**query_args)
+        count += response.get('Count', 0)
+
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return count
+        query_args['ExclusiveStartKey'] = last_key
+
+
+def list_session_ids():
+    """
+    Every distinct session (VIDEO_NAME) in the table
+
+    Full parallel scan of record_id - only for maintenance
+    (backfill_catalog); the chatbot uses the catalog (list_sessions).
+    """
+    return {
+        item['record_id'].split('#')[0]
+        for item in ParallelScan(TABLE_NAME, attributes=['record_id'])
+        if not item['record_id'].startswith(META_PREFIX)
+    }
+
+
+def backfill_session_keys():
+    """
+    Add `session_record_id` to records written before the GSIs existed
+
+    Items without it are invisible to SessionIndex / StudentIndex.
+    Returns the number of items updated.
+    """
+    updated = 0
+    scan = ParallelScan(
+        TABLE_NAME,
+        attributes=['record_id'],
+        filter_expression='attribute_not_exists(#sk) AND attribute_exists(student_id)',
+        expression_names={'#sk': SESSION_KEY}
+    )
+
+    for item in scan:
+        rid = item['record_id']
+        if '#' not in rid:
+            continue
+        table.update_item(
+            Key={'record_id': rid},
+            UpdateExpression='SET #sk = :sk',
+            ExpressionAttributeNames={'#sk': SESSION_KEY},
+            ExpressionAttributeValues={':sk': rid.split('#')[0]}
+        )
+        updated += 1
+
+    return updated
+
+
+def backfill_catalog():
+    """
+    Put every session written before CatalogIndex existed in the catalog
+
+    Summary items without `catalog` are tagged; sessions that have student
+    records but no summary item (ingested before summaries existed) get one
+    built from their records. Run backfill_session_keys first - records
+    without `session_record_id` are not found by query_session.
+    Returns (summary items tagged, summary items created).
+    """
+    tagged = 0
+    summarized = set()
+    scan = ParallelScan(
+        TABLE_NAME,
+        attributes=['record_id', CATALOG_KEY],
+        filter_expression='NOT begins_with(#rid, :meta)',
+        expression_names={'#rid': 'record_id'},
+        expression_values={':meta': META_PREFIX}
+    )
+
+    for item in scan:
+        rid = item['record_id']
+        if not rid.endswith(SUMMARY_SUFFIX):
+            continue
+        summarized.add(rid[:-len(SUMMARY_SUFFIX)])
+        if CATALOG_KEY in item:
+            continue
+        table.update_item(
+            Key={'record_id': rid},
+            UpdateExpression='SET #c = :c, #t = if_not_exists(#t, :t)',
+            ExpressionAttributeNames={'#c': CATALOG_KEY, '#t': CATALOG_SORT_KEY},
+            ExpressionAttributeValues={':c': CATALOG_PARTITION, ':t': int(time.time())}
+        )
+        tagged += 1
+
+    created = sum(
+        1 for record_id in sorted(list_session_ids() - summarized)
+        if create_session_summary(record_id)
+    )
+    return tagged, created
+
+
+def create_session_summary(record_id):
+    """
+    Build and put the summary item of a session that has none
+
+    ingested_at is the session's latest record timestamp, so historical
+    sessions keep their place in the catalog order. scoring_version is
+    the oldest one among the records (dropped if any record predates
+    versioning), so backfill_scores.py still re-scores the summary.
+    Returns False if the session has no records or a summary appeared
+    meanwhile.
+    """
+    # Imported here: session_summary imports this module
+    from session_summary import build_session_summary
+
+    records = query_session(record_id)
+    if not records:
+        return False
+
+    summary = build_session_summary(record_id, records)
+    timestamps = [int(record['timestamp']) for record in records if 'timestamp' in record]
+    if timestamps:
+        summary[CATALOG_SORT_KEY] = max(timestamps)
+    versions = [record.get('scoring_version') for record in records]
+    if None in versions:
+        del summary['scoring_version']
+    else:
+        summary['scoring_version'] = min(versions)
+
+    try:
+        table.put_item(Item=summary, ConditionExpression='attribute_not_exists(record_id)')
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+    # The catalog changed: drop cached session lists
+    publish_session_version(record_id)
+    return True
+
+
+if __name__ == '__main__':
+    print(f"Backfilling {SESSION_KEY} on existing records...")
+    print(f"Updated {backfill_session_keys()} records")
+    print(f"Backfilling {CATALOG_KEY} on existing sessions...")
+    tagged, created = backfill_catalog()
+    print(f"Tagged {tagged} summaries, created {created} summaries")
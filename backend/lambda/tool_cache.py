@@ -0,0 +1,194 @@
+"""
+In-container cache for chatbot tool results
+
+Lives at module level, so warm invocations of the chatbot Lambda answer
+repeated questions ("latest session summary") without touching DynamoDB.
+
+  - Bounded LRU (max_entries) with a per-entry TTL
+  - Keyed by tool name + normalized arguments
+  - Invalidated by ingest: Lambda 3 bumps the session's version and then a
+    global version counter. The counter is read at most once per
+    `version_check_sec`; when it changed, the versions of the sessions the
+    entries depend on are re-read and entries whose session version
+    changed are dropped. Entries that resolved "latest" (no record_id)
+    depend on the global version and are dropped on any new ingest.
+  - A session's version is first read on a miss, before its result is
+    computed, so a result is never tagged with a newer version than the
+    data it was computed from.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Dependency name for results that change whenever any session is ingested
+ANY_SESSION = '*'
+
+
+def normalize_tool_input(tool_input):
+    """
+    Canonical form of tool arguments, so equivalent calls share one entry
+
+    Drops empty values, strips strings and turns numeric strings into ints.
+    """
+    normalized = {}
+    for name, value in sorted((tool_input or {}).items()):
+        if isinstance(value, str):
+            value = value.strip()
+            if value.isdigit() and name != 'record_id' and not name.startswith('record_id_'):
+                value = int(value)
+        if value in (None, ''):
+            continue
+        normalized[name] = value
+    return normalized
+
+
+def cache_key(tool_name, tool_input):
+    return f"{tool_name}:{json.dumps(normalize_tool_input(tool_input), sort_keys=True, default=str)}"
+
+
+def session_dependencies(tool_input):
+    """Sessions a tool result depends on (ANY_SESSION when it resolved "latest" or spans sessions)"""
+    tool_input = normalize_tool_input(tool_input)
+    sessions = [value for name, value in tool_input.items() if name.startswith('record_id')]
+    return sessions or [ANY_SESSION]
+
+
+class ToolResultCache:
+    """Bounded LRU + TTL cache with version-marker invalidation"""
+
+    def __init__(self, load_version, load_session_versions, max_entries=256, ttl_sec=300, version_check_sec=30):
+        """
+        Args:
+            load_version: callable returning the global version (changes on every ingest)
+            load_session_versions: callable taking record_ids, returning {record_id: version}
+            max_entries: LRU bound
+            ttl_sec: max age of an entry
+            version_check_sec: how often the global version is re-read
+        """
+        self.load_version = load_version
+        self.load_session_versions = load_session_versions
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.version_check_sec = version_check_sec
+
+        self.entries = OrderedDict()
+        self.version = None
+        self.session_versions = {}
+        self.versions_checked_at = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _version_of(self, session):
+        if self.version is None:
+            return None
+        if session == ANY_SESSION:
+            return self.version
+        return self.session_versions.get(session)
+
+    def track_sessions(self, sessions):
+        """Read the versions of sessions not tracked yet (sessions never ingested are version 0)"""
+        untracked = [session for session in sessions if session != ANY_SESSION and session not in self.session_versions]
+        if not untracked:
+            return
+
+        versions = self.load_session_versions(untracked)
+
+        with self.lock:
+            for session in untracked:
+                self.session_versions.setdefault(session, versions.get(session, 0))
+
+    def dependency_versions(self, tool_input):
+        """{session: version} a result for tool_input is computed at"""
+        return {session: self._version_of(session) for session in session_dependencies(tool_input)}
+
+    def _is_current(self, depends_on):
+        return all(self._version_of(session) == version for session, version in depends_on.items())
+
+    def is_current(self, depends_on):
+        """True if none of the sessions a stored result depends on changed since"""
+        self.track_sessions(depends_on)
+        return self._is_current(depends_on)
+
+    def refresh_versions(self, force=False):
+        """Re-read the global version if it is due; when it changed, drop the entries it made stale"""
+        now = time.monotonic()
+        if not force and self.version is not None and now - self.versions_checked_at < self.version_check_sec:
+            return
+
+        version = self.load_version()
+        if not force and version == self.version:
+            self.versions_checked_at = now
+            return
+
+        # Only the sessions cached entries depend on stay tracked
+        with self.lock:
+            sessions = sorted({
+                session for entry in self.entries.values()
+                for session in entry['depends_on'] if session != ANY_SESSION
+            })
+        versions = self.load_session_versions(sessions) if sessions else {}
+
+        with self.lock:
+            self.version = version
+            self.session_versions = {session: versions.get(session, 0) for session in sessions}
+            self.versions_checked_at = now
+
+            stale = [key for key, entry in self.entries.items() if not self._is_current(entry['depends_on'])]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+
+    def get(self, tool_name, tool_input):
+        """Cached result, or None on a miss"""
+        key = cache_key(tool_name, tool_input)
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and now - entry['stored_at'] > self.ttl_sec:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry['result']
+
+            self.misses += 1
+
+        # The result is computed next: read its session versions before its data
+        self.track_sessions(session_dependencies(tool_input))
+        return None
+
+    def put(self, tool_name, tool_input, result):
+        key = cache_key(tool_name, tool_input)
+
+        with self.lock:
+            self.entries[key] = {
+                'result': result,
+                'stored_at': time.monotonic(),
+                'depends_on': self.dependency_versions(tool_input)
+            }
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
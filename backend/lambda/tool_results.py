@@ -0,0 +1,109 @@
+"""
+Token-budgeted shaping of chatbot tool results
+
+Every tool result is JSON-serialized into the Bedrock prompt, so its size
+is paid for in input tokens on every later iteration of the tool loop.
+The tools themselves already project and aggregate in the query; this
+module enforces a per-result token budget on top of that:
+
+  1. Compact JSON (no indentation / spaces)
+  2. Over budget: drop the tool's optional fields (e.g. histograms)
+  3. Still over: keep the longest prefix of the tool's list field that
+     fits, plus a `_truncated` note with the total
+  4. Still over: keep only the scalar fields
+
+Tokens are estimated at ~4 characters per token (no tokenizer in the
+Lambda runtime); the estimate is only used for budgeting and reporting.
+"""
+import json
+import os
+
+TOKEN_BUDGET = int(os.environ.get('TOOL_RESULT_TOKEN_BUDGET', '1500'))
+CHARS_PER_TOKEN = 4
+
+# Result schema per tool:
+#   list     - the (sorted) list field truncated to fit the budget
+#   optional - fields dropped first when over budget
+RESULT_SCHEMAS = {
+    'get_student_data': {'list': 'records'},
+    'get_class_summary': {'optional': ['attendance_histogram', 'engagement_histogram']},
+    'get_engagement_rankings': {'list': 'top_students'},
+    'get_absent_students': {'list': 'absent_students'},
+    'list_all_sessions': {'list': 'recent_sessions'},
+    'compare_sessions': {},
+}
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def to_prompt(result):
+    """Compact JSON, as sent to the model"""
+    return json.dumps(result, separators=(',', ':'), default=str)
+
+
+def truncate_list(result, field, keep):
+    total = len(result[field])
+    shaped = dict(result)
+    shaped[field] = result[field][:keep]
+    shaped['_truncated'] = {
+        'field': field,
+        'shown': keep,
+        'total': total,
+        'note': 'Result cut to fit the token budget; ask a narrower question for the rest'
+    }
+    return shaped
+
+
+def shape_result(tool_name, result, budget=None):
+    """
+    Fit a tool result into the token budget
+
+    Returns (prompt_text, stats), stats being
+    {'tool', 'raw_tokens', 'sent_tokens', 'saved_tokens', 'truncated'} where
+    raw_tokens is the size of the result as plain json.dumps would send it.
+    """
+    budget = budget or TOKEN_BUDGET
+    schema = RESULT_SCHEMAS.get(tool_name, {})
+
+    raw_tokens = estimate_tokens(json.dumps(result, default=str))
+    shaped = result
+    text = to_prompt(shaped)
+    truncated = False
+
+    if estimate_tokens(text) > budget and isinstance(shaped, dict):
+        optional = schema.get('optional', [])
+        if any(field in shaped for field in optional):
+            shaped = {name: value for name, value in shaped.items() if name not in optional}
+            text = to_prompt(shaped)
+            truncated = True
+
+        field = schema.get('list')
+        if estimate_tokens(text) > budget and isinstance(shaped.get(field), list):
+            # Longest prefix of the list that still fits
+            low, high = 0, len(shaped[field])
+            while low < high:
+                middle = (low + high + 1) // 2
+                if estimate_tokens(to_prompt(truncate_list(shaped, field, middle))) <= budget:
+                    low = middle
+                else:
+                    high = middle - 1
+            shaped = truncate_list(shaped, field, low)
+            text = to_prompt(shaped)
+            truncated = True
+
+        if estimate_tokens(text) > budget:
+            shaped = {name: value for name, value in shaped.items() if not isinstance(value, (list, dict))}
+            shaped['_truncated'] = {'note': 'Only scalar fields kept to fit the token budget'}
+            text = to_prompt(shaped)
+            truncated = True
+
+    sent_tokens = estimate_tokens(text)
+    return text, {
+        'tool': tool_name,
+        'raw_tokens': raw_tokens,
+        'sent_tokens': sent_tokens,
+        'saved_tokens': max(0, raw_tokens - sent_tokens),
+        'truncated': truncated
+    }
@@ -0,0 +1,376 @@
+"""
+In-process stand-ins for S3, Rekognition and Step Functions
+
+Only the calls the Lambda handlers make are implemented, with the error
+codes the handlers react to (NoSuchKey / 404, PreconditionFailed,
+LimitExceededException, TaskDoesNotExist). Every call is counted per
+service.operation, so a run can report API calls per pipeline stage.
+
+    aws = FakeAWS(detections)
+    aws.install()          # aws_clients hands these out from now on
+"""
+import hashlib
+import itertools
+import json
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+import aws_clients
+from fake_dynamodb import FakeDynamoDB, client_error
+
+
+class ApiCalls:
+    """Thread-safe 'service.operation' -> count"""
+
+    def __init__(self):
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+class Counted:
+    """Proxy counting every method call made on a stand-in"""
+
+    def __init__(self, service, target, calls):
+        self._service = service
+        self._target = target
+        self._calls = calls
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if not callable(value) or name.startswith('_'):
+            return value
+
+        def counted(*args, **kwargs):
+            self._calls.count(f"{self._service}.{name}")
+            return value(*args, **kwargs)
+        return counted
+
+
+# --- S3 -----------------------------------------------------------------------
+
+class Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, amount=None):
+        data, self.data = (self.data, b'') if amount is None else (self.data[:amount], self.data[amount:])
+        return data
+
+    def close(self):
+        pass
+
+
+class FakeS3:
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _objects(self, bucket):
+        return self.buckets.setdefault(bucket, {})
+
+    def _object(self, bucket, key, operation):
+        obj = self._objects(bucket).get(key)
+        if obj is None:
+            # HeadObject has no body to carry an error code, so it is a bare 404
+            raise client_error('404' if operation == 'HeadObject' else 'NoSuchKey', operation, 'Not Found')
+        return obj
+
+    def put_object(self, Bucket, Key, Body=b'', ContentType=None, ContentEncoding=None, Metadata=None,
+                   IfMatch=None, IfNoneMatch=None, **kwargs):
+        data = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        with self.lock:
+            current = self._objects(Bucket).get(Key)
+            if IfNoneMatch == '*' and current is not None:
+                raise client_error('PreconditionFailed', 'PutObject', 'At least one of the pre-conditions you specified did not hold')
+            if IfMatch is not None and (current is None or current['ETag'] != IfMatch):
+                raise client_error('PreconditionFailed', 'PutObject', 'At least one of the pre-conditions you specified did not hold')
+            obj = {
+                'Body': data,
+                'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+                'ContentType': ContentType or 'binary/octet-stream',
+                'ContentEncoding': ContentEncoding,
+                'Metadata': dict(Metadata or {}),
+                'LastModified': datetime.now(timezone.utc)
+            }
+            self._objects(Bucket)[Key] = obj
+        return {'ETag': obj['ETag']}
+
+    def _description(self, obj):
+        response = {
+            'ContentLength': len(obj['Body']),
+            'ContentType': obj['ContentType'],
+            'ETag': obj['ETag'],
+            'LastModified': obj['LastModified'],
+            'Metadata': dict(obj['Metadata'])
+        }
+        if obj['ContentEncoding']:
+            response['ContentEncoding'] = obj['ContentEncoding']
+        return response
+
+    def head_object(self, Bucket, Key, **kwargs):
+        return self._description(self._object(Bucket, Key, 'HeadObject'))
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        obj = self._object(Bucket, Key, 'GetObject')
+        response = self._description(obj)
+        data = obj['Body']
+        if Range:
+            start, end = Range.replace('bytes=', '').split('-')
+            data = data[int(start):int(end) + 1]
+            response['ContentRange'] = f"bytes {start}-{int(start) + len(data) - 1}/{len(obj['Body'])}"
+            response['ContentLength'] = len(data)
+        response['Body'] = Body(data)
+        return response
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self._objects(Bucket).pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        with self.lock:
+            for obj in Delete['Objects']:
+                self._objects(Bucket).pop(obj['Key'], None)
+        return {'Deleted': [{'Key': obj['Key']} for obj in Delete['Objects']]}
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, **kwargs):
+        with open(Filename, 'rb') as source:
+            self.put_object(Bucket=Bucket, Key=Key, Body=source.read(), **(ExtraArgs or {}))
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?expires={ExpiresIn}"
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        with self.lock:
+            keys = sorted(key for key in self._objects(Bucket) if key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {
+            'KeyCount': len(page),
+            'Contents': [
+                {'Key': key, 'Size': len(self.buckets[Bucket][key]['Body']), 'ETag': self.buckets[Bucket][key]['ETag']}
+                for key in page
+            ],
+            'IsTruncated': start + MaxKeys < len(keys)
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation):
+        if operation != 'list_objects_v2':
+            raise NotImplementedError(operation)
+        return ListObjectsPaginator(self)
+
+    def object_count(self):
+        return sum(len(objects) for objects in self.buckets.values())
+
+
+class ListObjectsPaginator:
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            page = self.s3.list_objects_v2(**kwargs, **({'ContinuationToken': token} if token else {}))
+            yield page
+            token = page.get('NextContinuationToken')
+            if not token:
+                return
+
+
+# --- Rekognition ----------------------------------------------------------------
+
+class FakeRekognition:
+    """
+    Stored-video face search: start_face_search / get_face_search
+
+    detections(bucket, video_key) returns the Persons list of a video (the
+    detections a real job would produce). Jobs do not finish by
+    themselves: complete_next() finishes the oldest running job and
+    returns the SNS event Rekognition would publish for it. Detections are
+    generated there, so generating them is not timed as part of any
+    handler, and dropped once the last page has been read. At most
+    max_concurrent jobs run at once; more starts get LimitExceededException.
+    A repeated ClientRequestToken returns the job it started.
+    """
+
+    def __init__(self, detections, s3=None, max_concurrent=20):
+        self.detections = detections
+        self.s3 = s3
+        self.max_concurrent = max_concurrent
+        self.jobs = {}
+        self.running = deque()
+        self.ids = itertools.count(1)
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.peak_running = 0
+
+    def start_face_search(self, Video, CollectionId, FaceMatchThreshold=80.0, NotificationChannel=None,
+                          JobTag=None, ClientRequestToken=None, **kwargs):
+        with self.lock:
+            if ClientRequestToken in self.tokens:
+                return {'JobId': self.tokens[ClientRequestToken]}
+            if len(self.running) >= self.max_concurrent:
+                raise client_error('LimitExceededException', 'StartFaceSearch', 'Too many concurrent jobs')
+
+            job_id = f"rk-{next(self.ids):08d}"
+            self.jobs[job_id] = {
+                'status': 'IN_PROGRESS',
+                'bucket': Video['S3Object']['Bucket'],
+                'video_key': Video['S3Object']['Name'],
+                'job_tag': JobTag,
+                'notification': NotificationChannel,
+                'persons': None
+            }
+            self.running.append(job_id)
+            if ClientRequestToken:
+                self.tokens[ClientRequestToken] = job_id
+            self.peak_running = max(self.peak_running, len(self.running))
+        return {'JobId': job_id}
+
+    def complete_next(self):
+        """Finish the oldest running job; returns its SNS event, or None if none is running"""
+        with self.lock:
+            if not self.running:
+                return None
+            job_id = self.running.popleft()
+            job = self.jobs[job_id]
+
+        video_exists = True
+        if self.s3 is not None:
+            try:
+                self.s3.head_object(Bucket=job['bucket'], Key=job['video_key'])
+            except Exception:
+                video_exists = False
+
+        if video_exists:
+            job['status'] = 'SUCCEEDED'
+            job['persons'] = self.detections(job['bucket'], job['video_key'])
+        else:
+            job['status'] = 'FAILED'
+            job['status_message'] = 'Unable to get object metadata from S3. Check object key, region and/or access permissions.'
+
+        message = {
+            'JobId': job_id,
+            'Status': job['status'],
+            'API': 'StartFaceSearch',
+            'JobTag': job['job_tag'],
+            'Timestamp': int(datetime.now().timestamp() * 1000),
+            'Video': {'S3ObjectName': job['video_key'], 'S3Bucket': job['bucket']}
+        }
+        return {
+            'Records': [{
+                'EventSource': 'aws:sns',
+                'Sns': {'Type': 'Notification', 'Message': json.dumps(message)}
+            }]
+        }
+
+    def get_face_search(self, JobId, MaxResults=1000, NextToken=None, SortBy='TIMESTAMP'):
+        job = self.jobs.get(JobId)
+        if job is None:
+            raise client_error('ResourceNotFoundException', 'GetFaceSearch', f"Job {JobId} not found")
+        if job['status'] != 'SUCCEEDED':
+            return {'JobStatus': job['status'], 'StatusMessage': job.get('status_message'), 'Persons': []}
+
+        if job['persons'] is None:
+            raise client_error('InvalidPaginationTokenException', 'GetFaceSearch', 'Results of this job were already read')
+
+        start = int(NextToken or 0)
+        response = {
+            'JobStatus': 'SUCCEEDED',
+            'Persons': job['persons'][start:start + MaxResults],
+            'VideoMetadata': {'Codec': 'h264', 'Format': 'QuickTime / MOV', 'FrameRate': 30.0}
+        }
+        if start + MaxResults < len(job['persons']):
+            response['NextToken'] = str(start + MaxResults)
+        else:
+            job['persons'] = None
+        return response
+
+    def running_jobs(self):
+        return len(self.running)
+
+
+# --- Step Functions -------------------------------------------------------------
+
+class FakeStepFunctions:
+    """
+    Task token callbacks
+
+    Tokens are issued by the local state machine; send_task_success /
+    send_task_failure record the result for it to pick up. Unknown or
+    already answered tokens fail like the real service.
+    """
+
+    def __init__(self):
+        self.issued = set()
+        self.results = {}
+        self.lock = threading.Lock()
+        self.tokens = itertools.count(1)
+
+    def issue_token(self):
+        with self.lock:
+            token = f"token-{next(self.tokens):08d}"
+            self.issued.add(token)
+        return token
+
+    def _answer(self, token, result, operation):
+        with self.lock:
+            if token not in self.issued:
+                raise client_error('TaskDoesNotExist', operation, 'Task Token does not exist')
+            self.issued.discard(token)
+            self.results[token] = result
+        return {}
+
+    def send_task_success(self, taskToken, output):
+        return self._answer(taskToken, ('success', json.loads(output)), 'SendTaskSuccess')
+
+    def send_task_failure(self, taskToken, error=None, cause=None):
+        return self._answer(taskToken, ('failure', error or 'TaskFailed', cause or ''), 'SendTaskFailure')
+
+    def answered(self):
+        with self.lock:
+            return list(self.results)
+
+    def take_result(self, token):
+        with self.lock:
+            return self.results.pop(token, None)
+
+    def cancel_tokens(self, tokens):
+        """Invalidate tokens of tasks that stopped (a failed Map's other iterations)"""
+        with self.lock:
+            for token in tokens:
+                self.issued.discard(token)
+                self.results.pop(token, None)
+
+
+class FakeAWS:
+    """All stand-ins of one run, sharing an API call counter"""
+
+    def __init__(self, detections, max_concurrent_jobs=20):
+        self.calls = ApiCalls()
+        self.s3 = FakeS3()
+        self.rekognition = FakeRekognition(detections, s3=self.s3, max_concurrent=max_concurrent_jobs)
+        self.stepfunctions = FakeStepFunctions()
+        self.dynamodb = FakeDynamoDB(count=self.calls.count)
+
+    def install(self):
+        """Make aws_clients hand out the stand-ins"""
+        aws_clients.override('s3', client=Counted('s3', self.s3, self.calls))
+        aws_clients.override('rekognition', client=Counted('rekognition', self.rekognition, self.calls))
+        aws_clients.override('stepfunctions', client=Counted('stepfunctions', self.stepfunctions, self.calls))
+        aws_clients.override('dynamodb', client=self.dynamodb.client(), resource=self.dynamodb.resource())
+
+    def uninstall(self):
+        aws_clients.clear_overrides()
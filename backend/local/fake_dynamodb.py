@@ -0,0 +1,824 @@
+"""
+In-process stand-in for DynamoDB
+
+Enough of the service for the pipeline and chatbot code paths, with the
+behaviour that matters to them kept faithful:
+
+  - items round-trip through boto3's TypeSerializer, so numbers come back
+    as Decimal and floats are rejected, exactly like the real Table API
+  - condition / filter / key-condition / update expressions are parsed and
+    evaluated (comparisons, AND / OR / NOT, BETWEEN, IN, attribute_exists,
+    attribute_not_exists, begins_with, contains, size; SET with + / -,
+    if_not_exists and list_append, REMOVE, ADD, DELETE)
+  - query / scan page at 1 MB or Limit with LastEvaluatedKey, support
+    sparse GSIs, Select='COUNT', ProjectionExpression, parallel scan
+    (Segment / TotalSegments) and ReturnConsumedCapacity (read units of
+    the data evaluated)
+  - the low-level client does Scan, UpdateItem, BatchGetItem,
+    BatchWriteItem and TransactWriteItems (all-or-nothing,
+    CancellationReasons); the resource does BatchGetItem
+
+Tables are declared up front (TABLES mirrors backend/README.md).
+"""
+import copy
+import json
+import math
+import re
+import threading
+import zlib
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+# name -> {'key': [partition, sort?], 'indexes': {index: [partition, sort?]}}
+TABLES = {
+    'StudentlyticsData': {
+        'key': ['record_id'],
+        'indexes': {
+            'SessionIndex': ['session_record_id', 'student_id'],
+            'StudentIndex': ['student_id', 'session_record_id'],
+            'CatalogIndex': ['catalog', 'ingested_at'],
+        },
+    },
+    'StudentlyticsConversations': {'key': ['conversation_id'], 'indexes': {}},
+    'RekognitionJobQueue': {'key': ['pk', 'sk'], 'indexes': {}},
+}
+
+PAGE_BYTES = 1024 * 1024
+READ_UNIT_BYTES = 4096
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def client_error(code, operation, message=None, **extra):
+    response = {'Error': {'Code': code, 'Message': message or code}}
+    response.update(extra)
+    return ClientError(response, operation)
+
+
+def to_typed(value):
+    return _serializer.serialize(value)
+
+
+def from_typed(value):
+    return _deserializer.deserialize(value)
+
+
+def normalize(value):
+    """Python value as DynamoDB would store and return it (ints -> Decimal, ...)"""
+    return from_typed(to_typed(value))
+
+
+def item_size(item):
+    return len(json.dumps(item, default=str))
+
+
+# --- expressions --------------------------------------------------------------
+
+_TOKEN = re.compile(r'\s*(?:(<>|<=|>=|[=<>()+\-,.\[\]])|(#[A-Za-z0-9_]+)|(:[A-Za-z0-9_]+)|([A-Za-z_][A-Za-z0-9_]*)|(\d+))')
+
+_KEYWORDS = {'AND', 'OR', 'NOT', 'BETWEEN', 'IN', 'SET', 'REMOVE', 'ADD', 'DELETE'}
+
+
+def tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match or match.end() == position:
+            raise client_error('ValidationException', 'Expression', f"Invalid expression near: {expression[position:]}")
+        symbol, name, value, word, number = match.groups()
+        if symbol:
+            tokens.append(('op', symbol))
+        elif name:
+            tokens.append(('name', name))
+        elif value:
+            tokens.append(('value', value))
+        elif word:
+            tokens.append(('keyword', word.upper()) if word.upper() in _KEYWORDS else ('word', word))
+        else:
+            tokens.append(('number', int(number)))
+        position = match.end()
+    return tokens
+
+
+class _Missing:
+    pass
+
+
+MISSING = _Missing()
+
+
+class Expression:
+    """Parser + evaluator for one expression against names / values"""
+
+    def __init__(self, expression, names=None, values=None):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = {key: normalize(value) for key, value in (values or {}).items()}
+
+    # token helpers
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, text=None):
+        token = self.peek()
+        if (kind and token[0] != kind) or (text is not None and token[1] != text):
+            raise client_error('ValidationException', 'Expression', f"Unexpected token {token[1]!r}")
+        self.position += 1
+        return token
+
+    def at(self, kind, text=None):
+        token = self.peek()
+        return token[0] == kind and (text is None or token[1] == text)
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # paths and operands
+    def parse_path(self):
+        parts = []
+        while True:
+            kind, text = self.take()
+            if kind == 'name':
+                if text not in self.names:
+                    raise client_error('ValidationException', 'Expression', f"Missing attribute name {text}")
+                parts.append(self.names[text])
+            elif kind in ('word', 'keyword'):
+                parts.append(text)
+            else:
+                raise client_error('ValidationException', 'Expression', f"Expected attribute path, got {text!r}")
+            while self.at('op', '['):
+                self.take()
+                parts.append(self.take('number')[1])
+                self.take('op', ']')
+            if not self.at('op', '.'):
+                return tuple(parts)
+            self.take()
+
+    def parse_operand(self):
+        """Returns a function item -> value"""
+        if self.at('value'):
+            key = self.take()[1]
+            if key not in self.values:
+                raise client_error('ValidationException', 'Expression', f"Missing attribute value {key}")
+            value = self.values[key]
+            return lambda item: value
+        if self.at('word', 'size') and self.peek(1) == ('op', '('):
+            self.take()
+            self.take('op', '(')
+            path = self.parse_path()
+            self.take('op', ')')
+            return lambda item: _size(get_path(item, path))
+        path = self.parse_path()
+        return lambda item: get_path(item, path)
+
+    # conditions
+    def parse_condition(self):
+        left = self.parse_and()
+        while self.at('keyword', 'OR'):
+            self.take()
+            right = self.parse_and()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while self.at('keyword', 'AND'):
+            self.take()
+            right = self.parse_not()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def parse_not(self):
+        if self.at('keyword', 'NOT'):
+            self.take()
+            inner = self.parse_not()
+            return lambda item: not inner(item)
+        return self.parse_primary()
+
+    def parse_primary(self):
+        if self.at('op', '('):
+            self.take()
+            inner = self.parse_condition()
+            self.take('op', ')')
+            return inner
+
+        kind, text = self.peek()
+        if kind == 'word' and self.peek(1) == ('op', '(') and text != 'size':
+            return self.parse_function()
+
+        left = self.parse_operand()
+
+        if self.at('keyword', 'BETWEEN'):
+            self.take()
+            low = self.parse_operand()
+            self.take('keyword', 'AND')
+            high = self.parse_operand()
+            return lambda item: _compare(low(item), '<=', left(item)) and _compare(left(item), '<=', high(item))
+
+        if self.at('keyword', 'IN'):
+            self.take()
+            self.take('op', '(')
+            options = [self.parse_operand()]
+            while self.at('op', ','):
+                self.take()
+                options.append(self.parse_operand())
+            self.take('op', ')')
+            return lambda item: any(_compare(left(item), '=', option(item)) for option in options)
+
+        operator = self.take('op')[1]
+        if operator not in ('=', '<>', '<', '<=', '>', '>='):
+            raise client_error('ValidationException', 'Expression', f"Unknown comparator {operator}")
+        right = self.parse_operand()
+        return lambda item: _compare(left(item), operator, right(item))
+
+    def parse_function(self):
+        name = self.take('word')[1]
+        self.take('op', '(')
+        path = self.parse_path()
+        argument = None
+        if self.at('op', ','):
+            self.take()
+            argument = self.parse_operand()
+        self.take('op', ')')
+
+        if name == 'attribute_exists':
+            return lambda item: get_path(item, path) is not MISSING
+        if name == 'attribute_not_exists':
+            return lambda item: get_path(item, path) is MISSING
+        if name == 'begins_with':
+            return lambda item: isinstance(get_path(item, path), str) and get_path(item, path).startswith(argument(item))
+        if name == 'contains':
+            return lambda item: _contains(get_path(item, path), argument(item))
+        raise client_error('ValidationException', 'Expression', f"Unknown function {name}")
+
+    def condition(self):
+        predicate = self.parse_condition()
+        if not self.done():
+            raise client_error('ValidationException', 'Expression', f"Unexpected token {self.peek()[1]!r}")
+        return predicate
+
+    # updates
+    def parse_set_value(self):
+        if self.at('word', 'if_not_exists'):
+            self.take()
+            self.take('op', '(')
+            path = self.parse_path()
+            self.take('op', ',')
+            default = self.parse_set_value()
+            self.take('op', ')')
+            value = lambda item: get_path(item, path) if get_path(item, path) is not MISSING else default(item)
+        elif self.at('word', 'list_append'):
+            self.take()
+            self.take('op', '(')
+            first = self.parse_set_value()
+            self.take('op', ',')
+            second = self.parse_set_value()
+            self.take('op', ')')
+            value = lambda item: list(first(item)) + list(second(item))
+        else:
+            value = self.parse_operand()
+
+        if self.at('op', '+') or self.at('op', '-'):
+            operator = self.take()[1]
+            other = self.parse_set_value()
+            return (lambda a, b: (lambda item: a(item) + b(item)) if operator == '+' else (lambda item: a(item) - b(item)))(value, other)
+        return value
+
+    def update_actions(self):
+        """[(action, path, value function or None)]"""
+        actions = []
+        while not self.done():
+            clause = self.take('keyword')[1]
+            while True:
+                path = self.parse_path()
+                if clause == 'SET':
+                    self.take('op', '=')
+                    actions.append(('SET', path, self.parse_set_value()))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                elif clause in ('ADD', 'DELETE'):
+                    actions.append((clause, path, self.parse_operand()))
+                else:
+                    raise client_error('ValidationException', 'UpdateItem', f"Unknown clause {clause}")
+                if not self.at('op', ','):
+                    break
+                self.take()
+        return actions
+
+    def projection(self):
+        paths = [self.parse_path()]
+        while self.at('op', ','):
+            self.take()
+            paths.append(self.parse_path())
+        return paths
+
+
+def get_path(item, path):
+    value = item
+    for part in path:
+        if isinstance(part, int):
+            if not isinstance(value, list) or part >= len(value):
+                return MISSING
+            value = value[part]
+        else:
+            if not isinstance(value, dict) or part not in value:
+                return MISSING
+            value = value[part]
+    return value
+
+
+def set_path(item, path, value):
+    target = item
+    for part in path[:-1]:
+        target = target[part]
+    target[path[-1]] = value
+
+
+def remove_path(item, path):
+    target = get_path(item, path[:-1]) if len(path) > 1 else item
+    if isinstance(target, dict):
+        target.pop(path[-1], None)
+    elif isinstance(target, list) and path[-1] < len(target):
+        del target[path[-1]]
+
+
+def _size(value):
+    if value is MISSING:
+        return MISSING
+    return len(value) if not isinstance(value, Decimal) else MISSING
+
+
+def _contains(value, argument):
+    if isinstance(value, (str, list, set)):
+        return argument in value
+    return False
+
+
+def _compare(left, operator, right):
+    if left is MISSING or right is MISSING:
+        return operator == '<>' and (left is MISSING) != (right is MISSING)
+    if operator == '=':
+        return left == right
+    if operator == '<>':
+        return left != right
+    if type(left) is not type(right):
+        return False
+    return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[operator]
+
+
+def apply_update(item, actions):
+    """Apply parsed update actions in place; returns the set of changed top-level attributes"""
+    # Values are computed against the item as it was, like DynamoDB does
+    original = copy.deepcopy(item)
+    changed = set()
+    for action, path, value in actions:
+        changed.add(path[0])
+        if action == 'SET':
+            set_path(item, path, normalize(value(original)))
+        elif action == 'REMOVE':
+            remove_path(item, path)
+        elif action == 'ADD':
+            amount = value(original)
+            current = get_path(item, path)
+            if current is MISSING:
+                set_path(item, path, amount)
+            elif isinstance(current, set):
+                set_path(item, path, current | amount)
+            else:
+                set_path(item, path, current + amount)
+        elif action == 'DELETE':
+            current = get_path(item, path)
+            if isinstance(current, set):
+                remaining = current - value(original)
+                if remaining:
+                    set_path(item, path, remaining)
+                else:
+                    remove_path(item, path)
+    return changed
+
+
+# --- tables -------------------------------------------------------------------
+
+class FakeDynamoDB:
+    """Shared state behind the resource and the client stand-ins"""
+
+    def __init__(self, tables=None, count=None):
+        self.schemas = tables or TABLES
+        self.items = {name: {} for name in self.schemas}
+        # Base-table items by partition key value, so a query reads one partition
+        self.partitions = {name: {} for name in self.schemas}
+        # count('dynamodb.<operation>') is called once per API call
+        self.counter = count
+        self.lock = threading.RLock()
+
+    def count(self, operation):
+        if self.counter is not None:
+            self.counter(f"dynamodb.{operation}")
+
+    def schema(self, table_name, operation):
+        if table_name not in self.schemas:
+            raise client_error('ResourceNotFoundException', operation, f"Requested resource not found: {table_name}")
+        return self.schemas[table_name]
+
+    def key_of(self, table_name, item):
+        return tuple(item[name] for name in self.schemas[table_name]['key'])
+
+    def store(self, table_name, key, item):
+        self.items[table_name][key] = item
+        self.partitions[table_name].setdefault(key[0], {})[key] = item
+
+    def remove(self, table_name, key):
+        self.items[table_name].pop(key, None)
+        partition = self.partitions[table_name].get(key[0])
+        if partition is not None:
+            partition.pop(key, None)
+            if not partition:
+                del self.partitions[table_name][key[0]]
+
+    def resource(self):
+        return FakeDynamoDBResource(self)
+
+    def client(self):
+        return FakeDynamoDBClient(self)
+
+
+class FakeDynamoDBResource:
+    def __init__(self, db, unprocessed_every=0):
+        self.db = db
+        # Return every n-th requested key as unprocessed (exercises retries)
+        self.unprocessed_every = unprocessed_every
+        self._batch_keys = 0
+
+    def Table(self, name):
+        return FakeTable(self.db, name)
+
+    def batch_get_item(self, RequestItems):
+        self.db.count('batch_get_item')
+        return batch_get(self.db, RequestItems, self._unprocessed)
+
+    def _unprocessed(self):
+        self._batch_keys += 1
+        return bool(self.unprocessed_every) and self._batch_keys % self.unprocessed_every == 0
+
+
+def batch_get(db, request_items, unprocessed):
+    """BatchGetItem over plain Python keys: (at most 100) keys in, Responses / UnprocessedKeys out"""
+    if sum(len(request['Keys']) for request in request_items.values()) > 100:
+        raise client_error('ValidationException', 'BatchGetItem', 'Too many items requested for the BatchGetItem call')
+
+    responses = {}
+    unprocessed_keys = {}
+    for table_name, request in request_items.items():
+        table = FakeTable(db, table_name, counted=False)
+        keys = [table._key(key, 'BatchGetItem') for key in request['Keys']]
+        if len(set(keys)) != len(keys):
+            raise client_error('ValidationException', 'BatchGetItem', 'Provided list of item keys contains duplicates')
+
+        items = responses.setdefault(table_name, [])
+        for key in request['Keys']:
+            if unprocessed():
+                unprocessed_keys.setdefault(table_name, dict(request, Keys=[]))['Keys'].append(key)
+                continue
+            item = table.get_item(
+                Key=key,
+                ProjectionExpression=request.get('ProjectionExpression'),
+                ExpressionAttributeNames=request.get('ExpressionAttributeNames')
+            ).get('Item')
+            if item is not None:
+                items.append(item)
+
+    return {'Responses': responses, 'UnprocessedKeys': unprocessed_keys}
+
+
+def _check(condition, item, operation):
+    if condition is not None and not condition(item if item is not None else {}):
+        raise client_error('ConditionalCheckFailedException', operation, 'The conditional request failed')
+
+
+def _returned(old, new, changed, return_values):
+    if return_values == 'ALL_OLD':
+        return old
+    if return_values == 'ALL_NEW':
+        return new
+    if return_values == 'UPDATED_OLD':
+        return {name: value for name, value in (old or {}).items() if name in changed}
+    if return_values == 'UPDATED_NEW':
+        return {name: value for name, value in new.items() if name in changed}
+    return None
+
+
+class FakeTable:
+    def __init__(self, db, name, counted=True):
+        self.db = db
+        self.name = name
+        self.table_name = name
+        # Writes made on behalf of a batch / transaction are not separate calls
+        self.counted = counted
+
+    def _count(self, operation):
+        if self.counted:
+            self.db.count(operation)
+
+    def _condition(self, expression, names, values):
+        if not expression:
+            return None
+        return Expression(expression, names, values).condition()
+
+    def _key(self, key, operation):
+        schema = self.db.schema(self.name, operation)
+        if set(key) != set(schema['key']):
+            raise client_error('ValidationException', operation, 'The provided key element does not match the schema')
+        return tuple(normalize(key[name]) for name in schema['key'])
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues=None):
+        self._count('put_item')
+        item = normalize(Item)
+        key = self._key({name: Item[name] for name in self.db.schema(self.name, 'PutItem')['key']}, 'PutItem')
+        condition = self._condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        with self.db.lock:
+            old = self.db.items[self.name].get(key)
+            _check(condition, old, 'PutItem')
+            self.db.store(self.name, key, item)
+        response = {}
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            response['Attributes'] = copy.deepcopy(old)
+        return response
+
+    def get_item(self, Key, ConsistentRead=False, ProjectionExpression=None, ExpressionAttributeNames=None):
+        self._count('get_item')
+        key = self._key(Key, 'GetItem')
+        with self.db.lock:
+            item = self.db.items[self.name].get(key)
+            if item is None:
+                return {}
+            return {'Item': self._project(copy.deepcopy(item), ProjectionExpression, ExpressionAttributeNames)}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self._count('update_item')
+        key = self._key(Key, 'UpdateItem')
+        actions = Expression(UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues).update_actions()
+        condition = self._condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        with self.db.lock:
+            old = self.db.items[self.name].get(key)
+            _check(condition, old, 'UpdateItem')
+            new = copy.deepcopy(old) if old is not None else normalize(dict(Key))
+            changed = apply_update(new, actions)
+            self.db.store(self.name, key, new)
+        attributes = _returned(copy.deepcopy(old), copy.deepcopy(new), changed, ReturnValues)
+        return {'Attributes': attributes} if attributes else {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        self._count('delete_item')
+        key = self._key(Key, 'DeleteItem')
+        condition = self._condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        with self.db.lock:
+            old = self.db.items[self.name].get(key)
+            _check(condition, old, 'DeleteItem')
+            self.db.remove(self.name, key)
+        if ReturnValues == 'ALL_OLD' and old is not None:
+            return {'Attributes': old}
+        return {}
+
+    def _project(self, item, projection, names):
+        if not projection:
+            return item
+        projected = {}
+        for path in Expression(projection, names).projection():
+            value = get_path(item, path)
+            if value is not MISSING:
+                projected[path[0]] = item[path[0]]
+        return projected
+
+    def _page(self, candidates, key_names, operation, Limit, ExclusiveStartKey, FilterExpression,
+              ProjectionExpression, ExpressionAttributeNames, ExpressionAttributeValues, Select,
+              ConsistentRead=False, ReturnConsumedCapacity=None):
+        """Shared query / scan paging over an ordered candidate list"""
+        start = 0
+        if ExclusiveStartKey:
+            start_key = tuple(normalize(ExclusiveStartKey[name]) for name in self.db.schemas[self.name]['key'])
+            positions = [self.db.key_of(self.name, item) for item in candidates]
+            start = positions.index(start_key) + 1 if start_key in positions else len(candidates)
+
+        condition = self._condition(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+
+        evaluated = []
+        size = 0
+        for item in candidates[start:]:
+            if Limit is not None and len(evaluated) >= Limit:
+                break
+            if size >= PAGE_BYTES:
+                break
+            evaluated.append(item)
+            size += item_size(item)
+
+        matched = [item for item in evaluated if condition is None or condition(item)]
+        response = {'Count': len(matched), 'ScannedCount': len(evaluated)}
+
+        if ReturnConsumedCapacity in ('TOTAL', 'INDEXES'):
+            # Read units are charged on the data evaluated, before filtering and projection
+            units = math.ceil(size / READ_UNIT_BYTES) or 1
+            response['ConsumedCapacity'] = {
+                'TableName': self.name,
+                'CapacityUnits': float(units if ConsistentRead else units / 2)
+            }
+
+        if Select != 'COUNT':
+            response['Items'] = [
+                self._project(copy.deepcopy(item), ProjectionExpression, ExpressionAttributeNames)
+                for item in matched
+            ]
+
+        if start + len(evaluated) < len(candidates) and evaluated:
+            last = evaluated[-1]
+            response['LastEvaluatedKey'] = {
+                name: last[name] for name in list(self.db.schemas[self.name]['key']) + key_names
+                if name in last
+            }
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None,
+              ScanIndexForward=True, Select=None, ConsistentRead=False, ReturnConsumedCapacity=None):
+        self._count('query')
+        schema = self.db.schema(self.name, 'Query')
+        if IndexName:
+            if IndexName not in schema['indexes']:
+                raise client_error('ValidationException', 'Query', f"The table does not have the specified index: {IndexName}")
+            key_names = schema['indexes'][IndexName]
+        else:
+            key_names = schema['key']
+
+        key_condition = self._condition(KeyConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+
+        with self.db.lock:
+            if IndexName:
+                source = self.db.items[self.name].values()
+            else:
+                source = self._partition(KeyConditionExpression, key_names[0],
+                                         ExpressionAttributeNames, ExpressionAttributeValues)
+            candidates = [
+                item for item in source
+                if all(name in item for name in key_names) and key_condition(item)
+            ]
+
+        if len(key_names) > 1:
+            candidates.sort(key=lambda item: item[key_names[1]], reverse=not ScanIndexForward)
+
+        return self._page(candidates, key_names if IndexName else [], 'Query', Limit, ExclusiveStartKey,
+                          FilterExpression, ProjectionExpression, ExpressionAttributeNames,
+                          ExpressionAttributeValues, Select, ConsistentRead, ReturnConsumedCapacity)
+
+    def _partition(self, expression, partition_name, names, values):
+        """Items of the partition a base-table key condition names first (else all items)"""
+        match = re.match(r'\s*(#?\w+)\s*=\s*(:\w+)', expression)
+        if match and (names or {}).get(match.group(1), match.group(1)) == partition_name and match.group(2) in (values or {}):
+            return self.db.partitions[self.name].get(normalize(values[match.group(2)]), {}).values()
+        return self.db.items[self.name].values()
+
+    def scan(self, IndexName=None, FilterExpression=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None, Segment=None, TotalSegments=None,
+             Select=None, ConsistentRead=False, ReturnConsumedCapacity=None):
+        self._count('scan')
+        schema = self.db.schema(self.name, 'Scan')
+        key_names = schema['indexes'][IndexName] if IndexName else []
+
+        with self.db.lock:
+            candidates = [
+                item for item in self.db.items[self.name].values()
+                if all(name in item for name in key_names)
+            ]
+
+        if TotalSegments:
+            candidates = [
+                item for item in candidates
+                if zlib.crc32(repr(self.db.key_of(self.name, item)).encode('utf-8')) % TotalSegments == Segment
+            ]
+
+        return self._page(candidates, key_names, 'Scan', Limit, ExclusiveStartKey, FilterExpression,
+                          ProjectionExpression, ExpressionAttributeNames, ExpressionAttributeValues, Select,
+                          ConsistentRead, ReturnConsumedCapacity)
+
+
+class FakeDynamoDBClient:
+    """Low-level client: typed attribute values in and out"""
+
+    def __init__(self, db, unprocessed_every=0):
+        self.db = db
+        # Return every n-th BatchWriteItem request as unprocessed (exercises retries)
+        self.unprocessed_every = unprocessed_every
+        self._batch_requests = 0
+
+    def batch_write_item(self, RequestItems):
+        self.db.count('batch_write_item')
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise client_error('ValidationException', 'BatchWriteItem', 'Too many items requested for the BatchWriteItem call')
+
+        unprocessed = {}
+        for table_name, requests in RequestItems.items():
+            table = FakeTable(self.db, table_name, counted=False)
+            for request in requests:
+                self._batch_requests += 1
+                if self.unprocessed_every and self._batch_requests % self.unprocessed_every == 0:
+                    unprocessed.setdefault(table_name, []).append(request)
+                    continue
+                if 'PutRequest' in request:
+                    table.put_item(Item=from_typed({'M': request['PutRequest']['Item']}))
+                else:
+                    table.delete_item(Key=from_typed({'M': request['DeleteRequest']['Key']}))
+        return {'UnprocessedItems': unprocessed}
+
+    def batch_get_item(self, RequestItems):
+        self.db.count('batch_get_item')
+        plain = {
+            table_name: dict(request, Keys=[from_typed({'M': key}) for key in request['Keys']])
+            for table_name, request in RequestItems.items()
+        }
+        response = batch_get(self.db, plain, lambda: False)
+        return {
+            'Responses': {
+                table_name: [to_typed(item)['M'] for item in items]
+                for table_name, items in response['Responses'].items()
+            },
+            'UnprocessedKeys': {}
+        }
+
+    def scan(self, TableName, ExclusiveStartKey=None, ExpressionAttributeValues=None, **kwargs):
+        self.db.count('scan')
+        response = FakeTable(self.db, TableName, counted=False).scan(
+            ExclusiveStartKey=from_typed({'M': ExclusiveStartKey}) if ExclusiveStartKey else None,
+            ExpressionAttributeValues={name: from_typed(value) for name, value in (ExpressionAttributeValues or {}).items()} or None,
+            **kwargs
+        )
+        if 'Items' in response:
+            response['Items'] = [to_typed(item)['M'] for item in response['Items']]
+        if 'LastEvaluatedKey' in response:
+            response['LastEvaluatedKey'] = to_typed(response['LastEvaluatedKey'])['M']
+        return response
+
+    def update_item(self, TableName, Key, ExpressionAttributeValues=None, **kwargs):
+        self.db.count('update_item')
+        response = FakeTable(self.db, TableName, counted=False).update_item(
+            Key=from_typed({'M': Key}),
+            ExpressionAttributeValues={name: from_typed(value) for name, value in (ExpressionAttributeValues or {}).items()} or None,
+            **kwargs
+        )
+        if 'Attributes' in response:
+            response['Attributes'] = to_typed(response['Attributes'])['M']
+        return response
+
+    def transact_write_items(self, TransactItems):
+        self.db.count('transact_write_items')
+        with self.db.lock:
+            # Check every condition first; apply only if all pass
+            reasons = []
+            for action in TransactItems:
+                operation, body = next(iter(action.items()))
+                table_name = body['TableName']
+                self.db.schema(table_name, 'TransactWriteItems')
+                if operation == 'Put':
+                    item = from_typed({'M': body['Item']})
+                    key = self.db.key_of(table_name, normalize(item))
+                else:
+                    key = tuple(from_typed(body['Key'][name]) for name in self.db.schemas[table_name]['key'])
+                current = self.db.items[table_name].get(key)
+                condition = None
+                if body.get('ConditionExpression'):
+                    values = {name: from_typed(value) for name, value in body.get('ExpressionAttributeValues', {}).items()}
+                    condition = Expression(body['ConditionExpression'], body.get('ExpressionAttributeNames'), values).condition()
+                ok = condition is None or condition(current if current is not None else {})
+                reasons.append({'Code': 'None'} if ok else {'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise client_error(
+                    'TransactionCanceledException', 'TransactWriteItems',
+                    'Transaction cancelled, please refer cancellation reasons for specific reasons',
+                    CancellationReasons=reasons
+                )
+
+            for action in TransactItems:
+                operation, body = next(iter(action.items()))
+                table = FakeTable(self.db, body['TableName'], counted=False)
+                names = body.get('ExpressionAttributeNames')
+                values = {name: from_typed(value) for name, value in body.get('ExpressionAttributeValues', {}).items()}
+                if operation == 'Put':
+                    table.put_item(Item=from_typed({'M': body['Item']}))
+                elif operation == 'Delete':
+                    table.delete_item(Key=from_typed({'M': body['Key']}))
+                elif operation == 'Update':
+                    table.update_item(
+                        Key=from_typed({'M': body['Key']}),
+                        UpdateExpression=body['UpdateExpression'],
+                        ExpressionAttributeNames=names,
+                        ExpressionAttributeValues=values
+                    )
+        return {}
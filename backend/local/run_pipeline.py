@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end run of the video pipeline, for load testing
+
+Runs step-functions/state-machine.json locally (state_machine.py) against
+the real Lambda handlers, with in-process S3, Rekognition, Step Functions
+and DynamoDB (fake_aws.py, fake_dynamodb.py). Nothing leaves the process.
+
+Every session is one synthetic class video: the roster's photos and the
+video are put in the fake bucket, the fake Rekognition job returns
+face search detections generated by synthetic_faces.py for it, and the execution runs from the
+EventBridge upload event to the DynamoDB records. Rekognition completions
+are delivered through Lambda 2's SNS handler one at a time, and the
+admission schedule runs whenever jobs sit in the queue with nothing else
+to do - so the job queue, job ledger and callbacks all run for real.
+
+Reported per stage (state name, plus RekognitionNotification and
+AdmitQueuedJobs): invocations, errors, wall time (total / mean / p95),
+peak memory per invocation (--trace-memory) and API calls by operation.
+
+Usage:
+    python run_pipeline.py                              # 200 sessions, 40 students
+    python run_pipeline.py --sessions 5000 --students 60 --duplicates 0.05
+    python run_pipeline.py --sessions 500 --trace-memory --json > run.json
+
+Handler settings come from the environment as in Lambda (e.g.
+MAX_IN_FLIGHT_JOBS=5 python run_pipeline.py).
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+LOCAL_DIR = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.abspath(os.path.join(LOCAL_DIR, '..', 'lambda'))
+STATE_MACHINE_PATH = os.path.abspath(os.path.join(LOCAL_DIR, '..', 'step-functions', 'state-machine.json'))
+
+sys.path.insert(0, LAMBDA_DIR)
+
+# Handler logs are off unless asked for (--log-level)
+os.environ.setdefault('LOG_LEVEL', 'OFF')
+
+import job_queue  # noqa: E402
+import lambda1_generate_job  # noqa: E402
+import lambda2_run_rekognition  # noqa: E402
+import lambda3_process_and_store  # noqa: E402
+import lambda_segment_video  # noqa: E402
+import roster_manifest  # noqa: E402
+import structured_log  # noqa: E402
+import synthetic_faces  # noqa: E402
+from fake_aws import FakeAWS  # noqa: E402
+from state_machine import StateMachine, Executor, StatesError  # noqa: E402
+
+# Function name (last part of the Lambda ARN) -> handler module
+FUNCTIONS = {
+    'GenerateJobForVideo': lambda1_generate_job,
+    'SegmentVideo': lambda_segment_video,
+    'RunRekognition': lambda2_run_rekognition,
+    'ProcessAndStore': lambda3_process_and_store,
+}
+
+BUCKET = lambda1_generate_job.BUCKET_NAME
+
+
+class LambdaContext:
+    _request_ids = itertools.count(1)
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.aws_request_id = f"local-{next(self._request_ids):010d}"
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+class StageStats:
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, stage, wall_ms, peak_bytes, calls, failed):
+        stats = self.stages.setdefault(stage, {'durations': [], 'errors': 0, 'peak_bytes': 0, 'calls': {}})
+        stats['durations'].append(wall_ms)
+        stats['errors'] += failed
+        if peak_bytes is not None:
+            stats['peak_bytes'] = max(stats['peak_bytes'], peak_bytes)
+        for name, amount in calls.items():
+            stats['calls'][name] = stats['calls'].get(name, 0) + amount
+
+    def report(self, trace_memory):
+        report = {}
+        for stage, stats in self.stages.items():
+            durations = sorted(stats['durations'])
+            report[stage] = {
+                'invocations': len(durations),
+                'errors': stats['errors'],
+                'total_ms': round(sum(durations), 1),
+                'mean_ms': round(sum(durations) / len(durations), 3),
+                'p95_ms': round(durations[min(len(durations) - 1, int(len(durations) * 0.95))], 3),
+                'peak_kb': round(stats['peak_bytes'] / 1024, 1) if trace_memory else None,
+                'api_calls': sum(stats['calls'].values()),
+                'calls': dict(sorted(stats['calls'].items()))
+            }
+        return report
+
+
+class PipelineRun:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.profile = synthetic_faces.profile_from_args(args)
+        self.student_ids = synthetic_faces.roster(self.profile)
+        self.aws = FakeAWS(self.detections, max_concurrent_jobs=args.rekognition_limit)
+        self.stats = StageStats()
+
+        with open(STATE_MACHINE_PATH, encoding='utf-8') as definition_file:
+            definition = json.load(definition_file)
+        self.machine = StateMachine(definition, self.invoke, self.aws.stepfunctions)
+        self.executor = Executor(self.machine, self.aws.stepfunctions, max_running=args.concurrency)
+
+    # --- synthetic data
+
+    def seed_bucket(self):
+        """Student photos, the roster manifest and one video per session"""
+        for student_id in self.student_ids:
+            self.aws.s3.put_object(Bucket=BUCKET, Key=f"photos/student_{student_id}.jpg", Body=b'\xff\xd8photo')
+        with contextlib.redirect_stdout(io.StringIO()):
+            roster_manifest.rebuild_roster(BUCKET)
+
+        bodies = []
+        class_start = datetime(2025, 9, 1, 8, 0, tzinfo=timezone.utc)
+        video_bytes = self.args.video_kb * 1024
+
+        for index in range(self.args.sessions):
+            if bodies and self.random.random() < self.args.duplicates:
+                body = self.random.choice(bodies)
+            else:
+                seed = hashlib.sha256(f"{self.args.seed}:{index}".encode('utf-8')).digest()
+                body = (seed * (video_bytes // len(seed) + 1))[:video_bytes]
+                bodies.append(body)
+
+            self.aws.s3.put_object(
+                Bucket=BUCKET,
+                Key=self.video_key(index),
+                Body=body,
+                ContentType='video/mp4',
+                Metadata={'class-start': (class_start + timedelta(minutes=30 * index)).isoformat()}
+            )
+
+    def video_key(self, index):
+        return f"videos/session_{index:05d}.mp4"
+
+    def detections(self, bucket, video_key):
+        """Face search Persons for a video, seeded by its content (duplicates match)"""
+        etag = self.aws.s3.buckets[bucket][video_key]['ETag']
+        return list(synthetic_faces.lecture_persons(self.profile, seed=etag))
+
+    # --- running
+
+    def invoke(self, function_name, stage, payload):
+        """Run one Lambda invocation the way the Lambda service would, and measure it"""
+        module = FUNCTIONS[function_name]
+        # Payloads and results cross a JSON boundary in Lambda too
+        event = json.loads(json.dumps(payload))
+
+        calls_before = self.aws.calls.snapshot()
+        if self.args.trace_memory:
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        error = None
+        start = time.perf_counter()
+        try:
+            result = json.loads(json.dumps(module.lambda_handler(event, LambdaContext(function_name))))
+        except TypeError as e:
+            error = StatesError('Runtime.MarshalError', str(e))
+        except Exception as e:
+            error = StatesError(type(e).__name__, str(e))
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        peak_bytes = None
+        if self.args.trace_memory:
+            peak_bytes = tracemalloc.get_traced_memory()[1] - memory_before
+
+        calls_after = self.aws.calls.snapshot()
+        calls = {
+            name: count - calls_before.get(name, 0)
+            for name, count in calls_after.items() if count != calls_before.get(name, 0)
+        }
+        self.stats.record(stage, wall_ms, peak_bytes, calls, error is not None)
+
+        if error is not None:
+            raise error
+        return result
+
+    def queued_jobs(self):
+        """Jobs waiting in the admission queue (read off the fake, not counted)"""
+        return sum(1 for key in self.aws.dynamodb.items[job_queue.JOB_QUEUE_TABLE] if key[0] == job_queue.QUEUE_PARTITION)
+
+    def on_idle(self):
+        """Nothing can move inside the state machine: let Rekognition or the schedule act"""
+        event = self.aws.rekognition.complete_next()
+        if event is not None:
+            self.invoke_outside_machine('RekognitionNotification', event)
+            return True
+
+        if self.queued_jobs():
+            self.invoke_outside_machine('AdmitQueuedJobs', {'action': 'admit'})
+            # Only progress if something started
+            return self.aws.rekognition.running_jobs() > 0
+
+        return False
+
+    def invoke_outside_machine(self, stage, event):
+        try:
+            self.invoke('RunRekognition', stage, event)
+        except StatesError:
+            pass
+
+    def run(self):
+        self.aws.install()
+        try:
+            self.seed_bucket()
+
+            for index in range(self.args.sessions):
+                video_key = self.video_key(index)
+                self.executor.submit(f"session-{index:05d}", {
+                    'detail-type': 'Object Created',
+                    'source': 'aws.s3',
+                    'detail': {'bucket': {'name': BUCKET}, 'object': {'key': video_key}}
+                })
+
+            if self.args.trace_memory:
+                tracemalloc.start()
+
+            start = time.perf_counter()
+            executions = self.executor.run(self.on_idle)
+            wall_sec = time.perf_counter() - start
+
+            if self.args.trace_memory:
+                tracemalloc.stop()
+
+            return self.summary(executions, wall_sec)
+        finally:
+            self.aws.uninstall()
+
+    def summary(self, executions, wall_sec):
+        statuses = {}
+        failures = {}
+        for execution in executions:
+            statuses[execution.status] = statuses.get(execution.status, 0) + 1
+            if execution.status == 'FAILED':
+                reason = f"{execution.error}: {execution.cause}"[:160]
+                failures[reason] = failures.get(reason, 0) + 1
+
+        stages = self.stats.report(self.args.trace_memory)
+        calls = {}
+        for stage in self.stats.stages.values():
+            for name, amount in stage['calls'].items():
+                calls[name] = calls.get(name, 0) + amount
+
+        records = sum(1 for item in self.aws.dynamodb.items['StudentlyticsData'].values()
+                      if item.get('student_id') is not None and '#' in item['record_id'])
+
+        return {
+            'sessions': self.args.sessions,
+            'students': self.args.students,
+            'detections_per_session': synthetic_faces.expected_detections(self.profile),
+            'executions': statuses,
+            'failures': failures,
+            'wall_sec': round(wall_sec, 3),
+            'sessions_per_sec': round(self.args.sessions / wall_sec, 1) if wall_sec else None,
+            'lambda_ms': round(sum(stage['total_ms'] for stage in stages.values()), 1),
+            'api_calls': sum(calls.values()),
+            'calls': dict(sorted(calls.items())),
+            'rekognition_peak_jobs': self.aws.rekognition.peak_running,
+            'student_records': records,
+            's3_objects': self.aws.s3.object_count(),
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'stages': stages
+        }
+
+
+def print_report(report):
+    print(f"{report['sessions']} sessions x {report['students']} students, "
+          f"~{report['detections_per_session']} detections each")
+    print(f"executions: {report['executions']}  wall: {report['wall_sec']} s "
+          f"({report['sessions_per_sec']} sessions/s)  max RSS: {report['max_rss_mb']} MB")
+    for reason, count in report['failures'].items():
+        print(f"  failed x{count}: {reason}")
+    print()
+
+    header = f"{'stage':<26} {'calls':>7} {'errors':>6} {'total_ms':>10} {'mean_ms':>9} {'p95_ms':>9} {'peak_kb':>9} {'api':>8}"
+    print(header)
+    print('-' * len(header))
+    for stage, stats in report['stages'].items():
+        peak = '-' if stats['peak_kb'] is None else stats['peak_kb']
+        print(f"{stage:<26} {stats['invocations']:>7} {stats['errors']:>6} {stats['total_ms']:>10} "
+              f"{stats['mean_ms']:>9} {stats['p95_ms']:>9} {peak:>9} {stats['api_calls']:>8}")
+    print()
+
+    print(f"API calls: {report['api_calls']}  (Rekognition peak concurrent jobs: {report['rekognition_peak_jobs']})")
+    for name, count in report['calls'].items():
+        print(f"  {name:<40} {count:>9}")
+    print(f"student records: {report['student_records']}  S3 objects: {report['s3_objects']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=200, help='Class videos to run through the pipeline')
+    parser.add_argument('--duplicates', type=float, default=0.0,
+                        help='Share of uploads that re-use an earlier video (exercises the job ledger)')
+    parser.add_argument('--video-kb', type=int, default=64, help='Size of each synthetic video object')
+    parser.add_argument('--concurrency', type=int, default=100, help='Executions running at once')
+    parser.add_argument('--rekognition-limit', type=int, default=job_queue.MAX_IN_FLIGHT_JOBS,
+                        help='Concurrent face search jobs the fake Rekognition accepts')
+    parser.add_argument('--trace-memory', action='store_true', help='Measure peak memory per invocation (slower)')
+    parser.add_argument('--log-level', default=None, help='Handler LOG_LEVEL (default: OFF)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    # One sampled frame every 20 s keeps thousands of sessions quick; raise --fps for realistic volume
+    synthetic_faces.add_profile_arguments(parser, fps=0.05)
+    args = parser.parse_args()
+
+    if args.log_level:
+        structured_log.set_level(args.log_level)
+
+    report = PipelineRun(args).run()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    return 0 if report['executions'] == {'SUCCEEDED': args.sessions} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
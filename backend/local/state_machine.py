@@ -0,0 +1,381 @@
+"""
+Local interpreter for the pipeline's Amazon States Language definition
+
+Runs step-functions/state-machine.json in-process, covering what the
+definition uses: Task (plain Lambda resources and lambda:invoke
+.waitForTaskToken), Choice, Pass, Map (ItemSelector / ItemProcessor,
+MaxConcurrency), Succeed, Fail, Parameters / ResultSelector / ResultPath /
+InputPath / OutputPath with `$` and `$$` (context object) paths, and
+Catch. Retry and TimeoutSeconds are not modelled.
+
+An execution is a generator: it runs until every branch is parked on a
+task token and then yields WaitForTokens. The Executor multiplexes many
+executions on one thread and resumes each as its tokens are answered
+through FakeStepFunctions - the same way the real service would.
+"""
+import copy
+from collections import deque
+
+TASK_TOKEN_RESOURCE = 'arn:aws:states:::lambda:invoke.waitForTaskToken'
+
+_MISSING = object()
+
+
+class StatesError(Exception):
+    """A state failed with an ASL error name (States.TaskFailed, a Lambda exception name, ...)"""
+
+    def __init__(self, error, cause='', data=None):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+        # The state input when a Fail state was reached (its $.error says why)
+        self.data = data
+
+
+class WaitForTokens:
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+
+
+# --- paths --------------------------------------------------------------------
+
+def read_path(path, data, context):
+    if path.startswith('$$'):
+        value, rest = context, path[2:]
+    elif path.startswith('$'):
+        value, rest = data, path[1:]
+    else:
+        raise StatesError('States.Runtime', f"Invalid path '{path}'")
+
+    for part in [part for part in rest.split('.') if part]:
+        if not isinstance(value, dict) or part not in value:
+            # Not catchable in the real service either
+            raise StatesError('States.Runtime', f"The JSONPath '{path}' could not be found in the input")
+        value = value[part]
+    return value
+
+
+def resolve(template, data, context):
+    """Evaluate a Parameters / ItemSelector / ResultSelector template"""
+    if isinstance(template, dict):
+        resolved = {}
+        for key, value in template.items():
+            if key.endswith('.$'):
+                resolved[key[:-2]] = copy.deepcopy(read_path(value, data, context))
+            else:
+                resolved[key] = resolve(value, data, context)
+        return resolved
+    if isinstance(template, list):
+        return [resolve(value, data, context) for value in template]
+    return template
+
+
+def write_result(data, result_path, result):
+    if result_path is None:
+        return data
+    if result_path == '$':
+        return result
+
+    target = copy.deepcopy(data) if isinstance(data, dict) else {}
+    parts = [part for part in result_path[1:].split('.') if part]
+    node = target
+    for part in parts[:-1]:
+        node = node.setdefault(part, {})
+    node[parts[-1]] = result
+    return target
+
+
+def state_input(state, data, context):
+    effective = data if state.get('InputPath', '$') is None else read_path(state.get('InputPath', '$'), data, context)
+    if 'Parameters' in state:
+        return resolve(state['Parameters'], effective, context)
+    return effective
+
+
+def state_output(state, data, result, context):
+    if 'ResultSelector' in state:
+        result = resolve(state['ResultSelector'], result, context)
+    output = write_result(data, state.get('ResultPath', '$'), result)
+    output_path = state.get('OutputPath', '$')
+    return {} if output_path is None else read_path(output_path, output, context)
+
+
+# --- Choice rules -------------------------------------------------------------
+
+COMPARATORS = {
+    'StringEquals': (str, lambda value, test: value == test),
+    'StringGreaterThan': (str, lambda value, test: value > test),
+    'StringLessThan': (str, lambda value, test: value < test),
+    'NumericEquals': ((int, float), lambda value, test: value == test),
+    'NumericGreaterThan': ((int, float), lambda value, test: value > test),
+    'NumericGreaterThanEquals': ((int, float), lambda value, test: value >= test),
+    'NumericLessThan': ((int, float), lambda value, test: value < test),
+    'NumericLessThanEquals': ((int, float), lambda value, test: value <= test),
+    'BooleanEquals': (bool, lambda value, test: value is test),
+}
+
+
+def rule_matches(rule, data, context):
+    if 'And' in rule:
+        return all(rule_matches(inner, data, context) for inner in rule['And'])
+    if 'Or' in rule:
+        return any(rule_matches(inner, data, context) for inner in rule['Or'])
+    if 'Not' in rule:
+        return not rule_matches(rule['Not'], data, context)
+
+    try:
+        value = read_path(rule['Variable'], data, context)
+    except StatesError:
+        value = _MISSING
+
+    if 'IsPresent' in rule:
+        return (value is not _MISSING) == rule['IsPresent']
+    if value is _MISSING:
+        raise StatesError('States.Runtime', f"Invalid path '{rule['Variable']}': The choice state's condition path references an invalid value")
+    if 'IsNull' in rule:
+        return (value is None) == rule['IsNull']
+
+    for name, (types, compare) in COMPARATORS.items():
+        if name in rule:
+            if isinstance(value, bool) and types is not bool:
+                return False
+            return isinstance(value, types) and compare(value, rule[name])
+    raise StatesError('States.Runtime', f"Unsupported choice rule {sorted(rule)}")
+
+
+def error_matches(catcher, error):
+    names = catcher['ErrorEquals']
+    if error.error == 'States.Runtime':
+        return False
+    return error.error in names or 'States.ALL' in names or (
+        'States.TaskFailed' in names and not error.error.startswith('States.')
+    )
+
+
+# --- interpreter --------------------------------------------------------------
+
+class StateMachine:
+    """
+    invoke(function_name, state_name, payload) runs a Lambda and returns its
+    (JSON) result or raises StatesError; stepfunctions issues task tokens.
+    """
+
+    def __init__(self, definition, invoke, stepfunctions):
+        self.definition = definition
+        self.invoke = invoke
+        self.stepfunctions = stepfunctions
+
+    def start(self, name, execution_input):
+        context = {
+            'Execution': {'Id': f"local:{name}", 'Name': name, 'Input': copy.deepcopy(execution_input)},
+            'StateMachine': {'Name': 'local'}
+        }
+        return self.run(self.definition, execution_input, context)
+
+    def run(self, definition, data, context):
+        """Generator: run states from StartAt to the end; returns the output"""
+        states = definition['States']
+        name = definition['StartAt']
+
+        while name is not None:
+            state = states[name]
+            state_context = dict(context, State={'Name': name})
+            try:
+                data, name = yield from self.run_state(name, state, data, state_context)
+            except StatesError as error:
+                catcher = next((catcher for catcher in state.get('Catch', []) if error_matches(catcher, error)), None)
+                if catcher is None:
+                    raise
+                data = write_result(data, catcher.get('ResultPath', '$'), {'Error': error.error, 'Cause': error.cause})
+                name = catcher['Next']
+
+        return data
+
+    def run_state(self, name, state, data, context):
+        kind = state['Type']
+        next_name = None if state.get('End') else state.get('Next')
+
+        if kind == 'Succeed':
+            return data, None
+
+        if kind == 'Fail':
+            raise StatesError(state.get('Error', 'States.Fail'), state.get('Cause', ''), data=data)
+
+        if kind == 'Pass':
+            result = state_input(state, data, context) if 'Result' not in state else copy.deepcopy(state['Result'])
+            return state_output(state, data, result, context), next_name
+
+        if kind == 'Choice':
+            for rule in state['Choices']:
+                if rule_matches(rule, data, context):
+                    return data, rule['Next']
+            if 'Default' not in state:
+                raise StatesError('States.NoChoiceMatched', f"No choice matched in state '{name}'")
+            return data, state['Default']
+
+        if kind == 'Task':
+            result = yield from self.run_task(name, state, data, context)
+            return state_output(state, data, result, context), next_name
+
+        if kind == 'Map':
+            result = yield from self.run_map(state, data, context)
+            return state_output(state, data, result, context), next_name
+
+        raise StatesError('States.Runtime', f"State type {kind} is not supported locally")
+
+    def run_task(self, name, state, data, context):
+        if state['Resource'] != TASK_TOKEN_RESOURCE:
+            function_name = state['Resource'].rsplit(':', 1)[-1]
+            return self.invoke(function_name, name, state_input(state, data, context))
+
+        token = self.stepfunctions.issue_token()
+        parameters = state_input(state, data, dict(context, Task={'Token': token}))
+        try:
+            self.invoke(parameters['FunctionName'].rsplit(':', 1)[-1], name, parameters.get('Payload', {}))
+        except StatesError:
+            self.stepfunctions.cancel_tokens([token])
+            raise
+
+        _, outcome = yield WaitForTokens([token])
+        if outcome[0] == 'failure':
+            raise StatesError(outcome[1], outcome[2])
+        return outcome[1]
+
+    def run_map(self, state, data, context):
+        """Run the item processor once per item, at most MaxConcurrency at a time"""
+        items = read_path(state.get('ItemsPath', '$'), data, context)
+        processor = state.get('ItemProcessor') or state['Iterator']
+        limit = state.get('MaxConcurrency') or len(items) or 1
+
+        results = [None] * len(items)
+        pending = deque(range(len(items)))
+        branches = {}
+        waiting = {}
+
+        def advance(index, value):
+            try:
+                request = branches[index].send(value)
+            except StopIteration as stop:
+                results[index] = stop.value
+                del branches[index]
+                return
+            for token in request.tokens:
+                waiting[token] = index
+
+        try:
+            while pending or branches:
+                while pending and len(branches) < limit:
+                    index = pending.popleft()
+                    item_context = dict(context, Map={'Item': {'Index': index, 'Value': items[index]}})
+                    item_input = resolve(state['ItemSelector'], data, item_context) if 'ItemSelector' in state else items[index]
+                    branches[index] = self.run(processor, item_input, context)
+                    advance(index, None)
+
+                if not branches:
+                    continue
+
+                token, outcome = yield WaitForTokens(list(waiting))
+                index = waiting.pop(token)
+                for other in [other for other, owner in waiting.items() if owner == index]:
+                    del waiting[other]
+                advance(index, (token, outcome))
+
+        except StatesError:
+            # One failed iteration fails the Map; the others are stopped
+            for branch in branches.values():
+                branch.close()
+            self.stepfunctions.cancel_tokens(list(waiting))
+            raise
+
+        return results
+
+
+class Execution:
+    def __init__(self, name, generator):
+        self.name = name
+        self.generator = generator
+        self.status = 'RUNNING'
+        self.output = None
+        self.error = None
+        self.cause = None
+        self.tokens = []
+
+
+class Executor:
+    """
+    Runs many executions cooperatively
+
+    Executions are started up to max_running at a time. When no execution
+    can move, on_idle() is called to make progress outside the state
+    machine (finish a Rekognition job, run a schedule); it returns False
+    when there is nothing left to do.
+    """
+
+    def __init__(self, machine, stepfunctions, max_running=100):
+        self.machine = machine
+        self.stepfunctions = stepfunctions
+        self.max_running = max_running
+        self.queued = deque()
+        self.runnable = deque()
+        self.waiting = {}
+        self.executions = []
+        self.running = 0
+
+    def submit(self, name, execution_input):
+        self.queued.append((name, execution_input))
+
+    def step(self, execution, value):
+        try:
+            request = execution.generator.send(value)
+        except StopIteration as stop:
+            execution.status = 'SUCCEEDED'
+            execution.output = stop.value
+            self.running -= 1
+            return
+        except StatesError as error:
+            execution.status = 'FAILED'
+            execution.error = error.error
+            execution.cause = error.cause
+            if isinstance(error.data, dict) and isinstance(error.data.get('error'), dict):
+                execution.cause = error.data['error'].get('Cause') or execution.cause
+            self.running -= 1
+            return
+
+        execution.tokens = request.tokens
+        for token in request.tokens:
+            self.waiting[token] = execution
+
+    def deliver(self):
+        """Resume executions whose task tokens were answered"""
+        for token in self.stepfunctions.answered():
+            execution = self.waiting.pop(token, None)
+            if execution is None:
+                continue
+            outcome = self.stepfunctions.take_result(token)
+            for other in execution.tokens:
+                self.waiting.pop(other, None)
+            execution.tokens = []
+            self.runnable.append((execution, (token, outcome)))
+
+    def run(self, on_idle=None):
+        while True:
+            while self.queued and self.running < self.max_running:
+                name, execution_input = self.queued.popleft()
+                execution = Execution(name, self.machine.start(name, execution_input))
+                self.executions.append(execution)
+                self.running += 1
+                self.runnable.append((execution, None))
+
+            self.deliver()
+            if self.runnable:
+                self.step(*self.runnable.popleft())
+                continue
+
+            if on_idle is not None and on_idle():
+                continue
+
+            # Whatever still waits would wait forever (a lost callback)
+            for execution in self.executions:
+                if execution.status == 'RUNNING':
+                    execution.status = 'STUCK'
+            return self.executions
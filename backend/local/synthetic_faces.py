@@ -0,0 +1,201 @@
+"""
+Synthetic Rekognition face search results for one lecture
+
+Generates get_face_search `Persons` entries the way a classroom video
+produces them: frames are sampled at `fps`; every attending student is
+in the room from their arrival to their departure (minus one break for
+the `step_out_rate` share of them) and shows up in a sampled frame with
+probability `visibility`. A detection is matched to
+the student's collection face with probability `match_rate` (similarity
+drawn from [similarity_min, 100], so some fall below the 80 threshold);
+otherwise it comes back without FaceMatches. Strangers (visitors, faces
+not in the collection) add unmatched detections.
+
+Each student gets a seat - farther seats mean smaller bounding boxes,
+lower sharpness and fewer detections - and a head-pose bias, so
+per-student averages differ the way they do in real classes.
+
+    profile = lecture_profile(students=60, minutes=90, fps=1)
+    for page in persons_pages(profile, seed=1):   # 1000 entries per page
+        ...
+
+Everything is deterministic for a given profile and seed (any hashable
+seed, e.g. a video's ETag).
+"""
+import math
+import random
+
+FIRST_STUDENT_ID = 10001
+
+DEFAULT_PROFILE = {
+    'students': 40,             # roster size
+    'minutes': 50,              # lecture length
+    'fps': 2.0,                 # sampled frames per second
+    'attendance_rate': 0.9,     # share of the roster that attends
+    'late_rate': 0.15,          # share of attendees arriving late (up to 15 min)
+    'early_leave_rate': 0.1,    # share of attendees leaving early (up to 15 min)
+    'step_out_rate': 0.0,       # share of attendees stepping out once (5-40 min)
+    'visibility': 0.6,          # chance a present face is detected in a frame
+    'match_rate': 0.9,          # chance a detected student face is matched
+    'similarity_min': 75.0,     # matches draw similarity from [similarity_min, 100]
+    'strangers': 0.3,           # unmatched stranger faces per frame (mean)
+    'yaw_sd': 25.0,             # head pose spread (degrees)
+    'pitch_sd': 12.0,
+    'roll_sd': 6.0,
+    'brightness_mean': 65.0,    # face quality (0-100)
+    'brightness_sd': 12.0,
+    'sharpness_mean': 40.0,
+    'sharpness_sd': 15.0,
+}
+
+LATE_MAX_MS = 15 * 60 * 1000
+STEP_OUT_MIN_MS = 5 * 60 * 1000
+STEP_OUT_MAX_MS = 40 * 60 * 1000
+
+
+def lecture_profile(**overrides):
+    """DEFAULT_PROFILE with overrides applied (unknown names are an error)"""
+    unknown = set(overrides) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown profile settings: {sorted(unknown)}")
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(overrides)
+    return profile
+
+
+def roster(profile):
+    """Student ids of the profile's roster"""
+    return list(range(FIRST_STUDENT_ID, FIRST_STUDENT_ID + profile['students']))
+
+
+def expected_detections(profile):
+    """Approximate number of Persons entries a lecture produces"""
+    frames = profile['minutes'] * 60 * profile['fps']
+    per_frame = profile['students'] * profile['attendance_rate'] * profile['visibility'] * 0.85 + profile['strangers']
+    return int(frames * per_frame)
+
+
+def _clamp(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+def _attendees(profile, rng):
+    """[(position, student_id, arrive_ms, leave_ms, away, seat, yaw_bias, pitch_bias)]"""
+    duration_ms = int(profile['minutes'] * 60 * 1000)
+    attendees = []
+
+    for position, student_id in enumerate(roster(profile)):
+        if rng.random() >= profile['attendance_rate']:
+            continue
+        arrive_ms = int(rng.uniform(0, min(LATE_MAX_MS, duration_ms / 2))) if rng.random() < profile['late_rate'] else 0
+        leave_ms = duration_ms
+        if rng.random() < profile['early_leave_rate']:
+            leave_ms = duration_ms - int(rng.uniform(0, min(LATE_MAX_MS, duration_ms / 2)))
+        leave_ms = max(arrive_ms, leave_ms)
+        # (start, end) of a break outside the room; no draw when disabled, so
+        # lectures without breaks stay identical
+        away = (0, 0)
+        if profile['step_out_rate'] and rng.random() < profile['step_out_rate']:
+            away_ms = int(rng.uniform(STEP_OUT_MIN_MS, STEP_OUT_MAX_MS))
+            away_start = int(rng.uniform(arrive_ms, max(arrive_ms, leave_ms - away_ms)))
+            away = (away_start, away_start + away_ms)
+        # 0 = front row, 1 = back row
+        seat = rng.random()
+        attendees.append((
+            position, student_id, arrive_ms, leave_ms, away, seat,
+            rng.gauss(0, profile['yaw_sd'] / 2), rng.gauss(0, profile['pitch_sd'] / 2)
+        ))
+
+    return attendees
+
+
+def _face(profile, rng, seat, yaw_bias, pitch_bias):
+    width = _clamp(rng.gauss(0.16 - 0.11 * seat, 0.01), 0.02, 0.5)
+    height = _clamp(width * rng.uniform(1.1, 1.4), 0.02, 0.6)
+    return {
+        'BoundingBox': {
+            'Width': width,
+            'Height': height,
+            'Left': rng.uniform(0, 1 - width),
+            'Top': _clamp(0.2 + 0.5 * seat + rng.gauss(0, 0.03), 0, 1 - height)
+        },
+        'Confidence': _clamp(rng.gauss(99.0 - 3 * seat, 1.0), 50.0, 100.0),
+        'Pose': {
+            'Yaw': _clamp(rng.gauss(yaw_bias, profile['yaw_sd']), -90.0, 90.0),
+            'Pitch': _clamp(rng.gauss(pitch_bias, profile['pitch_sd']), -90.0, 90.0),
+            'Roll': _clamp(rng.gauss(0, profile['roll_sd']), -90.0, 90.0)
+        },
+        'Quality': {
+            'Brightness': _clamp(rng.gauss(profile['brightness_mean'], profile['brightness_sd']), 0.0, 100.0),
+            'Sharpness': _clamp(rng.gauss(profile['sharpness_mean'] * (1 - 0.5 * seat), profile['sharpness_sd']), 0.0, 100.0)
+        }
+    }
+
+
+def lecture_persons(profile, seed=0):
+    """Persons entries of one lecture, in timestamp order (a generator)"""
+    rng = random.Random(seed)
+    attendees = _attendees(profile, rng)
+    strangers_index = profile['students']
+
+    frame_ms = 1000.0 / profile['fps']
+    frames = int(profile['minutes'] * 60 * profile['fps'])
+
+    for frame in range(frames):
+        timestamp_ms = int(frame * frame_ms)
+
+        for position, student_id, arrive_ms, leave_ms, away, seat, yaw_bias, pitch_bias in attendees:
+            if not arrive_ms <= timestamp_ms < leave_ms or away[0] <= timestamp_ms < away[1]:
+                continue
+            if rng.random() >= profile['visibility'] * (1 - 0.3 * seat):
+                continue
+
+            face = _face(profile, rng, seat, yaw_bias, pitch_bias)
+            person = {
+                'Timestamp': timestamp_ms,
+                'Person': {'Index': position, 'BoundingBox': face['BoundingBox'], 'Face': face}
+            }
+            if rng.random() < profile['match_rate']:
+                person['FaceMatches'] = [{
+                    'Similarity': rng.uniform(profile['similarity_min'], 100.0),
+                    'Face': {
+                        'FaceId': f"face-{student_id}",
+                        'ExternalImageId': str(student_id),
+                        'Confidence': 99.9
+                    }
+                }]
+            yield person
+
+        # Poisson-distributed number of strangers in this frame
+        threshold = math.exp(-profile['strangers'])
+        product = rng.random()
+        while product > threshold:
+            face = _face(profile, rng, rng.random(), 0.0, 0.0)
+            yield {
+                'Timestamp': timestamp_ms,
+                'Person': {'Index': strangers_index + rng.randrange(20), 'BoundingBox': face['BoundingBox'], 'Face': face}
+            }
+            product *= rng.random()
+
+
+def persons_pages(profile, seed=0, page_size=1000):
+    """The lecture as get_face_search pages (MaxResults=page_size)"""
+    page = []
+    for person in lecture_persons(profile, seed):
+        page.append(person)
+        if len(page) == page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def add_profile_arguments(parser, **defaults):
+    """Add --students, --minutes, --fps, ... to an argparse parser (defaults override DEFAULT_PROFILE)"""
+    group = parser.add_argument_group('synthetic lecture')
+    for name, default in lecture_profile(**defaults).items():
+        group.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+
+
+def profile_from_args(args):
+    return lecture_profile(**{name: getattr(args, name) for name in DEFAULT_PROFILE})
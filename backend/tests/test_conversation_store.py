@@ -0,0 +1,64 @@
+"""
+Conversation ownership (conversation_store) against the in-memory DynamoDB
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, os.path.join(HERE, '..', 'local'))
+
+import conversation_store  # noqa: E402
+from fake_aws import FakeAWS  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def aws():
+    aws = FakeAWS({})
+    aws.install()
+    yield aws
+    aws.uninstall()
+
+
+def saved_conversation(owner):
+    conversation = conversation_store.new_conversation(owner)
+    conversation_store.add_turn(conversation, 'Who was absent?', 'Nobody.', [])
+    conversation_store.save_conversation(conversation)
+    return conversation['conversation_id']
+
+
+def test_owner_resumes_the_conversation():
+    conversation_id = saved_conversation('user-a')
+
+    conversation = conversation_store.load_conversation(conversation_id, owner='user-a')
+
+    assert conversation['conversation_id'] == conversation_id
+    assert len(conversation['turns']) == 1
+
+
+@pytest.mark.parametrize('caller', ['user-b', None])
+def test_other_caller_gets_a_new_conversation(caller):
+    conversation_id = saved_conversation('user-a')
+
+    conversation = conversation_store.load_conversation(conversation_id, owner=caller)
+
+    assert conversation['conversation_id'] != conversation_id
+    assert conversation['turns'] == []
+
+
+def test_unknown_id_from_the_client_is_not_adopted():
+    conversation = conversation_store.load_conversation('chosen-by-the-client', owner='user-a')
+
+    assert conversation['conversation_id'] != 'chosen-by-the-client'
+
+
+def test_caller_identity_prefers_the_authorizer_principal():
+    event = {'requestContext': {'authorizer': {'claims': {'sub': 'user-a'}}, 'connectionId': 'conn-1'}}
+
+    assert conversation_store.caller_identity(event) == 'user-a'
+    assert conversation_store.caller_identity({'requestContext': {'connectionId': 'conn-1'}}) == 'conn-1'
+    assert conversation_store.caller_identity({'message': 'hi'}) is None
@@ -0,0 +1,90 @@
+"""
+Presence time of sparse detections (face_search_aggregator.build_student_data)
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+import face_search_aggregator as aggregator  # noqa: E402
+from scoring import was_present  # noqa: E402
+
+GAP_MS = aggregator.PRESENCE_GAP_MS
+
+
+def person(student_id, timestamp_ms):
+    return {
+        'Timestamp': timestamp_ms,
+        'Person': {'Face': {'Confidence': 99.0, 'BoundingBox': {'Width': 0.1, 'Height': 0.1}}},
+        'FaceMatches': [{'Similarity': 95.0, 'Face': {'ExternalImageId': str(student_id)}}]
+    }
+
+
+def student_data(timestamps_ms, numpy=True, monkeypatch=None):
+    if not numpy:
+        monkeypatch.setattr(aggregator, 'np', None)
+    aggregate = aggregator.new_aggregate()
+    aggregator.add_persons_page(aggregate, [person(1, timestamp) for timestamp in timestamps_ms])
+    return aggregator.build_student_data(aggregate, [1, 2])
+
+
+@pytest.fixture(params=['numpy', 'rows'])
+def build(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    return lambda timestamps_ms: student_data(timestamps_ms, request.param == 'numpy', monkeypatch)
+
+
+def test_sampled_every_90_seconds_counts_most_of_the_lecture(build):
+    # 45 minutes, one detection every 90 s: every run is a single detection
+    record = build(range(0, 45 * 60 * 1000 + 1, 90 * 1000))['1']
+
+    assert len(record['PresenceRuns']) == 31
+    assert record['PresenceDuration(sec)'] == 2700
+    # Each detection covers half the gap tolerance on each side, clipped to the span
+    assert record['CoveredDuration(sec)'] == (29 * GAP_MS + GAP_MS) / 1000
+    assert was_present(record)
+
+
+def test_detections_400ms_apart_are_present(build):
+    record = build([10000, 10400])['1']
+
+    assert record['PresenceDuration(sec)'] == 0.4
+    assert record['CoveredDuration(sec)'] == 0.4
+    assert int(record['CoveredDuration(sec)']) == 0
+    assert was_present(record)
+
+
+def test_single_detection_is_present(build):
+    record = build([60000])['1']
+
+    assert record['DetectionCount'] == 1
+    assert record['CoveredDuration(sec)'] == 0
+    assert was_present(record)
+
+
+def test_long_absence_is_not_covered(build):
+    # In class for the first and last 5 minutes, out for 40 minutes between
+    timestamps = list(range(0, 300001, 1000)) + list(range(2700000, 3000001, 1000))
+    record = build(timestamps)['1']
+
+    assert len(record['PresenceRuns']) == 2
+    assert record['PresenceDuration(sec)'] == 3000
+    assert record['CoveredDuration(sec)'] == (2 * 300000 + GAP_MS) / 1000
+
+
+def test_never_detected_is_absent(build):
+    record = build([60000])['2']
+
+    assert record['DetectionCount'] == 0
+    assert not was_present(record)
+
+
+def test_was_present_on_results_without_detection_count():
+    # A single detection saved before DetectionCount: zero span, non-zero confidence
+    assert was_present({'PresenceDuration(sec)': 0, 'AvgConfidence': 99.1})
+    assert not was_present({'PresenceDuration(sec)': 0, 'AvgConfidence': 0})
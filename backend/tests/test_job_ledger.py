@@ -0,0 +1,105 @@
+"""
+Ownership of face search runs (job_ledger) against the in-memory DynamoDB
+
+    python -m pytest tests
+"""
+import os
+import sys
+import time
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, os.path.join(HERE, '..', 'local'))
+
+import job_ledger  # noqa: E402
+from fake_aws import FakeAWS  # noqa: E402
+
+FINGERPRINT = 'sample-abc'
+
+
+@pytest.fixture(autouse=True)
+def aws():
+    aws = FakeAWS({})
+    aws.install()
+    yield aws
+    aws.uninstall()
+
+
+def entry():
+    return job_ledger.table.get_item(Key=job_ledger.ledger_key(FINGERPRINT)).get('Item')
+
+
+def make_stale():
+    job_ledger.table.update_item(
+        Key=job_ledger.ledger_key(FINGERPRINT),
+        UpdateExpression='SET started_at = :started_at',
+        ExpressionAttributeValues={':started_at': int(time.time()) - job_ledger.STALE_RUN_SEC - 1}
+    )
+
+
+def test_duplicate_claim_while_running_waits_for_the_owner(aws):
+    assert job_ledger.claim(FINGERPRINT, 'job-1', 'video-1') == ('new', None)
+
+    status, running = job_ledger.claim(FINGERPRINT, 'job-2', 'video-2')
+
+    assert status == 'in_flight'
+    assert running['job_id'] == 'job-1'
+    assert job_ledger.add_waiter(FINGERPRINT, aws.stepfunctions.issue_token()) is None
+    assert entry()['job_id'] == 'job-1'
+
+
+def test_complete_resumes_waiters_and_later_claims_reuse_the_results(aws):
+    job_ledger.claim(FINGERPRINT, 'job-1', 'video-1')
+    token = aws.stepfunctions.issue_token()
+    job_ledger.add_waiter(FINGERPRINT, token)
+
+    assert job_ledger.complete(FINGERPRINT, 'job-1', 'rekognition-results/video-1.json') == 1
+
+    assert aws.stepfunctions.take_result(token)[1]['results_key'] == 'rekognition-results/video-1.json'
+    status, done = job_ledger.claim(FINGERPRINT, 'job-3', 'video-3')
+    assert status == 'complete'
+    assert done['results_key'] == 'rekognition-results/video-1.json'
+
+
+def test_stale_run_is_taken_over_and_its_owner_cannot_finish_it():
+    job_ledger.claim(FINGERPRINT, 'job-1', 'video-1')
+    make_stale()
+
+    assert job_ledger.claim(FINGERPRINT, 'job-2', 'video-2') == ('new', None)
+
+    # The first owner comes back late: neither its completion nor its failure counts
+    assert job_ledger.complete(FINGERPRINT, 'job-1', 'rekognition-results/video-1.json') == 0
+    assert job_ledger.release(FINGERPRINT, 'job-1', 'late failure') == 0
+    assert entry()['job_id'] == 'job-2'
+    assert entry()['status'] == job_ledger.STATUS_RUNNING
+
+
+def test_complete_run_is_never_taken_over():
+    job_ledger.claim(FINGERPRINT, 'job-1', 'video-1')
+    job_ledger.complete(FINGERPRINT, 'job-1', 'rekognition-results/video-1.json')
+    make_stale()
+
+    assert job_ledger.claim(FINGERPRINT, 'job-2', 'video-2')[0] == 'complete'
+
+
+def test_release_after_a_failed_run_fails_waiters_and_frees_the_fingerprint(aws):
+    job_ledger.claim(FINGERPRINT, 'job-1', 'video-1')
+    token = aws.stepfunctions.issue_token()
+    job_ledger.add_waiter(FINGERPRINT, token)
+
+    assert job_ledger.release(FINGERPRINT, 'job-1', 'face search failed') == 1
+
+    assert aws.stepfunctions.take_result(token) == ('failure', 'DuplicateSourceFailed', 'face search failed')
+    assert entry() is None
+    # Released twice (a retried failure handler): nothing left to release
+    assert job_ledger.release(FINGERPRINT, 'job-1', 'face search failed') == 0
+    assert job_ledger.claim(FINGERPRINT, 'job-2', 'video-1') == ('new', None)
+
+
+def test_waiter_after_release_is_told_to_resume_itself():
+    job_ledger.claim(FINGERPRINT, 'job-1', 'video-1')
+    job_ledger.release(FINGERPRINT, 'job-1', 'face search failed')
+
+    assert job_ledger.add_waiter(FINGERPRINT, 'token') == {}
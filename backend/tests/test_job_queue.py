@@ -0,0 +1,120 @@
+"""
+Admission control of Rekognition jobs (job_queue) against the in-memory DynamoDB
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, os.path.join(HERE, '..', 'local'))
+
+import job_queue  # noqa: E402
+from fake_aws import FakeAWS  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def aws():
+    aws = FakeAWS({})
+    aws.install()
+    yield aws
+    aws.uninstall()
+
+
+def enqueue_jobs(count):
+    for index in range(count):
+        job_queue.enqueue({'job_id': f"job-{index:02d}", 'uploaded_at': f"2024-01-01T08:{index:02d}:00"})
+
+
+def item_claimed_until():
+    [item] = job_queue.table.query(
+        KeyConditionExpression='pk = :queue',
+        ExpressionAttributeValues={':queue': job_queue.QUEUE_PARTITION}
+    )['Items']
+    return int(item['claimed_until'])
+
+
+def test_admit_skips_leased_items_at_the_head_of_the_queue():
+    enqueue_jobs(12)
+    # Another admitter holds the first 10 (a full Query page) and is still starting them
+    for item in job_queue.queued_jobs(10):
+        assert job_queue.claim(item) is not None
+
+    started = job_queue.admit(lambda job: 'started', batch_size=10)
+
+    assert started == ['job-10', 'job-11']
+    assert job_queue.in_flight() == 2
+
+
+def test_double_release_frees_the_slot_once():
+    assert job_queue.acquire_slot('job-a')
+    assert job_queue.acquire_slot('job-b')
+
+    assert job_queue.release_slot('job-a')
+    # A duplicated SNS notification for the same job
+    assert not job_queue.release_slot('job-a')
+
+    assert job_queue.in_flight() == 1
+
+
+def test_acquire_is_idempotent_per_job_and_capped(monkeypatch):
+    monkeypatch.setattr(job_queue, 'MAX_IN_FLIGHT_JOBS', 2)
+
+    assert job_queue.acquire_slot('job-a')
+    assert job_queue.acquire_slot('job-a')
+    assert job_queue.acquire_slot('job-b')
+    assert not job_queue.acquire_slot('job-c')
+
+    assert job_queue.in_flight() == 2
+
+
+def test_live_lease_blocks_other_admitters_until_it_runs_out(monkeypatch):
+    enqueue_jobs(1)
+    item = job_queue.queued_jobs(1)[0]
+    assert job_queue.claim(item) is not None
+
+    assert job_queue.queued_jobs(1) == []
+    assert job_queue.claim(item) is None
+
+    # The first admitter died: its lease is already over
+    lease_over = item_claimed_until() + 1
+    monkeypatch.setattr(job_queue.time, 'time', lambda: lease_over)
+    [stale] = job_queue.queued_jobs(1)
+    assert job_queue.claim(stale)['job_id'] == 'job-00'
+
+
+def test_stale_slot_is_reclaimed_once(monkeypatch):
+    job_queue.acquire_slot('job-a')
+    monkeypatch.setattr(job_queue, 'SLOT_TIMEOUT_SEC', -1)
+
+    assert job_queue.reclaim_stale_slots() == ['job-a']
+    # The job reports back after all
+    assert not job_queue.release_slot('job-a')
+    assert job_queue.in_flight() == 0
+
+
+def test_release_after_a_failed_start_frees_the_slot_and_drops_the_job():
+    enqueue_jobs(2)
+
+    started = job_queue.admit(lambda job: 'failed' if job['job_id'] == 'job-00' else 'started')
+
+    assert started == ['job-01']
+    assert job_queue.in_flight() == 1
+    assert job_queue.queued_jobs() == []
+    # The failed job's slot is gone already; a late release changes nothing
+    assert not job_queue.release_slot('job-00')
+    assert job_queue.in_flight() == 1
+
+
+def test_throttled_start_goes_back_in_line():
+    enqueue_jobs(2)
+
+    assert job_queue.admit(lambda job: 'throttled') == []
+
+    assert job_queue.in_flight() == 0
+    [first, second] = job_queue.queued_jobs()
+    assert (first['job_id'], int(first['attempts'])) == ('job-00', 1)
+    assert second['job_id'] == 'job-01'
@@ -0,0 +1,58 @@
+"""
+Per-session versions of the tool result cache (studentlytics_data) against the in-memory DynamoDB
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..', 'lambda'))
+sys.path.insert(0, os.path.join(HERE, '..', 'local'))
+
+import aws_clients  # noqa: E402
+import studentlytics_data  # noqa: E402
+from fake_aws import FakeAWS  # noqa: E402
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    aws = FakeAWS({})
+    aws.install()
+    monkeypatch.setattr(studentlytics_data.time, 'sleep', lambda seconds: None)
+    yield aws
+    aws.uninstall()
+
+
+def test_versions_are_read_in_batches_of_100(aws):
+    for index in range(150):
+        for _ in range(index % 3):
+            studentlytics_data.publish_session_version(f"video-{index:03d}")
+    record_ids = [f"video-{index:03d}" for index in range(150)]
+
+    versions = studentlytics_data.get_session_versions(record_ids + record_ids[:10])
+
+    assert versions == {record_id: index % 3 for index, record_id in enumerate(record_ids) if index % 3}
+    assert aws.calls.counts['dynamodb.batch_get_item'] == 2
+
+
+def test_unprocessed_keys_are_retried(aws):
+    for index in range(10):
+        studentlytics_data.publish_session_version(f"video-{index}")
+    aws_clients.get_resource('dynamodb').unprocessed_every = 3
+
+    versions = studentlytics_data.get_session_versions([f"video-{index}" for index in range(10)])
+
+    assert versions == {f"video-{index}": 1 for index in range(10)}
+    assert aws.calls.counts['dynamodb.batch_get_item'] > 1
+
+
+def test_keys_never_processed_raise(aws, monkeypatch):
+    studentlytics_data.publish_session_version('video-0')
+    aws_clients.get_resource('dynamodb').unprocessed_every = 1
+    monkeypatch.setattr(studentlytics_data, 'BATCH_GET_MAX_RETRIES', 2)
+
+    with pytest.raises(RuntimeError):
+        studentlytics_data.get_session_versions(['video-0'])